@@ -0,0 +1,205 @@
+import os
+import time
+import threading
+from collections import deque
+
+
+# Bandwidth settings in MB/s, overridable through the environment; 0 means unlimited
+GLOBAL_RATE_LIMIT = float(os.getenv("BANDWIDTH_LIMIT", "0")) * 1024 * 1024
+JOB_RATE_LIMIT = float(os.getenv("JOB_BANDWIDTH_LIMIT", "0")) * 1024 * 1024
+# Longest single sleep, so rate changes and cancellation are picked up quickly
+MAX_SLEEP = 0.25
+# Window for measuring the actual transfer rate
+RATE_WINDOW = 3.0
+
+
+# Function to format a byte rate for progress messages
+def format_rate(rate):
+    return f"{rate / 1048576:.1f} MB/s"
+
+
+class TokenBucket:
+    # Token bucket that lets callers go into debt: consume() takes the bytes
+    # right away and then sleeps until the bucket is back to zero. That keeps
+    # large reads (whole segments, yt-dlp blocks) shaped without splitting them.
+    # clock and sleep can be replaced, e.g. by a simulated clock in tests.
+    def __init__(self, rate=0, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def burst(self):
+        # One second worth of traffic unless configured otherwise
+        return self._burst if self._burst is not None else self._rate
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = self._clock()
+        if self._rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    # Take nbytes and block until they are paid for; returns early if should_stop() turns true
+    def consume(self, nbytes, should_stop=None):
+        with self._lock:
+            if not self._rate:
+                return
+            self._refill()
+            self._tokens -= nbytes
+
+        while True:
+            with self._lock:
+                if not self._rate:
+                    return
+                self._refill()
+                if self._tokens >= 0:
+                    return
+                wait = -self._tokens / self._rate
+            if should_stop is not None and should_stop():
+                return
+            self._sleep(min(wait, MAX_SLEEP))
+
+
+class JobShaper:
+    # One job's handle on the bandwidth manager. Download engines call
+    # throttle(nbytes) for every chunk they receive; it blocks as needed to
+    # keep the job within its own limit and the global one.
+    def __init__(self, manager, weight=1.0, rate_limit=None, should_stop=None):
+        self.manager = manager
+        self.weight = max(weight, 0.01)
+        self.rate_limit = rate_limit or 0
+        self.should_stop = should_stop
+        self.bucket = TokenBucket(clock=manager.clock, sleep=manager.sleep)
+        self._samples = deque()
+        self._registered = manager.clock()
+        self._lock = threading.Lock()
+
+    # Current allowed rate in bytes/s; 0 means unlimited
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    # Rate actually achieved over the last few seconds
+    @property
+    def actual_rate(self):
+        now = self.manager.clock()
+        with self._lock:
+            self._trim(now)
+            transferred = sum(nbytes for _, nbytes in self._samples)
+        elapsed = min(RATE_WINDOW, now - self._registered)
+        return transferred / elapsed if elapsed > 0 else 0.0
+
+    def _trim(self, now):
+        while self._samples and now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+
+    def throttle(self, nbytes):
+        now = self.manager.clock()
+        with self._lock:
+            self._samples.append((now, nbytes))
+            self._trim(now)
+        self.bucket.consume(nbytes, self.should_stop)
+        self.manager.global_bucket.consume(nbytes, self.should_stop)
+
+    # Change this job's own cap while it runs
+    def set_rate_limit(self, rate_limit):
+        self.rate_limit = rate_limit or 0
+        self.manager.rebalance()
+
+    def close(self):
+        self.manager.unregister(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class BandwidthManager:
+    # Shares download bandwidth between active jobs.
+    #
+    # The global limit is split between registered jobs by weight, each job
+    # is further capped by the per-job limit and its own limit, and a global
+    # bucket enforces the total while shares are being rebalanced. Limits can
+    # be changed at runtime with set_limits(). clock and sleep are shared by
+    # every bucket the manager creates.
+    def __init__(self, global_rate=GLOBAL_RATE_LIMIT, job_rate=JOB_RATE_LIMIT, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.global_rate = global_rate
+        self.job_rate = job_rate
+        self.clock = clock
+        self.sleep = sleep
+        self.global_bucket = TokenBucket(global_rate, clock=clock, sleep=sleep)
+        self._jobs = []
+        self._lock = threading.Lock()
+
+    def register(self, weight=1.0, rate_limit=None, should_stop=None):
+        shaper = JobShaper(self, weight, rate_limit, should_stop)
+        with self._lock:
+            self._jobs.append(shaper)
+        self.rebalance()
+        return shaper
+
+    def unregister(self, shaper):
+        with self._lock:
+            if shaper in self._jobs:
+                self._jobs.remove(shaper)
+        self.rebalance()
+
+    def set_limits(self, global_rate=None, job_rate=None):
+        if global_rate is not None:
+            self.global_rate = global_rate
+            self.global_bucket.set_rate(global_rate)
+        if job_rate is not None:
+            self.job_rate = job_rate
+        self.rebalance()
+
+    # Recompute every job's rate from the current limits and weights
+    def rebalance(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        total_weight = sum(shaper.weight for shaper in jobs)
+        for shaper in jobs:
+            limits = [limit for limit in (self.job_rate, shaper.rate_limit) if limit]
+            if self.global_rate:
+                limits.append(self.global_rate * shaper.weight / total_weight)
+            shaper.bucket.set_rate(min(limits) if limits else 0)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        return {
+            "global_rate": self.global_rate,
+            "job_rate": self.job_rate,
+            "jobs": len(jobs),
+            "actual_rate": sum(shaper.actual_rate for shaper in jobs),
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+# Process-wide bandwidth manager shared by every download
+def get_bandwidth_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BandwidthManager()
+        return _manager
@@ -0,0 +1,555 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Keep benchmark runs away from the real caches, job log and metrics port.
+# This has to happen before the pipeline modules read their settings.
+os.environ["MXSCRAPER_CACHE_DIR"] = tempfile.mkdtemp(prefix="mxbench-")
+os.environ["JOB_LOG_FILE"] = ""
+os.environ["METRICS_PORT"] = "off"
+os.environ["FAST_PATH_ENABLED"] = "0"
+
+try:
+    import psutil
+except ImportError:  # Peak RSS falls back to the process-wide high-water mark
+    psutil = None
+
+import pipeline
+import toolchain
+from hls import VariantPolicy
+from driver_pool import ChromeDriverPool
+from blocking import pattern_to_regex
+
+
+VARIANTS = ((360, 800000), (720, 2500000), (1080, 5000000))
+SEGMENT_DURATION = 2
+
+# Recorded performance log replayed by FakeDriver when no --recording is given.
+# Each entry is replayed "t" seconds after navigation; "{origin}" and
+# "{manifest}" are filled in per scenario. "body" answers Network.getResponseBody.
+DEFAULT_RECORDING = [
+    {"t": 0.05, "method": "Network.responseReceived", "params": {
+        "requestId": "1", "type": "Document",
+        "response": {"url": "{origin}/page", "mimeType": "text/html", "headers": {}}}},
+    {"t": 0.10, "method": "Network.loadingFinished", "params": {"requestId": "1"},
+     "body": "<html><body><div id=\"player\"></div></body></html>"},
+    {"t": 0.15, "method": "Network.responseReceived", "params": {
+        "requestId": "2", "type": "Script",
+        "response": {"url": "{origin}/static/app.js", "mimeType": "application/javascript", "headers": {}}}},
+    {"t": 0.20, "method": "Network.responseReceived", "params": {
+        "requestId": "3", "type": "Image",
+        "response": {"url": "{origin}/static/poster.jpg", "mimeType": "image/jpeg", "headers": {}}}},
+    {"t": 0.25, "method": "Network.responseReceived", "params": {
+        "requestId": "4", "type": "XHR",
+        "response": {"url": "https://www.google-analytics.com/collect", "mimeType": "text/plain", "headers": {}}}},
+    {"t": 0.40, "method": "Network.responseReceived", "params": {
+        "requestId": "5", "type": "XHR",
+        "response": {"url": "{origin}/api/v1/detail/video", "mimeType": "application/json", "headers": {}}}},
+    {"t": 0.45, "method": "Network.loadingFinished", "params": {"requestId": "5"},
+     "body": "{\"title\": \"Synthetic\", \"duration\": 120}"},
+    {"t": 0.60, "method": "Network.responseReceived", "params": {
+        "requestId": "6", "type": "XHR",
+        "response": {"url": "{manifest}", "mimeType": "{manifest_mime}", "headers": {}}}},
+]
+
+# name: (extraction path, manifest type, engine, origin profile)
+SCENARIOS = {
+    "cache-hls-native": ("cache", "hls", "native", "clean"),
+    "cache-hls-ytdlp": ("cache", "hls", "ytdlp", "clean"),
+    "browser-hls-native": ("browser", "hls", "native", "clean"),
+    "browser-dash-ytdlp": ("browser", "dash", "ytdlp", "clean"),
+    "browser-dash-native": ("browser", "dash", "native", "clean"),
+    "cache-hls-native-lossy": ("cache", "hls", "native", "lossy"),
+}
+
+EXTRACTION_STAGES = ("cache_lookup", "fast_path", "driver_acquire", "navigation", "log_scan")
+POSTPROCESS_STAGES = ("post_processing", "faststart", "probe")
+
+
+# Function to build a deterministic segment payload; TS payloads start with the 0x47 sync byte
+def segment_payload(size, index):
+    block = bytes((index + offset) % 256 for offset in range(256))
+    data = (block * (size // 256 + 1))[:size]
+    return b"\x47" + data[1:]
+
+
+def master_playlist():
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for height, bandwidth in VARIANTS:
+        width = height * 16 // 9
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height},'
+                     f'CODECS="avc1.64001f,mp4a.40.2"')
+        lines.append(f"{height}p/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def media_playlist(segments):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_DURATION}",
+             "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for index in range(segments):
+        lines += [f"#EXTINF:{SEGMENT_DURATION:.1f},", f"{index}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def dash_manifest(segments):
+    height, bandwidth = VARIANTS[1]
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S" '
+        f'mediaPresentationDuration="PT{segments * SEGMENT_DURATION}S" '
+        'profiles="urn:mpeg:dash:profile:isoff-live:2011">\n'
+        '  <Period id="0" start="PT0S">\n'
+        '    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">\n'
+        f'      <Representation id="{height}p" bandwidth="{bandwidth}" width="{height * 16 // 9}" '
+        f'height="{height}" codecs="avc1.64001f">\n'
+        f'        <SegmentTemplate timescale="1" duration="{SEGMENT_DURATION}" startNumber="0" '
+        'initialization="init.mp4" media="$Number$.m4s"/>\n'
+        '      </Representation>\n'
+        '    </AdaptationSet>\n'
+        '    <AdaptationSet mimeType="audio/mp4" lang="hi" segmentAlignment="true">\n'
+        '      <Role schemeIdUri="urn:mpeg:dash:role:2011" value="main"/>\n'
+        '      <Representation id="audio" bandwidth="128000" codecs="mp4a.40.2">\n'
+        f'        <SegmentTemplate timescale="1" duration="{SEGMENT_DURATION}" startNumber="0" '
+        'initialization="audio/init.mp4" media="audio/$Number$.m4s"/>\n'
+        '      </Representation>\n'
+        '    </AdaptationSet>\n'
+        '  </Period>\n'
+        '</MPD>\n'
+    )
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    # Routes, under /<profile>/ where profile is "clean" or "lossy":
+    #   hls/master.m3u8, hls/<height>p/index.m3u8, hls/<height>p/<n>.ts
+    #   dash/manifest.mpd, dash/init.mp4, dash/<n>.m4s, dash/audio/init.mp4, dash/audio/<n>.m4s
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _route(self, profile, path):
+        config = self.server.config
+        segments = config["segments"]
+        if path == "hls/master.m3u8":
+            return "application/vnd.apple.mpegurl", master_playlist().encode()
+        match = re.match(r"^hls/(\d+)p/(index\.m3u8|(\d+)\.ts)$", path)
+        if match:
+            height = int(match.group(1))
+            if match.group(3) is None:
+                return "application/vnd.apple.mpegurl", media_playlist(segments).encode()
+            index = int(match.group(3))
+            if index >= segments:
+                return None
+            size = max(188, config["segment_size"] * height // 1080 // 188 * 188)
+            return "video/mp2t", segment_payload(size, index)
+        if path == "dash/manifest.mpd":
+            return "application/dash+xml", dash_manifest(segments).encode()
+        if path in ("dash/init.mp4", "dash/audio/init.mp4"):
+            return "video/mp4", segment_payload(1024, 0)
+        match = re.match(r"^dash/audio/(\d+)\.m4s$", path)
+        if match and int(match.group(1)) < segments:
+            return "audio/iso.segment", segment_payload(SEGMENT_DURATION * 16000, int(match.group(1)))
+        match = re.match(r"^dash/(\d+)\.m4s$", path)
+        if match and int(match.group(1)) < segments:
+            return "video/iso.segment", segment_payload(config["segment_size"] * 720 // 1080, int(match.group(1)))
+        return None
+
+    def _serve(self, send_body):
+        config = self.server.config
+        parts = urlsplit(self.path).path.lstrip("/").split("/", 1)
+        profile, path = (parts + [""])[:2]
+
+        if config["latency"]:
+            time.sleep(config["latency"])
+
+        if profile == "lossy" and not path.endswith((".m3u8", ".mpd")):
+            with self.server.rng_lock:
+                failed = self.server.rng.random() < config["error_rate"]
+            if failed:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        routed = self._route(profile, path) if profile in ("clean", "lossy") else None
+        if routed is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        content_type, body = routed
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not send_body:
+            return
+
+        # Throttle each connection to the configured bandwidth
+        chunk_size = 65536
+        bandwidth = config["bandwidth"]
+        try:
+            for offset in range(0, len(body), chunk_size):
+                chunk = body[offset:offset + chunk_size]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class OriginServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # Clients dropping connections (cancelled or retried requests) are expected here
+    def handle_error(self, request, client_address):
+        pass
+
+
+# Function to run the synthetic origin; used as the target of a child process
+def serve_origin(config, port_queue):
+    httpd = OriginServer(("127.0.0.1", 0), OriginHandler)
+    httpd.config = config
+    httpd.rng = random.Random(config["seed"])
+    httpd.rng_lock = threading.Lock()
+    port_queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+class SyntheticOrigin:
+    # Local HLS/DASH origin running in a child process, so its CPU time and
+    # memory do not show up in the pipeline's measurements.
+    def __init__(self, segments=30, segment_size=512 * 1024, latency=0.0, bandwidth=0, error_rate=0.0, seed=1):
+        config = {"segments": segments, "segment_size": segment_size, "latency": latency,
+                  "bandwidth": bandwidth, "error_rate": error_rate, "seed": seed}
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=serve_origin, args=(config, port_queue), daemon=True)
+        self._process.start()
+        self.url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    def manifest_url(self, kind, profile="clean"):
+        path = "hls/master.m3u8" if kind == "hls" else "dash/manifest.mpd"
+        return f"{self.url}/{profile}/{path}"
+
+    def close(self):
+        self._process.terminate()
+        self._process.join(5)
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        self._driver.current_window_handle = handle
+
+
+class FakeDriver:
+    # Stand-in for a pooled Chrome WebDriver. driver.get() starts replaying a
+    # recorded performance log in real time; get_log() returns the entries
+    # that are due and Network.getResponseBody answers from the recording.
+    # URLs blocked with Network.setBlockedURLs are reported as failed requests.
+    def __init__(self, recording, substitutions, navigation_delay=0.2):
+        self.recording = fill_recording(recording, substitutions)
+        self.navigation_delay = navigation_delay
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = FakeSwitchTo(self)
+        self._loaded_at = None
+        self._cursor = 0
+        self._blocked = []
+        self._blocked_ids = set()
+
+    def _is_blocked(self, url):
+        return any(regex.match(url) for regex in self._blocked)
+
+    def get(self, url):
+        if url == "about:blank":
+            self._loaded_at = None
+            return
+        # driver.get() returns at DOMContentLoaded with the eager page load strategy
+        time.sleep(self.navigation_delay)
+        self._loaded_at = time.monotonic() - self.navigation_delay
+        self._cursor = 0
+        self._blocked_ids = set()
+
+    def get_log(self, kind):
+        if self._loaded_at is None:
+            return []
+        elapsed = time.monotonic() - self._loaded_at
+        entries = []
+        while self._cursor < len(self.recording) and self.recording[self._cursor]["t"] <= elapsed:
+            entry = self.recording[self._cursor]
+            self._cursor += 1
+            messages = [{"method": entry["method"], "params": entry["params"]}]
+            request_id = entry["params"].get("requestId")
+            if entry["method"] == "Network.responseReceived" and self._is_blocked(entry["params"]["response"]["url"]):
+                self._blocked_ids.add(request_id)
+                messages = [
+                    {"method": "Network.requestWillBeSent",
+                     "params": {"requestId": request_id, "request": {"url": entry["params"]["response"]["url"]}}},
+                    {"method": "Network.loadingFailed", "params": {"requestId": request_id, "blockedReason": "inspector"}},
+                ]
+            elif request_id in self._blocked_ids:
+                continue
+            for message in messages:
+                entries.append({"message": json.dumps({"message": message}), "timestamp": int(time.time() * 1000)})
+        return entries
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Network.getResponseBody":
+            for entry in self.recording:
+                if entry.get("body") is not None and entry["params"].get("requestId") == params.get("requestId"):
+                    return {"body": entry["body"], "base64Encoded": False}
+            raise Exception("No resource with given identifier found")
+        if command == "Network.setBlockedURLs":
+            self._blocked = [pattern_to_regex(pattern) for pattern in params.get("urls", [])]
+        return {}
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def set_window_size(self, width, height):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+# Function to fill the per-scenario placeholders into a recorded performance log
+def fill_recording(recording, substitutions):
+    text = json.dumps(recording)
+    for key, value in substitutions.items():
+        text = text.replace("{" + key + "}", value)
+    return sorted(json.loads(text), key=lambda entry: entry["t"])
+
+
+class ResourceSampler:
+    # Samples resident memory in the background while a run is in progress
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._cpu = os.times()
+        if psutil is not None:
+            self._process = psutil.Process()
+            self.peak_rss = self._process.memory_info().rss
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+        else:
+            import resource
+            self.peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        cpu = os.times()
+        self.cpu_seconds = (cpu.user - self._cpu.user) + (cpu.system - self._cpu.system)
+        return False
+
+
+# Function to run one scenario once and return its measurements
+def run_once(name, origin, recording, work_dir, args):
+    extraction, kind, engine, profile = SCENARIOS[name]
+    manifest_url = origin.manifest_url(kind, profile)
+    page_url = f"{origin.url}/{profile}/page/{name}"
+    output_file = os.path.join(work_dir, f"{name}.mp4")
+
+    cache = pipeline.get_resolution_cache()
+    cache.invalidate(page_url)
+    if extraction == "cache":
+        cache.put(page_url, [manifest_url])
+    else:
+        substitutions = {"origin": f"{origin.url}/{profile}", "manifest": manifest_url,
+                         "manifest_mime": "application/vnd.apple.mpegurl" if kind == "hls" else "application/dash+xml"}
+        pipeline._driver_pool = ChromeDriverPool(
+            lambda: FakeDriver(recording, substitutions, navigation_delay=args.navigation_delay), size=1
+        )
+
+    state = pipeline.JobState()
+    policy = VariantPolicy(args.quality)
+    started = time.monotonic()
+    with ResourceSampler() as sampler:
+        result, error = pipeline.process_video(page_url, lambda value, status: None, state=state, engine=engine,
+                                               variant_policy=policy, hls_concurrency=args.concurrency,
+                                               output_file=output_file)
+    wall = time.monotonic() - started
+
+    if pipeline._driver_pool is not None:
+        pipeline._driver_pool.close()
+        pipeline._driver_pool = None
+
+    stages = (state.metrics or {}).get("stages", [])
+    run = {
+        "ok": error is None,
+        "error": error,
+        "wall_s": round(wall, 4),
+        "extraction_s": round(sum(s["seconds"] for s in stages if s["stage"] in EXTRACTION_STAGES), 4),
+        "download_s": round(sum(s["seconds"] for s in stages if s["stage"] == "download"), 4),
+        "postprocess_s": round(sum(s["seconds"] for s in stages if s["stage"] in POSTPROCESS_STAGES), 4),
+        "bytes": (state.metrics or {}).get("bytes", 0),
+        "throughput_bps": (state.metrics or {}).get("throughput_bps", 0.0),
+        "cpu_s": round(sampler.cpu_seconds, 4),
+        "peak_rss_mb": round(sampler.peak_rss / 1048576, 1),
+        "stages": stages,
+    }
+
+    for leftover in (output_file, output_file + ".ts", output_file + ".checkpoint.json", output_file + ".part"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    return run
+
+
+# Function to summarize repeated runs as median/min/max per metric
+def summarize(runs):
+    summary = {"runs": len(runs), "failures": sum(not run["ok"] for run in runs)}
+    ok_runs = [run for run in runs if run["ok"]] or runs
+    for metric in ("wall_s", "extraction_s", "download_s", "postprocess_s", "throughput_bps", "cpu_s", "peak_rss_mb"):
+        values = [run[metric] for run in ok_runs]
+        summary[metric] = {"median": round(statistics.median(values), 4), "min": min(values), "max": max(values)}
+    return summary
+
+
+def get_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+# Function to print median changes against an earlier results file
+def compare(baseline, results, stream=sys.stderr):
+    print(f"{'scenario':28} {'metric':16} {'baseline':>12} {'current':>12} {'change':>8}", file=stream)
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("wall_s", "extraction_s", "throughput_bps", "cpu_s", "peak_rss_mb"):
+            old = previous["summary"][metric]["median"]
+            new = current["summary"][metric]["median"]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{name:28} {metric:16} {old:12.3f} {new:12.3f} {change:>8}", file=stream)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the download pipeline against a local synthetic origin.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Measured runs per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per scenario")
+    parser.add_argument("--segments", type=int, default=30, help="Segments per stream")
+    parser.add_argument("--segment-size", type=int, default=512 * 1024, help="Bytes per 1080p segment")
+    parser.add_argument("--latency", type=float, default=0.0, help="Origin latency per request in seconds")
+    parser.add_argument("--bandwidth", type=int, default=0, help="Origin bandwidth per connection in bytes/s (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of failed segment requests in lossy scenarios")
+    parser.add_argument("--navigation-delay", type=float, default=0.2, help="Simulated page load time in seconds")
+    parser.add_argument("--recording", default=None, help="Performance log to replay instead of the built-in one")
+    parser.add_argument("--concurrency", type=int, default=pipeline.HLS_CONCURRENCY)
+    parser.add_argument("--quality", default="best")
+    parser.add_argument("--ffmpeg", default=None, help="ffmpeg binary (default: resolved from the toolchain)")
+    parser.add_argument("--ffprobe", default=None, help="ffprobe binary (default: resolved from the toolchain)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="-", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare medians against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    random.seed(args.seed)
+    tools = toolchain.Toolchain.resolve(install_driver=False)
+    if args.ffmpeg:
+        tools.tools["ffmpeg"] = {"path": args.ffmpeg}
+    if args.ffprobe:
+        tools.tools["ffprobe"] = {"path": args.ffprobe}
+    if not tools.ffmpeg:
+        print("ffmpeg not found; pass --ffmpeg or set FFMPEG_PATH", file=sys.stderr)
+        return 2
+    toolchain._toolchain = tools
+
+    recording = DEFAULT_RECORDING
+    if args.recording:
+        with open(args.recording, encoding="utf-8") as handle:
+            recording = json.load(handle)
+
+    origin = SyntheticOrigin(segments=args.segments, segment_size=args.segment_size, latency=args.latency,
+                             bandwidth=args.bandwidth, error_rate=args.error_rate, seed=args.seed)
+    # Resolution cache probes would add a request per job; the origin is known to be up
+    pipeline.get_resolution_cache().probe = lambda url: True
+    work_dir = tempfile.mkdtemp(prefix="mxbench-out-")
+
+    results = {
+        "commit": get_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            print(f"{name}...", file=sys.stderr, flush=True)
+            for _ in range(args.warmup):
+                run_once(name, origin, recording, work_dir, args)
+            runs = [run_once(name, origin, recording, work_dir, args) for _ in range(args.repeat)]
+            results["scenarios"][name] = {"summary": summarize(runs), "runs": runs}
+    finally:
+        origin.close()
+
+    text = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            compare(json.load(handle), results)
+    return 1 if any(s["summary"]["failures"] for s in results["scenarios"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
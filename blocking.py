@@ -0,0 +1,142 @@
+import os
+import re
+from urllib.parse import urlsplit
+
+
+# Resource blocking settings, overridable through the environment
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "1").lower() in ("1", "true", "yes")
+# Comma-separated categories from CATEGORY_PATTERNS to block during extraction page loads
+BLOCKED_CATEGORIES = os.getenv("BLOCKED_CATEGORIES", "images,fonts,media,trackers")
+# Extra comma-separated URL patterns to block ("*" is the only wildcard, as in CDP)
+BLOCK_EXTRA_PATTERNS = os.getenv("BLOCK_EXTRA_PATTERNS", "")
+
+
+# Function to build CDP URL patterns for file extensions, with and without a query string
+def extension_patterns(*extensions):
+    patterns = []
+    for extension in extensions:
+        patterns += [f"*.{extension}", f"*.{extension}?*"]
+    return patterns
+
+
+CATEGORY_PATTERNS = {
+    "images": extension_patterns("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"),
+    "fonts": extension_patterns("woff", "woff2", "ttf", "otf", "eot"),
+    # Progressive audio and video clips; stream segments are protected (see PROTECTED_SUFFIXES)
+    "media": extension_patterns("webm", "mp3", "ogg", "wav"),
+    "trackers": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+        "*adservice.google.*", "*facebook.net*", "*connect.facebook.*", "*scorecardresearch.com*",
+        "*moengage.com*", "*branch.io*", "*hotjar.com*", "*clevertap*", "*amazon-adsystem.com*",
+    ],
+}
+
+# Rough transfer sizes per blocked request, used to estimate bytes saved; Chrome
+# reports no size for requests it never sent
+ESTIMATED_REQUEST_BYTES = {
+    "images": 40 * 1024,
+    "fonts": 50 * 1024,
+    "media": 600 * 1024,
+    "trackers": 15 * 1024,
+    "custom": 20 * 1024,
+}
+
+# Requests extraction depends on, which no pattern may block: manifests, the
+# segments and keys the player fetches from them, and the MX pages and API
+PROTECTED_SUFFIXES = (
+    "m3u8", "mpd",
+    "ts", "m4s", "m4v", "m4a", "mp4", "aac", "vtt", "webvtt", "cmfv", "cmfa",
+    "key",
+)
+# XHR/fetch hosts the player asks for stream details, and hosts serving the pages and player scripts
+MX_API_HOSTS = ("api.mxplayer.in", "api.mxplay.com")
+MX_PAGE_HOSTS = ("www.mxplayer.in", "mxplayer.in")
+# Host MX serves streams from, used to check patterns against the protected suffixes
+MX_MEDIA_HOSTS = ("llvod.mxplay.com",)
+
+
+# Function to tell whether a request must never be blocked
+def is_protected(url):
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host in MX_API_HOSTS or host in MX_PAGE_HOSTS:
+        return True
+    name = parts.path.lower().rstrip("/").rsplit("/", 1)[-1]
+    return name == "key" or ("." in name and name.rsplit(".", 1)[1] in PROTECTED_SUFFIXES)
+
+
+# Function to build the URLs a pattern is checked against: every protected suffix
+# on every MX media host, with and without a signed query, plus the MX API and pages
+def protected_probes():
+    probes = []
+    for host in MX_MEDIA_HOSTS:
+        for suffix in PROTECTED_SUFFIXES:
+            probes += [f"https://{host}/video/ab/cd/hls/0.{suffix}",
+                       f"https://{host}/video/ab/cd/hls/0.{suffix}?hdnts=exp=1~hmac=00"]
+        probes.append(f"https://{host}/video/ab/cd/hls/key")
+    for host in MX_API_HOSTS:
+        probes += [f"https://{host}/v1/web/detail/video?type=episode&id=1", f"https://{host}/v1/web/stream/0.json"]
+    for host in MX_PAGE_HOSTS:
+        probes += [f"https://{host}/show/watch-example/episode-1-online-0", f"https://{host}/static/js/player.js"]
+    return probes
+
+
+# Function to turn a CDP URL pattern into a regular expression
+def pattern_to_regex(pattern):
+    return re.compile("^" + ".*".join(re.escape(part) for part in pattern.split("*")) + "$", re.IGNORECASE)
+
+
+class BlockPolicy:
+    # Which requests Chrome should drop while an extraction page loads.
+    #
+    # The policy is applied per job with Network.setBlockedURLs, so it can
+    # change without relaunching the pooled browsers. Manifests, segments,
+    # keys and MX page and API requests are never blocked: patterns matching
+    # any of protected_probes() are left out.
+    def __init__(self, categories=None, extra_patterns=(), enabled=True):
+        if categories is None:
+            categories = list(CATEGORY_PATTERNS)
+        unknown = [name for name in categories if name not in CATEGORY_PATTERNS]
+        if unknown:
+            raise ValueError(f"Unknown block categories: {', '.join(unknown)}")
+        self.enabled = enabled
+        self.rules = []
+        for category in categories:
+            self.rules += [(category, pattern) for pattern in CATEGORY_PATTERNS[category]]
+        self.rules += [("custom", pattern) for pattern in extra_patterns]
+        probes = protected_probes()
+        self.rules = [(category, pattern, pattern_to_regex(pattern)) for category, pattern in self.rules
+                      if not any(pattern_to_regex(pattern).match(url) for url in probes)]
+
+    @classmethod
+    def from_env(cls):
+        categories = [name.strip() for name in BLOCKED_CATEGORIES.split(",") if name.strip()]
+        extra = [pattern.strip() for pattern in BLOCK_EXTRA_PATTERNS.split(",") if pattern.strip()]
+        return cls(categories, extra, enabled=BLOCK_RESOURCES)
+
+    @property
+    def patterns(self):
+        return [pattern for _, pattern, _ in self.rules] if self.enabled else []
+
+    # Category of the rule that blocks a URL, or None
+    def categorize(self, url):
+        if is_protected(url):
+            return None
+        for category, _, regex in self.rules:
+            if regex.match(url):
+                return category
+        return None
+
+    # Install the policy on a driver; a disabled policy clears patterns left by an earlier job
+    def apply(self, driver):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.patterns})
+
+    # Estimated bytes not downloaded, from per-category counts of blocked requests
+    @staticmethod
+    def estimate_saved(blocked):
+        return sum(count * ESTIMATED_REQUEST_BYTES.get(category, ESTIMATED_REQUEST_BYTES["custom"])
+                   for category, count in blocked.items())
+
+
+DEFAULT_BLOCK_POLICY = BlockPolicy.from_env()
@@ -47,6 +47,11 @@ ffmpeg -version
 echo "Verifying Chromium installation..."
 chromium --version
 
+# Finished videos are served by the file server on FILE_SERVER_PORT, which needs a public route
+if [ -z "$FILE_SERVER_PUBLIC_URL" ]; then
+    echo "Warning: FILE_SERVER_PUBLIC_URL is not set; route a public URL to port ${FILE_SERVER_PORT:-8502} so videos can be downloaded."
+fi
+
 # Start Streamlit app
 echo "Starting Streamlit app..."
 streamlit run mxplayer_new.py --server.headless=true --server.enableCORS=false --server.enableXsrfProtection=false --browser.gatherUsageStats=false --server.port=$PORT
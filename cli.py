@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+# Load environment variables before the pipeline modules read their settings
+load_dotenv()
+
+from hls import VARIANT_POLICIES, VariantPolicy
+from pipeline import DEFAULT_DOWNLOAD_ENGINE, DEFAULT_VARIANT_POLICY, HLS_CONCURRENCY, JobState, \
+    get_driver_pool, prefetch_resolutions, process_video
+from toolchain import warm_toolchain
+from metrics import get_metrics_server
+from bandwidth import get_bandwidth_manager
+from events import LOG_EVENT_RATE, get_event_bus
+from scheduler import get_browser_slots
+from resolution_cache import normalize_url
+
+URL_PATTERN = re.compile(r"https://www\.mxplayer\.in/.*")
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    with _print_lock:
+        print(message, file=sys.stderr, flush=True)
+
+
+# Function to read URLs from a file (or stdin for "-"), skipping blanks and comments
+def read_urls(path):
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        urls = [line.strip() for line in handle]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+    return [url for url in urls if url and not url.startswith("#")]
+
+
+# Function to drop repeated URLs, keeping the first occurrence; returns the URLs and how many were dropped
+def dedupe_urls(urls):
+    seen, unique = set(), []
+    for url in urls:
+        key = normalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique, len(urls) - len(unique)
+
+
+# Function to derive a stable output file name from an MX Player URL
+def output_name(url, index):
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "-", url.rstrip("/").rsplit("/", 1)[-1]).strip("-")
+    return f"{slug or f'mxplayer_video_{index}'}.mp4"
+
+
+# Function to name every job's output file; URLs whose names collide get their
+# position appended, so no two jobs write the same file
+def output_names(urls):
+    names = [output_name(url, index) for index, url in enumerate(urls, 1)]
+    counts = Counter(names)
+    return [f"{name[:-len('.mp4')]}-{index}.mp4" if counts[name] > 1 else name
+            for index, name in enumerate(names, 1)]
+
+
+# Function to run one URL through the pipeline and return its summary record
+def run_job(index, url, name, args, variant_policy):
+    record = {"url": url, "status": "failed", "output_file": None, "duration_s": 0.0,
+              "bytes": 0, "throughput_bps": 0.0, "extraction_path": None, "error": None}
+    if not URL_PATTERN.match(url):
+        record["error"] = "Not a valid MX Player URL"
+        log(f"[{index}] skipped: {record['error']}")
+        return record
+
+    output_file = os.path.join(args.output_dir, name)
+    if os.path.exists(output_file) and not args.overwrite:
+        record.update(status="skipped", output_file=output_file, bytes=os.path.getsize(output_file))
+        log(f"[{index}] exists, skipping: {output_file}")
+        return record
+
+    state = JobState()
+    started = time.monotonic()
+    # Progress is logged by log_progress from the event bus
+    result, error = process_video(url, None, state=state, engine=args.engine,
+                                  variant_policy=variant_policy, hls_concurrency=args.concurrency,
+                                  output_file=output_file,
+                                  rate_limit=args.rate_limit * 1048576 if args.rate_limit else None,
+                                  job_id=index)
+    duration = time.monotonic() - started
+
+    record["duration_s"] = round(duration, 3)
+    record["extraction_path"] = state.extraction_path
+    record["stages"] = state.metrics["stages"] if state.metrics else []
+    if error:
+        record["error"] = error
+        log(f"[{index}] failed: {error}")
+        return record
+
+    size = os.path.getsize(result)
+    record.update(status="completed", output_file=result, bytes=size,
+                  throughput_bps=round(size / duration, 1) if duration else 0.0)
+    log(f"[{index}] done in {duration:.1f}s: {result}")
+    return record
+
+
+# Function to log job progress events; the bus limits them to LOG_EVENT_RATE per job
+# plus stage changes, which keeps the output readable. Outcomes are logged by run_job.
+def log_progress(event):
+    if not event.final:
+        log(f"[{event.job_id}] {event.progress * 100:5.1f}% {event.message}")
+
+
+# Function to resolve every page that will be downloaded with multi-tab extraction,
+# so the jobs find their manifests in the resolution cache
+def prefetch(urls, names, args):
+    targets = [url for url, name in zip(urls, names) if URL_PATTERN.match(url)
+               and (args.overwrite or not os.path.exists(os.path.join(args.output_dir, name)))]
+    if not targets:
+        return
+    log(f"Resolving {len(targets)} pages, {args.tabs} tabs per browser...")
+    started = time.monotonic()
+
+    def on_result(url, video_urls):
+        log(f"resolved: {url}" if video_urls else f"no manifest found: {url}")
+
+    try:
+        prefetch_resolutions(targets, tabs=args.tabs, on_result=on_result)
+    except Exception as e:
+        # Jobs still resolve their own pages one by one
+        log(f"multi-tab resolution failed: {e}")
+        return
+    log(f"Resolved pages in {time.monotonic() - started:.1f}s")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Download MX Player videos without the Streamlit UI.")
+    parser.add_argument("urls", help="File with one MX Player URL per line, or - for stdin")
+    parser.add_argument("-o", "--output-dir", default=".", help="Directory to write videos to")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="Number of concurrent jobs")
+    parser.add_argument("--browsers", type=int, default=None,
+                        help="Size of the Chrome pool and of concurrent page extractions "
+                             "(defaults to the number of workers)")
+    parser.add_argument("--tabs", type=int, default=1,
+                        help="Resolve pages this many at a time per browser before downloading (1: one page per job)")
+    parser.add_argument("--engine", choices=["native", "ytdlp"], default=DEFAULT_DOWNLOAD_ENGINE)
+    parser.add_argument("--concurrency", type=int, default=HLS_CONCURRENCY,
+                        help="Parallel segment downloads per job (native engine)")
+    parser.add_argument("--quality", choices=list(VARIANT_POLICIES), default=DEFAULT_VARIANT_POLICY)
+    parser.add_argument("--target-height", type=int, default=None, help="Resolution for --quality target")
+    parser.add_argument("--max-bandwidth", type=int, default=None,
+                        help="Bitrate cap in kbps for --quality bandwidth")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Download speed cap per job in MB/s")
+    parser.add_argument("--total-rate-limit", type=float, default=None,
+                        help="Download speed cap shared by all jobs in MB/s")
+    parser.add_argument("--summary", default="-", help="Write the JSON summary here (default: stdout)")
+    parser.add_argument("--overwrite", action="store_true", help="Re-download files that already exist")
+    parser.add_argument("--metrics-port", default=None,
+                        help="Serve Prometheus metrics on this port while the batch runs")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    urls, duplicates = dedupe_urls(read_urls(args.urls))
+    if duplicates:
+        log(f"Skipping {duplicates} repeated URLs")
+    names = output_names(urls)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    variant_policy = VariantPolicy(
+        args.quality,
+        target_height=args.target_height,
+        max_bandwidth=args.max_bandwidth * 1000 if args.max_bandwidth else None
+    )
+    workers = max(1, args.workers)
+
+    started = time.monotonic()
+    warm_toolchain()
+    if args.total_rate_limit is not None:
+        get_bandwidth_manager().set_limits(global_rate=args.total_rate_limit * 1048576)
+    if args.metrics_port is not None:
+        get_metrics_server(args.metrics_port)
+    browsers = args.browsers or workers
+    pool = get_driver_pool(size=browsers)
+    # Extractions queue for a browser slot, so match the slots to the pool
+    get_browser_slots(limit=browsers)
+    progress_log = get_event_bus().subscribe(log_progress, max_rate=LOG_EVENT_RATE)
+    try:
+        if args.tabs > 1:
+            prefetch(urls, names, args)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_job, index, url, name, args, variant_policy)
+                       for index, (url, name) in enumerate(zip(urls, names), 1)]
+            jobs = [future.result() for future in futures]
+    finally:
+        progress_log.close()
+        pool.close()
+    elapsed = time.monotonic() - started
+
+    total_bytes = sum(job["bytes"] for job in jobs if job["status"] == "completed")
+    summary = {
+        "jobs": jobs,
+        "totals": {
+            "urls": len(jobs),
+            "duplicates": duplicates,
+            "completed": sum(job["status"] == "completed" for job in jobs),
+            "skipped": sum(job["status"] == "skipped" for job in jobs),
+            "failed": sum(job["status"] == "failed" for job in jobs),
+            "bytes": total_bytes,
+            "duration_s": round(elapsed, 3),
+            "throughput_bps": round(total_bytes / elapsed, 1) if elapsed else 0.0,
+        },
+    }
+
+    text = json.dumps(summary, indent=2)
+    if args.summary == "-":
+        print(text)
+    else:
+        with open(args.summary, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    return 1 if summary["totals"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
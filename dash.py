@@ -0,0 +1,403 @@
+import os
+import re
+import math
+import time
+import threading
+import subprocess
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+from hls import DEFAULT_CONCURRENCY, DownloadCancelled, HLSDownloader, Segment, VariantPolicy, make_session
+
+
+# Native DASH settings, overridable through the environment
+# Size of the byte ranges a single-file (SegmentBase) representation is split into
+RANGE_CHUNK_SIZE = int(os.getenv("DASH_RANGE_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<days>[\d.]+)D)?(?:T(?:(?P<hours>[\d.]+)H)?(?:(?P<minutes>[\d.]+)M)?(?:(?P<seconds>[\d.]+)S)?)?$"
+)
+TEMPLATE_PATTERN = re.compile(r"\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$")
+VIDEO_CODECS = ("avc", "hvc", "hev", "vp8", "vp9", "vp09", "av01")
+AUDIO_CODECS = ("mp4a", "ac-3", "ec-3", "opus", "vorbis", "flac")
+
+
+class DashError(Exception):
+    pass
+
+
+# Function to strip the XML namespace from an element tag
+def local_name(element):
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def find_children(element, name):
+    return [child for child in element if local_name(child) == name] if element is not None else []
+
+
+def find_child(element, name):
+    children = find_children(element, name)
+    return children[0] if children else None
+
+
+# Function to convert an ISO 8601 duration ("PT1H2M3.5S") to seconds
+def parse_duration(value):
+    match = DURATION_PATTERN.match((value or "").strip())
+    if not match:
+        return None
+    parts = {name: float(number) for name, number in match.groupdict().items() if number}
+    return (parts.get("days", 0) * 86400 + parts.get("hours", 0) * 3600
+            + parts.get("minutes", 0) * 60 + parts.get("seconds", 0))
+
+
+# Function to fill in the $Identifier$ placeholders of a SegmentTemplate URL
+def expand_template(template, representation_id, bandwidth, number=None, time_value=None):
+    values = {"RepresentationID": representation_id, "Bandwidth": bandwidth, "Number": number, "Time": time_value}
+
+    def substitute(match):
+        value = values[match.group(1)]
+        if match.group(2) and isinstance(value, int):
+            return f"{value:0{int(match.group(2))}d}"
+        return str(value)
+
+    return TEMPLATE_PATTERN.sub(substitute, template).replace("$$", "$")
+
+
+# Function to resolve the BaseURL chain (MPD, Period, AdaptationSet, Representation) to an absolute URL
+def resolve_base_url(base_url, *elements):
+    for element in elements:
+        base = find_child(element, "BaseURL")
+        if base is not None and base.text:
+            base_url = urljoin(base_url, base.text.strip())
+    return base_url
+
+
+# Function to parse an "a-b" byte range attribute into an inclusive (start, end) tuple
+def parse_range(value):
+    start, _, end = value.partition("-")
+    return int(start), int(end)
+
+
+# Function to classify an adaptation set as "video", "audio" or something else
+def content_type(adaptation, representation):
+    kind = adaptation.get("contentType")
+    if kind:
+        return kind
+    mime = representation.get("mimeType") or adaptation.get("mimeType") or ""
+    if mime.startswith(("video/", "audio/")):
+        return mime.split("/", 1)[0]
+    codecs = (representation.get("codecs") or adaptation.get("codecs") or "").lower()
+    if codecs.startswith(VIDEO_CODECS):
+        return "video"
+    if codecs.startswith(AUDIO_CODECS):
+        return "audio"
+    if representation.get("height") or adaptation.get("height"):
+        return "video"
+    return None
+
+
+def is_protected(*elements):
+    return any(find_children(element, "ContentProtection") for element in elements)
+
+
+# Function to build the segment list of a representation from SegmentTemplate, SegmentList or SegmentBase.
+# Returns (init_segment, segments); segments is None for a single-file representation to be split later.
+def representation_segments(representation, adaptation, period, base_url, period_duration):
+    levels = (period, adaptation, representation)
+    representation_id = representation.get("id", "")
+    bandwidth = int(representation.get("bandwidth") or 0)
+
+    templates = [find_child(element, "SegmentTemplate") for element in levels]
+    templates = [template for template in templates if template is not None]
+    if templates:
+        attributes = {}
+        for template in templates:
+            attributes.update(template.attrib)
+        timeline = None
+        for template in templates:
+            if find_child(template, "SegmentTimeline") is not None:
+                timeline = find_child(template, "SegmentTimeline")
+        timescale = int(attributes.get("timescale", 1))
+        number = int(attributes.get("startNumber", 1))
+
+        init_segment = None
+        if attributes.get("initialization"):
+            init_url = expand_template(attributes["initialization"], representation_id, bandwidth)
+            init_segment = Segment(-1, urljoin(base_url, init_url), 0.0)
+
+        media = attributes.get("media")
+        if not media:
+            raise DashError("SegmentTemplate without a media attribute")
+        segments = []
+        if timeline is not None:
+            time_value = 0
+            end = period_duration * timescale if period_duration else None
+            entries = find_children(timeline, "S")
+            for position, entry in enumerate(entries):
+                time_value = int(entry.get("t", time_value))
+                duration = int(entry.get("d"))
+                repeat = int(entry.get("r", 0))
+                if repeat < 0:
+                    # Repeat until the next entry's start, or the end of the period
+                    next_start = int(entries[position + 1].get("t", 0)) if position + 1 < len(entries) else end
+                    if next_start is None:
+                        raise DashError("Open-ended SegmentTimeline without a period duration")
+                    repeat = max(0, math.ceil((next_start - time_value) / duration) - 1)
+                for _ in range(repeat + 1):
+                    url = expand_template(media, representation_id, bandwidth, number, time_value)
+                    segments.append(Segment(len(segments), urljoin(base_url, url), duration / timescale))
+                    time_value += duration
+                    number += 1
+        else:
+            duration = int(attributes.get("duration") or 0)
+            if not duration or not period_duration:
+                raise DashError("Cannot count segments without a duration")
+            count = math.ceil(period_duration * timescale / duration)
+            for index in range(count):
+                url = expand_template(media, representation_id, bandwidth, number + index, index * duration)
+                segments.append(Segment(index, urljoin(base_url, url), duration / timescale))
+        return init_segment, segments
+
+    segment_list = None
+    for element in levels:
+        if find_child(element, "SegmentList") is not None:
+            segment_list = find_child(element, "SegmentList")
+    if segment_list is not None:
+        init_segment = None
+        initialization = find_child(segment_list, "Initialization")
+        if initialization is not None:
+            init_segment = Segment(-1, urljoin(base_url, initialization.get("sourceURL", "")), 0.0)
+            if initialization.get("range"):
+                init_segment.byterange = parse_range(initialization.get("range"))
+        segments = []
+        for entry in find_children(segment_list, "SegmentURL"):
+            segment = Segment(len(segments), urljoin(base_url, entry.get("media", "")), 0.0)
+            if entry.get("mediaRange"):
+                segment.byterange = parse_range(entry.get("mediaRange"))
+            segments.append(segment)
+        return init_segment, segments
+
+    # SegmentBase or a bare BaseURL: the whole representation is one file
+    return None, None
+
+
+# Function to list the downloadable video and audio representations of a single-period MPD
+def parse_mpd(text, manifest_url):
+    try:
+        root = ElementTree.fromstring(text)
+    except ElementTree.ParseError as e:
+        raise DashError(f"Invalid MPD: {e}")
+    if local_name(root) != "MPD":
+        raise DashError("Not a DASH manifest")
+    if root.get("type") == "dynamic":
+        raise DashError("Live DASH streams are not supported")
+
+    periods = find_children(root, "Period")
+    if len(periods) != 1:
+        raise DashError(f"Expected one period, found {len(periods)}")
+    period = periods[0]
+    period_duration = parse_duration(period.get("duration"))
+    if period_duration is None:
+        total = parse_duration(root.get("mediaPresentationDuration"))
+        if total is not None:
+            period_duration = total - (parse_duration(period.get("start")) or 0)
+
+    representations = []
+    for adaptation in find_children(period, "AdaptationSet"):
+        roles = {role.get("value") for role in find_children(adaptation, "Role")}
+        for representation in find_children(adaptation, "Representation"):
+            kind = content_type(adaptation, representation)
+            if kind not in ("video", "audio") or is_protected(adaptation, representation):
+                continue
+            base_url = resolve_base_url(manifest_url, root, period, adaptation, representation)
+            height = representation.get("height") or adaptation.get("height")
+            representations.append({
+                "type": kind,
+                "id": representation.get("id", ""),
+                "url": base_url,
+                "bandwidth": int(representation.get("bandwidth") or 0),
+                "height": int(height) if height else None,
+                "codecs": representation.get("codecs") or adaptation.get("codecs"),
+                "lang": adaptation.get("lang"),
+                "main": "main" in roles,
+                "element": (representation, adaptation, period, base_url, period_duration),
+            })
+    if not any(item["type"] == "video" for item in representations):
+        raise DashError("MPD has no unprotected video representation")
+    return representations
+
+
+# Function to pick one video and at most one audio representation
+def select_representations(representations, variant_policy):
+    video = variant_policy.select([item for item in representations if item["type"] == "video"])
+    audio_items = [item for item in representations if item["type"] == "audio"]
+    audio = None
+    if audio_items:
+        # Stay within the main audio adaptation set, so all candidates share a language
+        main = [item for item in audio_items if item["main"]] or audio_items
+        candidates = [item for item in main if item["lang"] == main[0]["lang"]]
+        pick = min if variant_policy.mode == "smallest" else max
+        audio = pick(candidates, key=lambda item: item["bandwidth"])
+    return video, audio
+
+
+class TrackDownloader(HLSDownloader):
+    # Downloads one DASH representation with the HLS segment machinery:
+    # parallel fetches, in-order writes and a resumable checkpoint. The raw
+    # fragmented MP4 is left for the caller to mux.
+    def __init__(self, representation, output_file, **kwargs):
+        super().__init__(representation["url"], output_file, **kwargs)
+        self.representation = representation
+
+    def load_playlist(self):
+        init_segment, segments = representation_segments(*self.representation["element"])
+        if segments is None:
+            segments = self._split_file(self.representation["url"])
+        if not segments:
+            raise DashError(f"Representation {self.representation['id']} has no segments")
+        return None, init_segment, segments
+
+    # Split a single-file representation into byte ranges so it is fetched in parallel
+    def _split_file(self, url):
+        response = self.session.head(url, allow_redirects=True, timeout=20)
+        response.raise_for_status()
+        size = int(response.headers.get("Content-Length") or 0)
+        if not size or response.headers.get("Accept-Ranges", "bytes") == "none":
+            return [Segment(0, url, 0.0)]
+        return [Segment(index, url, 0.0, byterange=(start, min(start + RANGE_CHUNK_SIZE, size) - 1))
+                for index, start in enumerate(range(0, size, RANGE_CHUNK_SIZE))]
+
+
+class DashDownloader:
+    # Native DASH downloader.
+    #
+    # Picks a video representation by policy plus the main audio track and
+    # downloads both at once over one pooled session, each track with its own
+    # worker pool and checkpoint. ffmpeg then muxes them without re-encoding.
+    def __init__(self, manifest_url, output_file, concurrency=DEFAULT_CONCURRENCY,
+                 progress_callback=None, should_stop=None, is_paused=None, session=None,
+                 headers=None, ffmpeg_path=None, variant_policy=None, resume=True, trace=None,
+                 throttle=None, fence=None):
+        self.manifest_url = manifest_url
+        self.output_file = output_file
+        self.concurrency = max(1, concurrency)
+        self.progress_callback = progress_callback
+        self.should_stop = should_stop
+        self.is_paused = is_paused
+        # Both tracks share the connection pool
+        self.session = session or make_session(self.concurrency * 2)
+        if headers:
+            self.session.headers.update(headers)
+        self.ffmpeg_path = ffmpeg_path
+        self.variant_policy = variant_policy or VariantPolicy()
+        self.resume = resume
+        self.trace = trace
+        self.throttle = throttle
+        self.fence = fence
+        self.bytes_downloaded = 0
+        self._tracks = {}
+        self._fractions = {}
+        self._failed = threading.Event()
+        self._progress_lock = threading.Lock()
+        self._started = None
+
+    def _record(self, stage, started, **fields):
+        if self.trace is not None:
+            self.trace.record(stage, time.monotonic() - started, **fields)
+
+    # One failed track stops the other instead of letting it finish for nothing
+    def _stopped(self):
+        return self._failed.is_set() or bool(self.should_stop and self.should_stop())
+
+    def _on_track_progress(self, kind, fraction, status):
+        if not self.progress_callback:
+            return
+        with self._progress_lock:
+            self._fractions[kind] = fraction
+            weights = {name: max(track.representation["bandwidth"], 1) for name, track in self._tracks.items()}
+            overall = sum(self._fractions.get(name, 0.0) * weight for name, weight in weights.items())
+            overall /= sum(weights.values())
+            downloaded = sum(track.bytes_downloaded for track in self._tracks.values())
+            session_bytes = sum(track._session_bytes for track in self._tracks.values())
+            speed = session_bytes / max(time.monotonic() - self._started, 1e-6)
+            tracks = ", ".join(f"{name} {self._fractions.get(name, 0.0) * 100:.0f}%" for name in self._tracks)
+            self.progress_callback(
+                overall,
+                f"Downloading: {overall * 100:.1f}% ({downloaded / 1048576:.1f} MB, "
+                f"{speed / 1048576:.1f} MB/s; {tracks})"
+            )
+
+    # Download the selected tracks concurrently and mux them into output_file; returns the bytes fetched
+    def download(self):
+        started = time.monotonic()
+        response = self.session.get(self.manifest_url, timeout=20)
+        response.raise_for_status()
+        representations = parse_mpd(response.text, response.url)
+        video, audio = select_representations(representations, self.variant_policy)
+        self._record("manifest_selection", started, representations=len(representations))
+
+        for kind, representation in (("video", video), ("audio", audio)):
+            if representation is None:
+                continue
+            self._tracks[kind] = TrackDownloader(
+                representation, f"{self.output_file}.{kind}.mp4",
+                concurrency=self.concurrency,
+                progress_callback=lambda fraction, status, kind=kind: self._on_track_progress(kind, fraction, status),
+                should_stop=self._stopped, is_paused=self.is_paused, session=self.session,
+                resume=self.resume, throttle=self.throttle, fence=self.fence
+            )
+
+        self._started = started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(self._tracks), thread_name_prefix="mx-dash") as executor:
+            futures = [executor.submit(track.download) for track in self._tracks.values()]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                self._failed.set()
+                outcome = "cancelled" if self.should_stop and self.should_stop() else "error"
+                self._record("download", started, outcome=outcome,
+                             bytes=sum(track._session_bytes for track in self._tracks.values()),
+                             segments=sum(track._session_segments for track in self._tracks.values()))
+                raise
+        self.bytes_downloaded = sum(track.bytes_downloaded for track in self._tracks.values())
+        self._record("download", started, bytes=sum(track._session_bytes for track in self._tracks.values()),
+                     segments=sum(track._session_segments for track in self._tracks.values()))
+
+        if self.fence is not None and not self.fence():
+            raise DownloadCancelled()
+        started = time.monotonic()
+        mux_tracks(self.ffmpeg_path, [track.output_file for track in self._tracks.values()], self.output_file)
+        for track in self._tracks.values():
+            os.remove(track.output_file)
+        self._record("post_processing", started)
+        return self.bytes_downloaded
+
+
+# Function to mux downloaded DASH tracks into one MP4 without re-encoding
+def mux_tracks(ffmpeg_path, track_files, target):
+    if not ffmpeg_path:
+        raise DashError("ffmpeg is needed to mux DASH tracks")
+    command = [ffmpeg_path, "-y", "-loglevel", "error"]
+    for path in track_files:
+        command += ["-i", path]
+    command += ["-map", "0:v:0"]
+    if len(track_files) > 1:
+        command += ["-map", "1:a:0"]
+    command += ["-c", "copy", "-movflags", "+faststart", target]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise DashError(f"ffmpeg mux failed: {result.stderr.strip()[-500:]}")
+
+
+# Function to download a DASH manifest natively; returns the number of bytes fetched
+def download_dash(manifest_url, output_file, concurrency=DEFAULT_CONCURRENCY, progress_callback=None,
+                  should_stop=None, is_paused=None, ffmpeg_path=None, headers=None, variant_policy=None,
+                  resume=True, trace=None, throttle=None, fence=None):
+    downloader = DashDownloader(manifest_url, output_file, concurrency=concurrency,
+                                progress_callback=progress_callback, should_stop=should_stop,
+                                is_paused=is_paused, ffmpeg_path=ffmpeg_path, headers=headers,
+                                variant_policy=variant_policy, resume=resume, trace=trace,
+                                throttle=throttle, fence=fence)
+    return downloader.download()
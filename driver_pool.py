@@ -0,0 +1,239 @@
+import os
+import queue
+import threading
+import time
+import warnings
+from urllib.parse import urlsplit
+
+try:
+    import psutil
+except ImportError:  # Memory-based recycling is skipped without psutil
+    psutil = None
+
+
+# Pool sizing and recycling limits, overridable through the environment
+DEFAULT_POOL_SIZE = int(os.getenv("CHROME_POOL_SIZE", "2"))
+DEFAULT_MAX_USES = int(os.getenv("CHROME_POOL_MAX_USES", "20"))
+DEFAULT_MAX_MEMORY_MB = float(os.getenv("CHROME_POOL_MAX_MEMORY_MB", "0")) or None
+DEFAULT_CHECKOUT_TIMEOUT = float(os.getenv("CHROME_POOL_CHECKOUT_TIMEOUT", "120"))
+# Comma-separated origins whose storage is cleared between jobs, on top of the origins of the open tabs
+CLEAR_STORAGE_ORIGINS = os.getenv(
+    "CHROME_POOL_CLEAR_ORIGINS", "https://www.mxplayer.in,https://mxplayer.in,https://api.mxplayer.in"
+)
+
+
+# Function to get the scheme://host[:port] origin of a page URL, or None for about:, data: and the like
+def page_origin(url):
+    parts = urlsplit(url or "")
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class PooledDriver:
+    # Book-keeping wrapper around a live WebDriver owned by the pool
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class ChromeDriverPool:
+    # A fixed-size pool of pre-launched headless Chrome instances.
+    #
+    # Drivers are checked out per job with acquire()/release() (or the
+    # checkout() context manager), health-checked before being handed out,
+    # reset between jobs and recycled after max_uses jobs or once the browser
+    # process tree grows past max_memory_mb.
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES,
+                 max_memory_mb=DEFAULT_MAX_MEMORY_MB, prewarm=True):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        if max_memory_mb and psutil is None:
+            warnings.warn("psutil is not installed; memory-based Chrome recycling is disabled", RuntimeWarning)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        if prewarm:
+            for _ in range(self.size):
+                threading.Thread(target=self._warm_one, daemon=True).start()
+
+    # Launch one browser in the background and park it in the idle queue
+    def _warm_one(self):
+        if not self._reserve_slot():
+            return
+        try:
+            self._idle.put(PooledDriver(self.factory()))
+        except Exception:
+            self._free_slot()
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._closed or self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _free_slot(self):
+        with self._lock:
+            self._created -= 1
+
+    # Cheap liveness probe: a dead browser or driver raises here
+    def _is_healthy(self, pooled):
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _destroy(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        self._free_slot()
+
+    # Resident memory of the chromedriver process and all its Chrome children
+    def _memory_mb(self, pooled):
+        if psutil is None:
+            return None
+        try:
+            root = psutil.Process(pooled.driver.service.process.pid)
+            procs = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def _needs_recycle(self, pooled):
+        if self.max_uses and pooled.uses >= self.max_uses:
+            return True
+        if self.max_memory_mb:
+            memory = self._memory_mb(pooled)
+            if memory is not None and memory > self.max_memory_mb:
+                return True
+        return False
+
+    # Return the browser to a blank state so the next job starts clean
+    def _reset(self, pooled):
+        driver = pooled.driver
+        origins = [origin.strip() for origin in CLEAR_STORAGE_ORIGINS.split(",") if origin.strip()]
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            origins.append(page_origin(driver.current_url))
+            driver.close()
+        driver.switch_to.window(handles[0])
+        origins.append(page_origin(driver.current_url))
+        driver.get("about:blank")
+        # Cookies are cleared browser-wide; delete_all_cookies() only covers the current page
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        # Storage can only be cleared one origin at a time
+        for origin in dict.fromkeys(origin for origin in origins if origin):
+            try:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            except Exception as e:
+                warnings.warn(f"Could not clear Chrome storage for {origin}: {e}", RuntimeWarning)
+        # Drain the performance log so old events never leak into the next job
+        driver.get_log("performance")
+
+    # Check out a healthy driver, launching one if the pool is not yet full
+    def acquire(self, timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._closed:
+                raise RuntimeError("Chrome driver pool is closed")
+
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = None
+
+            if pooled is None and self._reserve_slot():
+                try:
+                    pooled = PooledDriver(self.factory())
+                except Exception:
+                    self._free_slot()
+                    raise
+
+            if pooled is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free Chrome driver")
+                try:
+                    pooled = self._idle.get(timeout=min(remaining, 1.0))
+                except queue.Empty:
+                    continue
+
+            if not self._is_healthy(pooled):
+                self._destroy(pooled)
+                continue
+
+            try:
+                pooled.driver.get_log("performance")
+            except Exception:
+                pass
+            pooled.uses += 1
+            pooled.driver._pool_entry = pooled
+            return pooled.driver
+
+    # Give a driver back to the pool; broken or worn-out drivers are replaced
+    def release(self, driver, discard=False):
+        pooled = getattr(driver, "_pool_entry", None)
+        if pooled is None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return
+
+        driver._pool_entry = None
+        if not discard and not self._closed:
+            try:
+                self._reset(pooled)
+            except Exception:
+                discard = True
+
+        if discard or self._closed or self._needs_recycle(pooled):
+            self._destroy(pooled)
+            if not self._closed:
+                threading.Thread(target=self._warm_one, daemon=True).start()
+            return
+
+        self._idle.put(pooled)
+
+    # Context manager wrapper around acquire()/release()
+    def checkout(self, timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        pool = self
+
+        class _Checkout:
+            def __enter__(self):
+                self.driver = pool.acquire(timeout)
+                return self.driver
+
+            def __exit__(self, exc_type, exc, tb):
+                pool.release(self.driver)
+                return False
+
+        return _Checkout()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": self._idle.qsize(),
+        }
+
+    # Quit every idle browser; checked-out drivers are quit when released
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(pooled)
@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+
+
+# Progress event settings, overridable through the environment
+# Most updates per second each kind of subscriber receives for one job
+UI_EVENT_RATE = float(os.getenv("UI_EVENT_RATE", "4"))
+LOG_EVENT_RATE = float(os.getenv("LOG_EVENT_RATE", "0.5"))
+METRICS_EVENT_RATE = float(os.getenv("METRICS_EVENT_RATE", "1"))
+
+
+class ProgressEvent:
+    # One progress update of a job. stage is "extract", "download" or
+    # "postprocess" while the job runs; the final event carries the outcome
+    # ("completed", "cancelled" or "failed") instead.
+    __slots__ = ("job_id", "stage", "progress", "message", "transfer", "final", "time")
+
+    def __init__(self, job_id, stage, progress, message, transfer=None, final=False):
+        self.job_id = job_id
+        self.stage = stage
+        self.progress = progress
+        self.message = message
+        self.transfer = transfer or {}
+        self.final = final
+        self.time = time.monotonic()
+
+
+class Subscription:
+    # One subscriber and its coalescing state.
+    #
+    # At most one event per job is delivered every 1/max_rate seconds; events
+    # arriving in between replace each other and only the newest is delivered
+    # once the interval is up. Stage changes and final events are delivered
+    # at once so nothing important waits behind the rate limit.
+    #
+    # A final event drops the job's pending event, and deliveries to one
+    # subscriber are serialized, so nothing for a job arrives after its final event.
+    def __init__(self, bus, callback, max_rate=None, stages=None):
+        self.bus = bus
+        self.callback = callback
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.stages = set(stages) if stages else None
+        self._pending = {}
+        self._last_sent = {}
+        self._last_stage = {}
+        self._lock = threading.Lock()
+        # Held from taking an event to delivering it; reentrant so a callback may publish
+        self._delivery_lock = threading.RLock()
+
+    # Take an event; returns (event to deliver now or None, whether it was left pending)
+    def _offer(self, event, now):
+        if self.stages is not None and event.stage not in self.stages and not event.final:
+            return None, False
+        job_id = event.job_id
+        with self._lock:
+            immediate = (event.final or self._last_stage.get(job_id) != event.stage
+                         or now - self._last_sent.get(job_id, 0.0) >= self.interval)
+            if not immediate:
+                newly_pending = job_id not in self._pending
+                self._pending[job_id] = event
+                return None, newly_pending
+            self._pending.pop(job_id, None)
+            if event.final:
+                self._last_sent.pop(job_id, None)
+                self._last_stage.pop(job_id, None)
+            else:
+                self._last_sent[job_id] = now
+                self._last_stage[job_id] = event.stage
+            return event, False
+
+    # Pending events whose interval is up, and when the next one will be
+    def _take_due(self, now):
+        due = []
+        next_due = None
+        with self._lock:
+            for job_id, event in list(self._pending.items()):
+                due_at = self._last_sent.get(job_id, 0.0) + self.interval
+                if due_at <= now:
+                    del self._pending[job_id]
+                    self._last_sent[job_id] = now
+                    due.append(event)
+                elif next_due is None or due_at < next_due:
+                    next_due = due_at
+        return due, next_due
+
+    def _deliver(self, event):
+        try:
+            self.callback(event)
+        except Exception:
+            # A broken subscriber must not take the download down with it
+            pass
+
+    # Offer an event from a producer and deliver it if it is due; returns whether it was newly parked
+    def _publish(self, event, now):
+        with self._delivery_lock:
+            deliver, newly_pending = self._offer(event, now)
+            if deliver is not None:
+                self._deliver(deliver)
+        return newly_pending
+
+    # Deliver the parked events that are due; returns when the next one will be
+    def _flush(self, now):
+        with self._delivery_lock:
+            due, next_due = self._take_due(now)
+            for event in due:
+                self._deliver(event)
+        return next_due
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    # Carries progress events from the pipeline (producers) to the UI job
+    # manager, the CLI log and metrics (subscribers).
+    #
+    # publish() is cheap: an event due for a subscriber is delivered on the
+    # producer's thread, anything else is parked as that subscriber's newest
+    # event for the job and delivered later by a single flusher thread.
+    def __init__(self):
+        self._subscriptions = ()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+
+    # Register callback(event); max_rate caps deliveries per job per second, stages filters by stage
+    def subscribe(self, callback, max_rate=None, stages=None):
+        subscription = Subscription(self, callback, max_rate, stages)
+        with self._lock:
+            self._subscriptions += (subscription,)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="mx-events", daemon=True)
+                self._flusher.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions = tuple(other for other in self._subscriptions if other is not subscription)
+
+    def publish(self, event):
+        now = time.monotonic()
+        for subscription in self._subscriptions:
+            if subscription._publish(event, now):
+                self._wakeup.set()
+
+    def _flush_loop(self):
+        while True:
+            # Cleared before the scan, so an event parked during the scan still wakes the wait below
+            self._wakeup.clear()
+            now = time.monotonic()
+            next_due = None
+            for subscription in self._subscriptions:
+                subscription_next = subscription._flush(now)
+                if subscription_next is not None and (next_due is None or subscription_next < next_due):
+                    next_due = subscription_next
+            self._wakeup.wait(None if next_due is None else max(0.0, next_due - time.monotonic()))
+
+
+# Function to build a progress callback that publishes a job's updates on a bus.
+# The stage comes from state.stage; callback, if given, still sees every update.
+def publisher(bus, job_id, state, callback=None):
+    def report(progress, message):
+        if callback is not None:
+            callback(progress, message)
+        bus.publish(ProgressEvent(job_id, getattr(state, "stage", None), progress, message, state.transfer))
+
+    return report
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+# Process-wide event bus
+def get_event_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = EventBus()
+        return _bus
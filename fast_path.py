@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import threading
+from collections import Counter
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from manifest import MANIFEST_BODY_PATTERN, score_candidate
+
+
+# Fast-path settings, overridable through the environment
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1").lower() in ("1", "true", "yes")
+FAST_PATH_TIMEOUT = float(os.getenv("FAST_PATH_TIMEOUT", "8"))
+# Base URL that relative stream paths in MX Player's page data are resolved against
+STREAM_BASE_URL = os.getenv("MX_STREAM_BASE_URL", "https://llvod.mxplay.com/")
+# Backing JSON API; {type} and {id} are filled from the page URL. Empty disables the API lookup.
+API_URL_TEMPLATE = os.getenv(
+    "MX_API_URL_TEMPLATE",
+    "https://api.mxplayer.in/v1/web/detail/video?type={type}&id={id}"
+)
+
+NEXT_DATA_PATTERN = re.compile(
+    r'<script[^>]+id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.DOTALL
+)
+STATE_PATTERN = re.compile(
+    r'window\.(?:__INITIAL_STATE__|__PRELOADED_STATE__|state)\s*=\s*(\{.*?\})\s*;?\s*</script>', re.DOTALL
+)
+# MX Player page URLs end in "-<32 hex id>"
+VIDEO_ID_PATTERN = re.compile(r'-([0-9a-f]{32})/?$', re.IGNORECASE)
+STREAM_KEYS = {"hls", "dash", "hlsurl", "dashurl", "manifest", "manifesturl", "playbackurl"}
+MANIFEST_PATH_PATTERN = re.compile(r'\.(?:m3u8|mpd)(?:\?|$)')
+
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Which extraction path resolved each job: "cache", "fast" or "browser"
+extraction_stats = Counter()
+_stats_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+# Function to get the shared keep-alive HTTP session
+def get_http_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=1)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(BROWSER_HEADERS)
+            _session = session
+        return _session
+
+
+# Function to record which path resolved a job
+def record_extraction_path(path):
+    with _stats_lock:
+        extraction_stats[path] += 1
+
+
+# Function to report extraction path counts and the fast-path hit rate
+def get_extraction_stats():
+    with _stats_lock:
+        stats = dict(extraction_stats)
+    resolved = stats.get("fast", 0) + stats.get("browser", 0)
+    stats["fast_path_hit_rate"] = stats.get("fast", 0) / resolved if resolved else 0.0
+    return stats
+
+
+# Function to walk embedded JSON and collect anything that looks like a stream manifest.
+# Relative paths are only trusted below a stream-ish key such as "hls" or "dash".
+def find_stream_urls(data, base_url=STREAM_BASE_URL, in_stream=False):
+    found = []
+    if isinstance(data, dict):
+        for key, value in data.items():
+            found.extend(find_stream_urls(value, base_url, in_stream or str(key).lower() in STREAM_KEYS))
+    elif isinstance(data, list):
+        for value in data:
+            found.extend(find_stream_urls(value, base_url, in_stream))
+    elif isinstance(data, str) and MANIFEST_PATH_PATTERN.search(data):
+        if data.startswith("https://"):
+            found.append(data)
+        elif in_stream and not data.startswith(("http://", "data:")):
+            # Relative stream paths are served from MX Player's VOD CDN
+            found.append(urljoin(base_url, data.lstrip("/")))
+    return found
+
+
+# Function to pull embedded JSON blobs out of a page's HTML
+def extract_embedded_data(html):
+    blobs = []
+    for pattern in (NEXT_DATA_PATTERN, STATE_PATTERN):
+        for match in pattern.finditer(html):
+            try:
+                blobs.append(json.loads(match.group(1)))
+            except ValueError:
+                continue
+    return blobs
+
+
+# Function to build the backing API URL for an MX Player page, if it can be derived
+def get_api_url(page_url):
+    if not API_URL_TEMPLATE:
+        return None
+    path = urlsplit(page_url).path
+    match = VIDEO_ID_PATTERN.search(path)
+    if not match:
+        return None
+    video_type = "movie" if "/movie/" in path else "episode"
+    return API_URL_TEMPLATE.format(type=video_type, id=match.group(1))
+
+
+# Function to rank and dedupe fast-path candidates the same way the browser path does
+def rank_candidates(candidates):
+    best = {}
+    for order, (url, source) in enumerate(candidates):
+        score = score_candidate(url, source)
+        if url not in best:
+            best[url] = (score, order)
+        elif score > best[url][0]:
+            best[url] = (score, best[url][1])
+    return [url for url, _ in sorted(best.items(), key=lambda item: (-item[1][0], item[1][1]))]
+
+
+# Function to resolve stream manifests over plain HTTP, without a browser.
+# Returns ranked manifest URLs, or an empty list when the page data has none.
+def extract_video_urls_fast(page_url, session=None, timeout=FAST_PATH_TIMEOUT):
+    session = session or get_http_session()
+    candidates = []
+
+    try:
+        response = session.get(page_url, timeout=timeout)
+        response.raise_for_status()
+        html = response.text
+        for blob in extract_embedded_data(html):
+            candidates.extend((url, "api") for url in find_stream_urls(blob))
+        if not candidates:
+            candidates.extend((url, "document") for url in MANIFEST_BODY_PATTERN.findall(html))
+    except requests.RequestException:
+        pass
+
+    api_url = get_api_url(page_url)
+    if not candidates and api_url:
+        try:
+            response = session.get(api_url, timeout=timeout, headers={"Referer": page_url})
+            response.raise_for_status()
+            candidates.extend((url, "api") for url in find_stream_urls(response.json()))
+        except (requests.RequestException, ValueError):
+            pass
+
+    return rank_candidates(candidates)
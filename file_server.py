@@ -0,0 +1,197 @@
+import os
+import re
+import secrets
+import mimetypes
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+
+
+# File server settings, overridable through the environment
+FILE_SERVER_HOST = os.getenv("FILE_SERVER_HOST", "0.0.0.0")
+# Port of the file server; 0 picks a free port, "off" disables it
+FILE_SERVER_PORT = os.getenv("FILE_SERVER_PORT", "8502")
+# URL the browser uses to reach the server, e.g. through a reverse proxy route. Hosts that
+# only expose the Streamlit port (such as Render) must set this, or finished videos cannot
+# be downloaded; without it links are only offered to browsers on this machine.
+FILE_SERVER_PUBLIC_URL = os.getenv("FILE_SERVER_PUBLIC_URL", "")
+CHUNK_SIZE = 1024 * 1024
+
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+# Function to turn a Range header into an inclusive (start, end) pair, or None if unsatisfiable
+def parse_range(header, size):
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or size == 0:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return None
+    return start, end
+
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MXFileServer/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _lookup(self):
+        parts = urlsplit(self.path)
+        match = re.match(r'^/files/([A-Za-z0-9_-]+)$', parts.path)
+        if not match:
+            return None, None
+        entry = self.server.registry.get(match.group(1))
+        return entry, parse_qs(parts.query)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        entry, query = self._lookup()
+        if entry is None or not os.path.exists(entry["path"]):
+            self.send_error(404)
+            return
+
+        path, filename = entry["path"], entry["filename"]
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+
+        range_header = self.headers.get("Range")
+        if range_header:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start, end = byte_range
+            status = 206
+
+        length = max(end - start + 1, 0)
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        disposition = "attachment" if "download" in query else "inline"
+        self.send_header("Content-Disposition", f"{disposition}; filename*=UTF-8''{quote(filename)}")
+        self.end_headers()
+
+        if not send_body or length == 0:
+            return
+
+        # Stream the requested range from disk in fixed-size chunks
+        with open(path, "rb") as file:
+            file.seek(start)
+            remaining = length
+            try:
+                while remaining > 0:
+                    chunk = file.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # The player routinely drops connections when seeking
+                pass
+
+
+class FileServer:
+    # Serves completed downloads straight from disk so the UI only holds a URL.
+    #
+    # Files are registered under an unguessable token and served at
+    # /files/<token> with HTTP Range support (for seeking in the preview);
+    # ?download=1 marks the response as an attachment.
+    def __init__(self, host=FILE_SERVER_HOST, port=0, public_url=FILE_SERVER_PUBLIC_URL):
+        self.public_url = public_url.rstrip("/") or None
+        self._registry = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), FileRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.registry = self._registry
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mx-file-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    # Register a file and return its token; registering the same key again returns the same token
+    def register(self, path, filename=None, key=None):
+        with self._lock:
+            if key is not None and key in self._keys:
+                return self._keys[key]
+            token = secrets.token_urlsafe(16)
+            self._registry[token] = {"path": os.path.abspath(path), "filename": filename or os.path.basename(path)}
+            if key is not None:
+                self._keys[key] = token
+            return token
+
+    def unregister(self, token=None, key=None):
+        with self._lock:
+            if key is not None:
+                token = self._keys.pop(key, None)
+            if token is not None:
+                self._registry.pop(token, None)
+
+    # Base URL a browser that reached the page at page_host can use, or None when the
+    # server is not known to be reachable from there
+    def base_url_for(self, page_host=None):
+        if self.public_url:
+            return self.public_url
+        hostname = urlsplit(f"//{page_host or ''}").hostname
+        if hostname in LOOPBACK_HOSTS:
+            return f"http://{f'[{hostname}]' if ':' in hostname else hostname}:{self.port}"
+        return None
+
+    def url_for(self, token, download=False, base_url=None):
+        return f"{base_url or self.public_url}/files/{token}" + ("?download=1" if download else "")
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Process-wide file server, started on first use; None when disabled or the port is taken
+def get_file_server(port=FILE_SERVER_PORT):
+    global _server
+    with _server_lock:
+        if _server is None and str(port).lower() not in ("", "off", "none"):
+            try:
+                _server = FileServer(port=int(port))
+            except OSError:
+                return None
+        return _server
+
+
+# Function to stop serving a job's file, if the file server is running
+def release_file(key):
+    with _server_lock:
+        server = _server
+    if server is not None:
+        server.unregister(key=key)
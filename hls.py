@@ -0,0 +1,680 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Native downloader settings, overridable through the environment
+DEFAULT_CONCURRENCY = int(os.getenv("HLS_CONCURRENCY", "8"))
+SEGMENT_TIMEOUT = float(os.getenv("HLS_SEGMENT_TIMEOUT", "20"))
+SEGMENT_RETRIES = int(os.getenv("HLS_SEGMENT_RETRIES", "3"))
+# Minimum seconds between checkpoint writes
+CHECKPOINT_INTERVAL = float(os.getenv("HLS_CHECKPOINT_INTERVAL", "1"))
+CHECKPOINT_VERSION = 2
+# Read size when segments are streamed through a bandwidth throttle
+THROTTLE_CHUNK_SIZE = 64 * 1024
+
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+# Master playlist attributes that must agree before a mirror's segments are mixed with the primary's
+VARIANT_ATTRIBUTES = ("bandwidth", "resolution", "codecs")
+
+
+class HLSError(Exception):
+    pass
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class Segment:
+    def __init__(self, index, uri, duration, key=None, iv=None, byterange=None):
+        self.index = index
+        self.uri = uri
+        self.duration = duration
+        self.key = key
+        self.iv = iv
+        self.byterange = byterange
+
+
+class Mirror:
+    # One source of the stream (a manifest URL found during extraction), its
+    # parsed segments and how well it has served the current download
+    def __init__(self, url):
+        self.url = url
+        # Master playlist entry the segments were picked from, or None for a media playlist URL
+        self.variant = None
+        self.init_segment = None
+        self.segments = None
+        # False once its playlist failed to load or does not line up with the primary's
+        self.usable = True
+        self.bytes = 0
+        self.seconds = 0.0
+        self.segments_fetched = 0
+        self.failures = 0
+
+    # Bytes/s per request while this mirror delivered segments
+    @property
+    def throughput(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return {
+            "url": self.url.split("?", 1)[0],
+            "segments": self.segments_fetched,
+            "bytes": self.bytes,
+            "failures": self.failures,
+            "throughput_bps": round(self.throughput, 1),
+        }
+
+
+# Function to parse an "A=1,B="x"" attribute list from an HLS tag
+def parse_attributes(text):
+    return {name: value.strip('"') for name, value in ATTRIBUTE_PATTERN.findall(text)}
+
+
+def is_master_playlist(text):
+    return "#EXT-X-STREAM-INF" in text
+
+
+# Function to list the variant streams of a master playlist
+def parse_master_playlist(text, base_url):
+    variants = []
+    attributes = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attributes = parse_attributes(line.split(":", 1)[1])
+        elif line and not line.startswith("#") and attributes is not None:
+            resolution = attributes.get("RESOLUTION")
+            height = None
+            if resolution and "x" in resolution:
+                height = int(resolution.lower().split("x")[1])
+            variants.append({
+                "url": urljoin(base_url, line),
+                "bandwidth": int(attributes.get("AVERAGE-BANDWIDTH") or attributes.get("BANDWIDTH") or 0),
+                "resolution": resolution,
+                "height": height,
+                "codecs": attributes.get("CODECS"),
+            })
+            attributes = None
+    return variants
+
+
+# Codec preference for tie-breaks: H.264 plays everywhere, including the browser preview
+CODEC_RANK = (("avc1", 3), ("avc3", 3), ("hvc1", 2), ("hev1", 2), ("vp09", 1), ("av01", 1))
+
+VARIANT_POLICIES = {
+    "best": "Maximum quality",
+    "target": "Target resolution",
+    "bandwidth": "Bandwidth cap",
+    "smallest": "Smallest size",
+}
+
+
+def codec_rank(variant):
+    codecs = (variant.get("codecs") or "").lower()
+    for prefix, rank in CODEC_RANK:
+        if prefix in codecs:
+            return rank
+    return 0
+
+
+class VariantPolicy:
+    # How to pick one rendition out of a master playlist.
+    #
+    # mode is one of VARIANT_POLICIES: "best" takes the highest resolution and
+    # bitrate, "target" the highest rendition at or below target_height,
+    # "bandwidth" the highest rendition within max_bandwidth (bits/s) and
+    # "smallest" the lowest bitrate. When nothing satisfies a limit the
+    # smallest rendition is used.
+    def __init__(self, mode="best", target_height=None, max_bandwidth=None):
+        if mode not in VARIANT_POLICIES:
+            raise ValueError(f"Unknown variant policy: {mode}")
+        self.mode = mode
+        self.target_height = target_height
+        self.max_bandwidth = max_bandwidth
+
+    def __repr__(self):
+        return f"VariantPolicy({self.mode!r}, target_height={self.target_height}, max_bandwidth={self.max_bandwidth})"
+
+    # Function to describe the policy by what it selects: only the fields its mode uses,
+    # and a target or cap without a value counts as "best", which select() falls back to
+    def identity(self):
+        if self.mode == "target" and self.target_height:
+            return f"target:{int(self.target_height)}"
+        if self.mode == "bandwidth" and self.max_bandwidth:
+            return f"bandwidth:{int(self.max_bandwidth)}"
+        return "smallest" if self.mode == "smallest" else "best"
+
+    # Function to rank variants from best to worst by resolution, bitrate and codec
+    @staticmethod
+    def rank(variants):
+        return sorted(variants, key=lambda v: (v.get("height") or 0, v["bandwidth"], codec_rank(v)), reverse=True)
+
+    def select(self, variants):
+        # Audio-only renditions are only considered when there is nothing else
+        video_variants = [v for v in variants if v.get("height") or "avc" in (v.get("codecs") or "")]
+        ranked = self.rank(video_variants or variants)
+        if not ranked:
+            return None
+
+        smallest = min(ranked, key=lambda v: (v["bandwidth"], -codec_rank(v)))
+        if self.mode == "smallest":
+            return smallest
+        if self.mode == "target" and self.target_height:
+            eligible = [v for v in ranked if (v.get("height") or 0) <= self.target_height]
+            return eligible[0] if eligible else smallest
+        if self.mode == "bandwidth" and self.max_bandwidth:
+            eligible = [v for v in ranked if v["bandwidth"] <= self.max_bandwidth]
+            return max(eligible, key=lambda v: (v["bandwidth"], codec_rank(v))) if eligible else smallest
+        return ranked[0]
+
+    # Function to express the policy as a yt-dlp format selector
+    def ytdlp_format(self):
+        if self.mode == "smallest":
+            return "wv*+wa/w"
+        if self.mode == "target" and self.target_height:
+            height = int(self.target_height)
+            return f"bv*[height<={height}]+ba/b[height<={height}]/wv*+ba/w"
+        if self.mode == "bandwidth" and self.max_bandwidth:
+            kbps = int(self.max_bandwidth / 1000)
+            return f"b[tbr<={kbps}]/bv*[tbr<={kbps}]+ba/w"
+        return "bv*+ba/b"
+
+
+# Function to parse a media playlist into segments plus an optional init (EXT-X-MAP) segment
+def parse_media_playlist(text, base_url):
+    if not text.lstrip().startswith("#EXTM3U"):
+        raise HLSError("Not an HLS playlist")
+
+    segments = []
+    init_segment = None
+    media_sequence = 0
+    duration = 0.0
+    key = None
+    byterange = None
+    next_offset = 0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            media_sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",")[0] or 0)
+        elif line.startswith("#EXT-X-KEY:"):
+            attributes = parse_attributes(line.split(":", 1)[1])
+            method = attributes.get("METHOD", "NONE")
+            if method == "NONE":
+                key = None
+            elif method == "AES-128":
+                key = {"uri": urljoin(base_url, attributes["URI"]), "iv": attributes.get("IV")}
+            else:
+                raise HLSError(f"Unsupported HLS encryption method: {method}")
+        elif line.startswith("#EXT-X-MAP:"):
+            attributes = parse_attributes(line.split(":", 1)[1])
+            init_segment = Segment(-1, urljoin(base_url, attributes["URI"]), 0.0)
+            if "BYTERANGE" in attributes:
+                init_segment.byterange = parse_byterange(attributes["BYTERANGE"], 0)
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            byterange = parse_byterange(line.split(":", 1)[1], next_offset)
+            next_offset = byterange[1] + 1
+        elif not line.startswith("#"):
+            sequence = media_sequence + len(segments)
+            iv = None
+            if key is not None:
+                iv = bytes.fromhex(key["iv"][2:]) if key["iv"] else sequence.to_bytes(16, "big")
+            segments.append(Segment(len(segments), urljoin(base_url, line), duration,
+                                    key["uri"] if key else None, iv, byterange))
+            duration = 0.0
+            byterange = None
+
+    if not segments:
+        raise HLSError("Media playlist contains no segments")
+    return init_segment, segments
+
+
+# Function to turn "length[@offset]" into an inclusive (start, end) byte range
+def parse_byterange(value, default_offset):
+    length, _, offset = value.partition("@")
+    start = int(offset) if offset else default_offset
+    return start, start + int(length) - 1
+
+
+# Function to build a keep-alive session sized for the segment workers
+def make_session(concurrency):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(concurrency, 4))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Function to fingerprint a segment list independently of the host and signed query
+# strings, so a checkpoint still matches after the CDN issues fresh tokens or the
+# download moves to a mirror serving the same paths
+def playlist_fingerprint(init_segment, segments):
+    digest = hashlib.sha1()
+    for segment in ([init_segment] if init_segment else []) + segments:
+        digest.update(urlsplit(segment.uri).path.encode())
+        digest.update(repr(segment.byterange).encode())
+    return digest.hexdigest()
+
+
+# Function to take the last path components of a URL, which name a rendition's files
+# independently of the host and any path prefix a mirror adds
+def path_tail(uri, depth=2):
+    return "/".join(urlsplit(uri).path.rsplit("/", depth)[-depth:]) if uri else None
+
+
+# Function to tell whether two segments are the same bytes on different sources
+def same_segment(segment, other):
+    return (abs(segment.duration - other.duration) < 0.05 and segment.byterange == other.byterange
+            and path_tail(segment.uri) == path_tail(other.uri)
+            and path_tail(segment.key) == path_tail(other.key) and segment.iv == other.iv)
+
+
+# Function to tell whether a mirror serves the same rendition as the primary, so any
+# segment can be taken from either by index. Renditions of one video are cut on the
+# same boundaries, so durations alone cannot tell them apart: the variant attributes,
+# init segment, segment paths and keys have to match as well.
+def same_rendition(primary, mirror):
+    if primary.variant and mirror.variant and any(
+            primary.variant.get(name) != mirror.variant.get(name) for name in VARIANT_ATTRIBUTES):
+        return False
+    if (primary.init_segment is None) != (mirror.init_segment is None):
+        return False
+    if primary.init_segment is not None and not same_segment(primary.init_segment, mirror.init_segment):
+        return False
+    return len(primary.segments) == len(mirror.segments) and all(
+        same_segment(segment, alternate) for segment, alternate in zip(primary.segments, mirror.segments)
+    )
+
+
+class Checkpoint:
+    # On-disk record of how far a download got.
+    #
+    # Segments are written in playlist order, so progress is the number of
+    # completed segments plus the byte offset of the raw output after them.
+    # The data is flushed before the checkpoint that covers it is written, so
+    # the recorded offset never runs ahead of the file.
+    def __init__(self, path, fingerprint, total):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.total = total
+        self.completed = 0
+        self.offset = 0
+        self._last_write = 0.0
+
+    # Load a matching checkpoint for raw_file, or return a fresh one
+    @classmethod
+    def load(cls, path, fingerprint, total, raw_file):
+        checkpoint = cls(path, fingerprint, total)
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return checkpoint
+        if (data.get("version") == CHECKPOINT_VERSION and data.get("fingerprint") == fingerprint
+                and data.get("total") == total and os.path.exists(raw_file)
+                and os.path.getsize(raw_file) >= data.get("offset", 0)):
+            checkpoint.completed = data["completed"]
+            checkpoint.offset = data["offset"]
+        return checkpoint
+
+    def save(self, completed, offset, force=False):
+        self.completed = completed
+        self.offset = offset
+        now = time.monotonic()
+        if not force and now - self._last_write < CHECKPOINT_INTERVAL:
+            return
+        self._last_write = now
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "fingerprint": self.fingerprint,
+                "total": self.total,
+                "completed": completed,
+                "offset": offset,
+                "updated_at": time.time(),
+            }, handle)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class HLSDownloader:
+    # Parallel HLS segment downloader.
+    #
+    # Segments are fetched by a pool of workers sharing one keep-alive session
+    # and written to the output strictly in playlist order. At most
+    # 2 * concurrency segments are buffered in memory at a time. Progress is
+    # checkpointed next to the output, so a cancelled, crashed or restarted
+    # download continues from the last completed segment.
+    #
+    # mirrors are alternate manifest URLs for the same video. If the playlist
+    # cannot be loaded the next mirror takes over, and a segment that keeps
+    # failing is fetched from the mirrors instead; the mirror that delivers it
+    # serves the following segments. Segments already written are kept.
+    def __init__(self, playlist_url, output_file, concurrency=DEFAULT_CONCURRENCY,
+                 progress_callback=None, should_stop=None, is_paused=None, session=None,
+                 headers=None, ffmpeg_path=None, variant_policy=None, resume=True, trace=None,
+                 throttle=None, mirrors=(), fence=None):
+        self.playlist_url = playlist_url
+        self.mirrors = [Mirror(url) for url in dict.fromkeys([playlist_url, *mirrors])]
+        self._active = self.mirrors[0]
+        # Mirror whose playlist the download follows; others must serve the same rendition
+        self._source = self.mirrors[0]
+        self._mirror_lock = threading.Lock()
+        self._mirror_load_lock = threading.Lock()
+        self.variant_policy = variant_policy or VariantPolicy()
+        self.output_file = output_file
+        self.concurrency = max(1, concurrency)
+        self.progress_callback = progress_callback
+        self.should_stop = should_stop
+        self.is_paused = is_paused
+        self.session = session or make_session(self.concurrency)
+        if headers:
+            self.session.headers.update(headers)
+        self.ffmpeg_path = ffmpeg_path
+        self.resume = resume
+        # Optional JobTrace that receives manifest_selection/download/post_processing timings
+        self.trace = trace
+        # Optional callable taking a byte count that blocks to enforce a bandwidth limit
+        self.throttle = throttle
+        # Optional callable that returns False once the output may no longer be written, e.g.
+        # after a queue worker lost its lease; nothing is written to disk after that
+        self.fence = fence
+        self.checkpoint_file = output_file + ".checkpoint.json"
+        self.bytes_downloaded = 0
+        self._session_bytes = 0
+        self._session_segments = 0
+        self._keys = {}
+        self._keys_lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._stopped = threading.Event()
+
+    def _get(self, url, byterange=None):
+        headers = {"Range": f"bytes={byterange[0]}-{byterange[1]}"} if byterange else None
+        if self.throttle is None:
+            response = self.session.get(url, timeout=SEGMENT_TIMEOUT, headers=headers)
+            response.raise_for_status()
+            return response.content
+        # Stream the body so the throttle paces the socket reads, not just whole segments
+        with self.session.get(url, timeout=SEGMENT_TIMEOUT, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            chunks = []
+            for chunk in response.iter_content(THROTTLE_CHUNK_SIZE):
+                self.throttle(len(chunk))
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+    # Returns (variant, init_segment, segments) for the download's own playlist
+    def load_playlist(self):
+        return self.load_rendition(self.playlist_url)
+
+    # Function to resolve a playlist URL to a media playlist, picking a variant by policy when given a master.
+    # Returns the chosen master playlist entry (None for a media playlist URL), the init segment and segments.
+    def load_rendition(self, url):
+        variant = None
+        text = self._get(url).decode("utf-8", "replace")
+        if is_master_playlist(text):
+            variants = parse_master_playlist(text, url)
+            if not variants:
+                raise HLSError("Master playlist has no variants")
+            variant = self.variant_policy.select(variants)
+            url = variant["url"]
+            text = self._get(url).decode("utf-8", "replace")
+        return (variant,) + parse_media_playlist(text, url)
+
+    def _get_key(self, uri):
+        with self._keys_lock:
+            if uri not in self._keys:
+                self._keys[uri] = self._get(uri)
+            return self._keys[uri]
+
+    # Load the playlist, falling over to the mirrors in order when it cannot be fetched
+    def _open_playlist(self):
+        last_error = None
+        for position, mirror in enumerate(self.mirrors):
+            try:
+                if position == 0:
+                    variant, init_segment, segments = self.load_playlist()
+                else:
+                    variant, init_segment, segments = self.load_rendition(mirror.url)
+            except (requests.RequestException, HLSError) as e:
+                last_error = e
+                mirror.usable = False
+                mirror.failures += 1
+                continue
+            mirror.variant, mirror.init_segment, mirror.segments = variant, init_segment, segments
+            self._active = self._source = mirror
+            return init_segment, segments
+        raise last_error
+
+    # The segment at index on a mirror, loading the mirror's playlist on first use; None if unusable
+    def _mirror_segment(self, mirror, index):
+        if mirror.segments is None and mirror.usable:
+            with self._mirror_load_lock:
+                if mirror.segments is None and mirror.usable:
+                    # Built aside and published only once checked, since other workers read it unlocked
+                    candidate = Mirror(mirror.url)
+                    try:
+                        candidate.variant, candidate.init_segment, candidate.segments = self.load_rendition(mirror.url)
+                    except (requests.RequestException, HLSError):
+                        mirror.usable = False
+                    # A different rendition would mix resolutions or init segments into the output
+                    if mirror.usable and not same_rendition(self._source, candidate):
+                        mirror.usable = False
+                    if mirror.usable:
+                        mirror.variant, mirror.init_segment = candidate.variant, candidate.init_segment
+                        mirror.segments = candidate.segments
+        return mirror.segments[index] if mirror.usable else None
+
+    # Fetch (and decrypt) one segment, retrying transient failures with backoff on the
+    # active mirror first, then on the others
+    def _fetch_segment(self, index):
+        last_error = None
+        with self._mirror_lock:
+            mirrors = [self._active] + [mirror for mirror in self.mirrors if mirror is not self._active]
+        for mirror in mirrors:
+            segment = self._mirror_segment(mirror, index)
+            if segment is None:
+                continue
+            for attempt in range(SEGMENT_RETRIES + 1):
+                self._resume.wait()
+                if self._stopped.is_set():
+                    raise DownloadCancelled()
+                started = time.monotonic()
+                try:
+                    data = self._get(segment.uri, segment.byterange)
+                    if segment.key:
+                        data = decrypt_aes128(data, self._get_key(segment.key), segment.iv)
+                except requests.RequestException as e:
+                    last_error = e
+                    with self._mirror_lock:
+                        mirror.failures += 1
+                    if attempt < SEGMENT_RETRIES:
+                        # Jitter keeps parallel workers from retrying in lockstep
+                        time.sleep(min(2 ** attempt * 0.5, 5) * random.uniform(0.75, 1.25))
+                    continue
+                with self._mirror_lock:
+                    mirror.bytes += len(data)
+                    mirror.seconds += time.monotonic() - started
+                    mirror.segments_fetched += 1
+                    self._active = mirror
+                return data
+        raise HLSError(f"Segment {index} failed on {len(self.mirrors)} source(s): {last_error}")
+
+    def _report(self, done, total, started):
+        if not self.progress_callback:
+            return
+        elapsed = max(time.monotonic() - started, 1e-6)
+        speed = self._session_bytes / elapsed
+        estimated_total = self.bytes_downloaded / done * total if done else 0
+        source = ""
+        if self._active is not self.mirrors[0]:
+            source = f", source {self.mirrors.index(self._active) + 1} of {len(self.mirrors)}"
+        self.progress_callback(
+            done / total,
+            f"Downloading: {done / total * 100:.1f}% "
+            f"({self.bytes_downloaded / 1048576:.1f} of ~{estimated_total / 1048576:.1f} MB, "
+            f"{speed / 1048576:.1f} MB/s{source})"
+        )
+
+    def _fenced(self):
+        return self.fence is not None and not self.fence()
+
+    # Block while paused; raise if cancelled. Workers stop picking up segments while paused.
+    def _check_control(self):
+        if (self.should_stop and self.should_stop()) or self._fenced():
+            self._stopped.set()
+            self._resume.set()
+            raise DownloadCancelled()
+        if self.is_paused and self.is_paused():
+            self._resume.clear()
+        else:
+            self._resume.set()
+
+    def _record(self, stage, started, **fields):
+        if self.trace is not None:
+            self.trace.record(stage, time.monotonic() - started, **fields)
+
+    # Download every segment into output_file; returns the number of bytes written
+    def download(self):
+        started = time.monotonic()
+        init_segment, segments = self._open_playlist()
+        self._record("manifest_selection", started, segments=len(segments))
+        total = len(segments)
+        started = time.monotonic()
+        raw_file = self.output_file + ".ts" if self.ffmpeg_path else self.output_file
+
+        fingerprint = playlist_fingerprint(init_segment, segments)
+        if self.resume:
+            checkpoint = Checkpoint.load(self.checkpoint_file, fingerprint, total, raw_file)
+        else:
+            checkpoint = Checkpoint(self.checkpoint_file, fingerprint, total)
+
+        if checkpoint.offset:
+            # Drop anything written after the last checkpoint and continue from there
+            out = open(raw_file, "r+b")
+            out.truncate(checkpoint.offset)
+            out.seek(checkpoint.offset)
+            self.bytes_downloaded = checkpoint.offset
+        else:
+            out = open(raw_file, "wb")
+
+        done = start_completed = checkpoint.completed
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, out:
+            try:
+                if init_segment is not None and not checkpoint.offset:
+                    init_data = self._get(init_segment.uri, init_segment.byterange)
+                    out.write(init_data)
+                    self.bytes_downloaded += len(init_data)
+                    self._session_bytes += len(init_data)
+
+                next_index = done
+                window = self.concurrency * 2
+                if done:
+                    self._report(done, total, started)
+
+                while done < total:
+                    self._check_control()
+                    while next_index < total and len(pending) < window:
+                        pending.append(executor.submit(self._fetch_segment, next_index))
+                        next_index += 1
+
+                    head = pending[0]
+                    if not head.done():
+                        wait([head], timeout=0.2, return_when=FIRST_COMPLETED)
+                        continue
+
+                    data = pending.popleft().result()
+                    out.write(data)
+                    self.bytes_downloaded += len(data)
+                    self._session_bytes += len(data)
+                    done += 1
+                    self._session_segments += 1
+                    out.flush()
+                    checkpoint.save(done, self.bytes_downloaded, force=done == total)
+                    self._report(done, total, started)
+            except BaseException as e:
+                # Release blocked workers and drop queued segments before the executor joins
+                self._stopped.set()
+                self._resume.set()
+                for future in pending:
+                    future.cancel()
+                # Record exactly what made it to disk so a later run can resume, unless
+                # the output may already belong to someone else
+                out.flush()
+                if not self._fenced():
+                    checkpoint.save(done, self.bytes_downloaded, force=True)
+                outcome = "cancelled" if isinstance(e, DownloadCancelled) else "error"
+                self._record("download", started, outcome=outcome, bytes=self._session_bytes,
+                             segments=done - start_completed)
+                raise
+
+        self._record("download", started, bytes=self._session_bytes, segments=total - start_completed)
+        if self.ffmpeg_path:
+            self._check_control()
+            started = time.monotonic()
+            remux_to_mp4(self.ffmpeg_path, raw_file, self.output_file)
+            os.remove(raw_file)
+            self._record("post_processing", started)
+        checkpoint.remove()
+        return self.bytes_downloaded
+
+
+# Function to decrypt an AES-128-CBC segment using yt-dlp's AES helpers
+def decrypt_aes128(data, key, iv):
+    from yt_dlp.aes import aes_cbc_decrypt_bytes, unpad_pkcs7
+    return unpad_pkcs7(aes_cbc_decrypt_bytes(data, key, iv))
+
+
+# Function to copy the concatenated transport stream into an MP4 container without re-encoding,
+# with the moov atom up front so playback can start before the whole file is fetched
+def remux_to_mp4(ffmpeg_path, source, target):
+    result = subprocess.run(
+        [ffmpeg_path, "-y", "-loglevel", "error", "-i", source, "-c", "copy", "-bsf:a", "aac_adtstoasc",
+         "-movflags", "+faststart", target],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise HLSError(f"ffmpeg remux failed: {result.stderr.strip()[-500:]}")
+
+
+# Function to download an HLS stream natively; returns the number of bytes fetched.
+# mirrors are alternate manifest URLs to fall over to; on_mirrors, if given, receives
+# the Mirror list with per-source stats once the download ends, successfully or not.
+def download_hls(playlist_url, output_file, concurrency=DEFAULT_CONCURRENCY, progress_callback=None,
+                 should_stop=None, is_paused=None, ffmpeg_path=None, headers=None, variant_policy=None,
+                 resume=True, trace=None, throttle=None, mirrors=(), on_mirrors=None, fence=None):
+    downloader = HLSDownloader(playlist_url, output_file, concurrency=concurrency,
+                               progress_callback=progress_callback, should_stop=should_stop,
+                               is_paused=is_paused, ffmpeg_path=ffmpeg_path, headers=headers,
+                               variant_policy=variant_policy, resume=resume, trace=trace,
+                               throttle=throttle, mirrors=mirrors, fence=fence)
+    try:
+        return downloader.download()
+    finally:
+        if on_mirrors is not None:
+            on_mirrors(downloader.mirrors)
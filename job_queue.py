@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from hls import VariantPolicy
+from output_store import content_key
+from pipeline import DEFAULT_VARIANT_POLICY
+from resolution_cache import CACHE_DIR
+
+
+# Shared job queue settings, overridable through the environment
+# Put the database on storage every worker host can reach
+QUEUE_DB = os.getenv("JOB_QUEUE_DB", os.path.join(CACHE_DIR, "queue.sqlite3"))
+# WAL needs shared memory; use DELETE when the database sits on a network filesystem
+QUEUE_JOURNAL_MODE = os.getenv("JOB_QUEUE_JOURNAL_MODE", "WAL")
+# A running job whose worker has not heartbeated for this long is handed to another worker
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "5"))
+# Attempts per job, counting retries after lost workers
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+LEASED_STATUSES = ("running", "paused")
+DONE_STATUSES = ("done", "failed", "cancelled")
+
+
+class LeaseLost(Exception):
+    # Raised to a worker whose lease expired and was given to another worker
+    pass
+
+
+# Function to turn process_video options into JSON for the queue
+def encode_options(options):
+    encoded = dict(options)
+    policy = encoded.get("variant_policy")
+    if isinstance(policy, VariantPolicy):
+        encoded["variant_policy"] = {"mode": policy.mode, "target_height": policy.target_height,
+                                     "max_bandwidth": policy.max_bandwidth}
+    return json.dumps(encoded)
+
+
+# Function to restore process_video options read from the queue
+def decode_options(text):
+    options = json.loads(text)
+    if isinstance(options.get("variant_policy"), dict):
+        options["variant_policy"] = VariantPolicy(**options["variant_policy"])
+    return options
+
+
+class JobQueue:
+    # Durable job queue in SQLite, shared by the front end and any number of
+    # worker processes on any host that can reach the database file.
+    #
+    # Workers claim jobs under a lease and extend it with heartbeats, which
+    # also carry progress back and pause/resume/cancel requests forward. A
+    # job whose lease runs out goes back to the queue and is retried, up to
+    # MAX_ATTEMPTS. Jobs for the same content never run at the same time, so
+    # the stable work path and output store key of a job stay idempotent.
+    def __init__(self, path=QUEUE_DB, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(f"PRAGMA journal_mode={QUEUE_JOURNAL_MODE}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " options TEXT NOT NULL,"
+                " content_key TEXT,"
+                " status TEXT NOT NULL,"
+                " progress REAL NOT NULL DEFAULT 0,"
+                " message TEXT,"
+                " output_file TEXT,"
+                " error TEXT,"
+                " state TEXT NOT NULL DEFAULT '{}',"
+                " control TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " lease_expires REAL,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner)")
+
+    # Run fn(conn) in a write transaction taken up front, so concurrent claims serialize
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, owner, url, options):
+        job_id = uuid.uuid4().hex[:12]
+        policy = options.get("variant_policy")
+        # Jobs with a caller-chosen output path write there, not to a content-keyed path
+        key = None if options.get("output_file") else content_key(url, policy or VariantPolicy(DEFAULT_VARIANT_POLICY))
+        self._transaction(lambda conn: conn.execute(
+            "INSERT INTO jobs (id, owner, url, options, content_key, status, message, created_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', 'Waiting for a worker', ?)",
+            (job_id, owner, url, encode_options(options), key, time.time())
+        ))
+        return job_id
+
+    # Requeue or fail jobs whose worker stopped heartbeating
+    def _expire_leases(self, conn, now):
+        expired = conn.execute(
+            f"SELECT id, attempts FROM jobs WHERE status IN {LEASED_STATUSES} AND lease_expires < ?", (now,)
+        ).fetchall()
+        for job_id, attempts in expired:
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, message = ?, worker = NULL,"
+                    " lease_expires = NULL, finished_at = ? WHERE id = ?",
+                    ("Worker stopped responding", "Worker stopped responding", now, job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL,"
+                    " message = 'Retrying on another worker' WHERE id = ?", (job_id,)
+                )
+
+    # Lease the next job to a worker; returns a job dict or None when nothing can start.
+    # Owners with the fewest leased jobs go first, so one session cannot starve the others.
+    def claim(self, worker):
+        def claim_next(conn):
+            now = time.time()
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT id, owner, url, options, attempts FROM jobs AS job WHERE status = 'queued'"
+                " AND (content_key IS NULL OR content_key NOT IN ("
+                f"  SELECT content_key FROM jobs WHERE status IN {LEASED_STATUSES} AND content_key IS NOT NULL))"
+                " ORDER BY (SELECT COUNT(*) FROM jobs AS other"
+                f"  WHERE other.owner = job.owner AND other.status IN {LEASED_STATUSES}), created_at"
+                " LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, owner, url, options, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1,"
+                " control = NULL, message = 'Starting...', started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker, now + self.lease_seconds, now, job_id)
+            )
+            return {"id": job_id, "owner": owner, "url": url, "options": decode_options(options),
+                    "attempt": attempts + 1}
+
+        return self._transaction(claim_next)
+
+    # Extend a lease and publish progress; returns the pending control request
+    # ("pause", "resume", "cancel" or None) and the job's current options, which
+    # carry speed limit changes. Raises LeaseLost if the job moved on.
+    # Every lease update is fenced by the attempt number claim() handed out, so a
+    # stalled worker cannot touch a later attempt, even one leased to itself.
+    def heartbeat(self, job_id, worker, attempt, status, progress, message, state):
+        def beat(conn):
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, progress = ?, message = ?, state = ?, lease_expires = ?"
+                f" WHERE id = ? AND worker = ? AND attempts = ? AND status IN {LEASED_STATUSES}",
+                (status, progress, message, json.dumps(state), time.time() + self.lease_seconds, job_id, worker,
+                 attempt)
+            ).rowcount
+            if not updated:
+                raise LeaseLost(job_id)
+            control, options = conn.execute("SELECT control, options FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return control, decode_options(options)
+
+        return self._transaction(beat)
+
+    # Whether worker still holds an unexpired lease on this attempt of a job. Workers
+    # check it before writing, so a stalled one stops before a new attempt starts.
+    def holds(self, job_id, worker, attempt):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND attempts = ?"
+                f" AND status IN {LEASED_STATUSES} AND lease_expires > ?", (job_id, worker, attempt, time.time())
+            ).fetchone() is not None
+
+    # Record a job's final outcome; returns False if the worker no longer held the lease
+    def finish(self, job_id, worker, attempt, status, message, output_file=None, error=None, progress=None,
+               state=None):
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, message = ?, output_file = ?, error = ?,"
+            " progress = COALESCE(?, progress), state = COALESCE(?, state), worker = NULL, lease_expires = NULL,"
+            f" finished_at = ? WHERE id = ? AND worker = ? AND attempts = ? AND status IN {LEASED_STATUSES}",
+            (status, message, output_file, error, progress, json.dumps(state) if state is not None else None,
+             time.time(), job_id, worker, attempt)
+        ).rowcount > 0)
+
+    # Hand a job back without counting the attempt, e.g. when a worker shuts down
+    def release(self, job_id, worker, attempt):
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL, attempts = attempts - 1,"
+            " message = 'Waiting for a worker' WHERE id = ? AND worker = ? AND attempts = ?"
+            f" AND status IN {LEASED_STATUSES}", (job_id, worker, attempt)
+        ))
+
+    # Relay a pause/resume/cancel request from the front end to the job's worker
+    def request(self, owner, job_id, action):
+        def apply(conn):
+            row = conn.execute("SELECT status FROM jobs WHERE id = ? AND owner = ?", (job_id, owner)).fetchone()
+            if row is None or row[0] in DONE_STATUSES:
+                return
+            if row[0] == "queued":
+                if action == "cancel":
+                    conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', message = 'Download cancelled by user.',"
+                        " finished_at = ? WHERE id = ?", (time.time(), job_id)
+                    )
+                return
+            conn.execute("UPDATE jobs SET control = ? WHERE id = ?", (action, job_id))
+
+        self._transaction(apply)
+
+    # Change the speed cap of an owner's unfinished jobs; running ones apply it on their next heartbeat
+    def set_rate_limit(self, owner, rate_limit):
+        def update(conn):
+            rows = conn.execute(
+                f"SELECT id, options FROM jobs WHERE owner = ? AND status NOT IN {DONE_STATUSES}", (owner,)
+            ).fetchall()
+            for job_id, options in rows:
+                options = decode_options(options)
+                options["rate_limit"] = rate_limit
+                conn.execute("UPDATE jobs SET options = ? WHERE id = ?", (encode_options(options), job_id))
+
+        self._transaction(update)
+
+    # Active (queued or leased) jobs in total and for one owner
+    def active_counts(self, owner):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(owner = ?), 0) FROM jobs WHERE status NOT IN "
+                f"{DONE_STATUSES}", (owner,)
+            ).fetchone()
+
+    # Status of an owner's jobs, oldest first, in the same shape as Job.snapshot()
+    def snapshot(self, owner):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, status, progress, message, output_file, error, state, created_at, started_at,"
+                " finished_at FROM jobs WHERE owner = ? ORDER BY created_at", (owner,)
+            ).fetchall()
+        jobs = []
+        for (job_id, url, status, progress, message, output_file, error, state, created_at, started_at,
+             finished_at) in rows:
+            state = json.loads(state or "{}")
+            if status == "running" and state.get("queue"):
+                status = "queued"
+            jobs.append({
+                "id": job_id, "url": url, "status": status, "progress": progress, "message": message,
+                "output_file": output_file, "error": error, "extraction_path": state.get("extraction_path"),
+                "transfer": state.get("transfer") or {}, "queue": state.get("queue"),
+                "metrics": state.get("metrics"), "created_at": created_at, "started_at": started_at,
+                "finished_at": finished_at,
+            })
+        return jobs
+
+    # Delete a finished job; returns its output file, or None if nothing was removed
+    def remove(self, owner, job_id):
+        def delete(conn):
+            row = conn.execute(
+                f"SELECT output_file FROM jobs WHERE id = ? AND owner = ? AND status IN {DONE_STATUSES}",
+                (job_id, owner)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            return row[0] or ""
+
+        return self._transaction(delete)
+
+    # Forget finished jobs older than retention seconds; returns their (id, output file) pairs
+    def prune(self, retention):
+        def delete(conn):
+            cutoff = time.time() - retention
+            rows = conn.execute(
+                f"SELECT id, output_file FROM jobs WHERE status IN {DONE_STATUSES} AND finished_at < ?", (cutoff,)
+            ).fetchall()
+            conn.execute(f"DELETE FROM jobs WHERE status IN {DONE_STATUSES} AND finished_at < ?", (cutoff,))
+            return rows
+
+        return self._transaction(delete)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,341 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import DEFAULT_DOWNLOAD_ENGINE, HLS_CONCURRENCY, JobState, get_output_store, process_video
+from job_queue import JobQueue
+from events import UI_EVENT_RATE, get_event_bus
+from file_server import release_file
+
+
+# Job engine settings, overridable through the environment
+# "thread" runs jobs inside this process; "queue" only enqueues them for worker.py processes
+JOB_BACKEND = os.getenv("JOB_BACKEND", "thread")
+# Jobs running at once; most of them wait for browser/download slots (see scheduler.py)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "16"))
+# Active jobs the shared queue accepts across all sessions when JOB_BACKEND is "queue"
+QUEUE_MAX_ACTIVE = int(os.getenv("QUEUE_MAX_ACTIVE", "200"))
+# Active jobs one session may have; submissions past this are rejected
+MAX_JOBS_PER_OWNER = int(os.getenv("MAX_JOBS_PER_OWNER", "5"))
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+
+ACTIVE_STATUSES = ("queued", "running", "paused")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+
+class AdmissionError(Exception):
+    # Raised by submit() when the server or the session has too many active jobs
+    pass
+
+
+class Job:
+    # One download job. The pipeline writes into state; everything else is owned by the manager.
+    def __init__(self, owner, url, options):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.url = url
+        self.options = options
+        self.state = JobState()
+        self.status = "queued"  # queued, running, paused, done, failed, cancelled
+        self.progress = 0.0
+        self.message = "Queued"
+        self.output_file = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    # Plain-dict copy of the job for the UI to render without touching live objects
+    def snapshot(self):
+        status = self.status
+        if status == "running" and self.state.download_status == "paused":
+            status = "paused"
+        elif status == "running" and self.state.queue:
+            status = "queued"
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": status,
+            "progress": self.progress,
+            "message": self.message,
+            "output_file": self.output_file,
+            "error": self.error,
+            "extraction_path": self.state.extraction_path,
+            "transfer": dict(self.state.transfer),
+            "queue": self.state.queue,
+            "metrics": self.state.metrics,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    # Runs download jobs on a background thread pool, independently of any Streamlit script run.
+    #
+    # The page only submits jobs, sends pause/resume/cancel requests and polls
+    # snapshot(); jobs keep running when the page reruns or the browser reloads.
+    def __init__(self, workers=JOB_WORKERS, runner=process_video, max_jobs_per_owner=MAX_JOBS_PER_OWNER):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_jobs_per_owner = max_jobs_per_owner
+        # Admission keeps active jobs at or below workers, so nothing waits in the executor's FIFO queue
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mx-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Pipeline progress reaches the jobs coalesced to UI_EVENT_RATE updates per second
+        self._events = get_event_bus().subscribe(self._on_event, max_rate=UI_EVENT_RATE)
+
+    # Queue a job for an owner (a browser client id) and return its id.
+    # options are passed to process_video: engine, variant_policy, hls_concurrency, output_file, rate_limit,
+    # bandwidth_weight.
+    # Raises AdmissionError instead of queueing work the server cannot start.
+    def submit(self, owner, url, **options):
+        job = Job(owner, url, options)
+        with self._lock:
+            self._prune()
+            active = [other for other in self._jobs.values() if other.status in ACTIVE_STATUSES]
+            if len(active) >= self.workers:
+                raise AdmissionError("The server is busy. Please try again in a few minutes.")
+            if sum(other.owner == owner for other in active) >= self.max_jobs_per_owner:
+                raise AdmissionError(f"You already have {self.max_jobs_per_owner} downloads in progress. "
+                                     f"Wait for one to finish before adding more.")
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job)
+        return job.id
+
+    def _run(self, job):
+        with self._lock:
+            if job.status == "cancelled":
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            job.message = "Starting..."
+
+        try:
+            output_file, error = self.runner(
+                job.url, None,
+                state=job.state,
+                engine=job.options.get("engine", DEFAULT_DOWNLOAD_ENGINE),
+                variant_policy=job.options.get("variant_policy"),
+                hls_concurrency=job.options.get("hls_concurrency", HLS_CONCURRENCY),
+                output_file=job.options.get("output_file"),
+                owner=job.owner,
+                rate_limit=job.options.get("rate_limit"),
+                bandwidth_weight=job.options.get("bandwidth_weight", 1.0),
+                job_id=job.id
+            )
+        except Exception as e:
+            output_file, error = None, f"An error occurred: {str(e)}"
+
+        with self._lock:
+            job.finished_at = time.time()
+            if job.state.download_status == "cancelled":
+                job.status = "cancelled"
+                job.message = "Download cancelled by user."
+            elif error:
+                job.status = "failed"
+                job.error = error
+                job.message = error
+            else:
+                job.status = "done"
+                job.output_file = output_file
+                job.progress = 1.0
+                job.message = "Download complete!"
+                # Keep a shared file from being evicted while this job can still serve it
+                if get_output_store().contains(output_file):
+                    get_output_store().acquire(output_file)
+
+    def _on_event(self, event):
+        with self._lock:
+            job = self._jobs.get(event.job_id)
+            # Final status is set by _run; a late coalesced update must not overwrite it
+            if job is not None and job.status == "running" and not event.final:
+                job.progress = event.progress
+                job.message = event.message
+
+    # Drop finished jobs older than the retention window
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id, job in list(self._jobs.items()):
+            if job.status in FINISHED_STATUSES and (job.finished_at or 0) < cutoff:
+                del self._jobs[job_id]
+                self._release_output(job)
+
+    # Release a job's output: its file server link is revoked, shared store files are only
+    # dereferenced and private files are deleted
+    def _release_output(self, job):
+        release_file(job.id)
+        if not job.output_file:
+            return
+        store = get_output_store()
+        if store.contains(job.output_file):
+            store.release(job.output_file)
+        elif os.path.exists(job.output_file):
+            try:
+                os.remove(job.output_file)
+            except OSError:
+                pass
+
+    def _get(self, owner, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def pause(self, owner, job_id):
+        with self._lock:
+            job = self._get(owner, job_id)
+            if job and job.status == "running" and job.state.download_status == "downloading":
+                job.state.download_status = "paused"
+                job.message = f"Paused at: {job.progress * 100:.1f}%"
+
+    def resume(self, owner, job_id):
+        with self._lock:
+            job = self._get(owner, job_id)
+            if job and job.state.download_status == "paused":
+                job.state.download_status = "downloading"
+                job.message = f"Resuming download from: {job.progress * 100:.1f}%"
+
+    def cancel(self, owner, job_id):
+        with self._lock:
+            job = self._get(owner, job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return
+            if job.status == "queued":
+                # _run checks the status under the lock, so this also covers a job that is just starting
+                job.future.cancel()
+                job.status = "cancelled"
+                job.message = "Download cancelled by user."
+                job.finished_at = time.time()
+                return
+            # The download engines poll the status and stop at their next progress check
+            job.state.download_status = "cancelled"
+
+    # Change the speed cap of an owner's queued and running jobs; running downloads adjust at once
+    def set_rate_limit(self, owner, rate_limit):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner and job.status in ACTIVE_STATUSES]
+            for job in jobs:
+                job.options["rate_limit"] = rate_limit
+        for job in jobs:
+            shaper = job.state.shaper
+            if shaper is not None:
+                shaper.set_rate_limit(rate_limit)
+
+    # Forget a finished job and release its output file
+    def remove(self, owner, job_id):
+        with self._lock:
+            job = self._get(owner, job_id)
+            if job is None or job.status not in FINISHED_STATUSES:
+                return
+            del self._jobs[job_id]
+        self._release_output(job)
+
+    # Status snapshot of an owner's jobs, oldest first
+    def snapshot(self, owner):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner]
+            return [job.snapshot() for job in sorted(jobs, key=lambda job: job.created_at)]
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status in ACTIVE_STATUSES:
+                    job.state.download_status = "cancelled"
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._events.close()
+
+
+class QueuedJobManager:
+    # Front end for a fleet of worker processes (see worker.py) sharing a JobQueue.
+    #
+    # Same interface as JobManager, but nothing runs here: submit() enqueues,
+    # pause/resume/cancel are relayed to the worker through the queue, and
+    # snapshot() reads the status the workers publish with their heartbeats.
+    def __init__(self, queue=None, max_active=QUEUE_MAX_ACTIVE, max_jobs_per_owner=MAX_JOBS_PER_OWNER):
+        self.queue = queue or JobQueue()
+        self.max_active = max_active
+        self.max_jobs_per_owner = max_jobs_per_owner
+        # Store file each done job holds a reference on, so eviction spares files it still serves.
+        # Jobs for the same content share one file and each holds its own reference.
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, url, **options):
+        with self._lock:
+            pruned = self.queue.prune(JOB_RETENTION)
+            active, owned = self.queue.active_counts(owner)
+            if active >= self.max_active:
+                raise AdmissionError("The server is busy. Please try again in a few minutes.")
+            if owned >= self.max_jobs_per_owner:
+                raise AdmissionError(f"You already have {self.max_jobs_per_owner} downloads in progress. "
+                                     f"Wait for one to finish before adding more.")
+            job_id = self.queue.enqueue(owner, url, options)
+        for pruned_id, output_file in pruned:
+            self._release_output(pruned_id, output_file)
+        return job_id
+
+    def pause(self, owner, job_id):
+        self.queue.request(owner, job_id, "pause")
+
+    def resume(self, owner, job_id):
+        self.queue.request(owner, job_id, "resume")
+
+    def cancel(self, owner, job_id):
+        self.queue.request(owner, job_id, "cancel")
+
+    def set_rate_limit(self, owner, rate_limit):
+        self.queue.set_rate_limit(owner, rate_limit)
+
+    def remove(self, owner, job_id):
+        output_file = self.queue.remove(owner, job_id)
+        if output_file is not None:
+            self._release_output(job_id, output_file)
+
+    # Revoke a forgotten job's file server link and release its output as JobManager does
+    def _release_output(self, job_id, output_file):
+        release_file(job_id)
+        if not output_file:
+            return
+        store = get_output_store()
+        with self._lock:
+            held = self._held.pop(job_id, None)
+        if held is not None:
+            store.release(held)
+        elif not store.contains(output_file) and os.path.exists(output_file):
+            try:
+                os.remove(output_file)
+            except OSError:
+                pass
+
+    def snapshot(self, owner):
+        jobs = self.queue.snapshot(owner)
+        store = get_output_store()
+        with self._lock:
+            for job in jobs:
+                output_file = job["output_file"]
+                if job["status"] == "done" and job["id"] not in self._held and store.contains(output_file):
+                    store.acquire(output_file)
+                    self._held[job["id"]] = output_file
+        return jobs
+
+    def shutdown(self, wait=False):
+        self.queue.close()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+# Process-wide job manager; this module stays imported across Streamlit reruns
+def get_job_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = QueuedJobManager() if JOB_BACKEND == "queue" else JobManager()
+        return _manager
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import time
+import random
+from contextlib import nullcontext
+
+
+# Detection settings, overridable through the environment
+# "event" returns shortly after a manifest shows up, "fixed" keeps the old fixed sleeps
+DETECTION_MODE = os.getenv("MANIFEST_DETECTION", "event")
+DETECTION_TIMEOUT = float(os.getenv("MANIFEST_TIMEOUT", "15"))
+POLL_INTERVAL = float(os.getenv("MANIFEST_POLL_INTERVAL", "0.25"))
+# Seconds to keep listening after the first manifest, so the page's alternates
+# (other renditions or CDNs, used as download mirrors) are collected too; 0 returns at once
+ALTERNATE_GRACE = float(os.getenv("MANIFEST_ALTERNATE_GRACE", "0.75"))
+# Optional human-like jitter floor: never return before a random delay in this range
+HUMANLIKE = os.getenv("MANIFEST_HUMANLIKE", "0").lower() in ("1", "true", "yes")
+HUMANLIKE_FLOOR = (
+    float(os.getenv("MANIFEST_HUMANLIKE_MIN", "1.0")),
+    float(os.getenv("MANIFEST_HUMANLIKE_MAX", "2.5")),
+)
+
+
+MANIFEST_URL_PATTERN = re.compile(r'https?://[^\s\'"?#]+\.(?:m3u8|mpd)(?:\?[^\s\'"]*)?$')
+MANIFEST_BODY_PATTERN = re.compile(r'https://[^\s\'"]+\.(?:m3u8|mpd)')
+
+# Response classification used to decide which bodies are worth a CDP round trip
+MANIFEST_MIME_TYPES = {
+    "application/vnd.apple.mpegurl",
+    "application/x-mpegurl",
+    "audio/mpegurl",
+    "audio/x-mpegurl",
+    "application/dash+xml",
+}
+BODY_MIME_TYPES = {"application/json", "text/json", "text/html", "text/plain", "application/xml", "text/xml"}
+SKIPPED_RESOURCE_TYPES = {"Image", "Font", "Stylesheet", "Media", "Script", "Manifest", "Ping", "CSPViolationReport"}
+SKIPPED_URL_PATTERN = re.compile(
+    r'\.(?:png|jpe?g|gif|webp|svg|ico|woff2?|ttf|otf|css|js|ts|m4s|mp4|m4a|aac|vtt)(?:\?|$)',
+    re.IGNORECASE
+)
+TRACKER_URL_PATTERN = re.compile(
+    r'(?:google-analytics|googletagmanager|doubleclick|googlesyndication|facebook\.net|'
+    r'scorecardresearch|moengage|branch\.io|hotjar|clevertap|adservice)',
+    re.IGNORECASE
+)
+API_URL_PATTERN = re.compile(r'/(?:api|v\d+)/|playback|stream|video|detail', re.IGNORECASE)
+AD_URL_PATTERN = re.compile(r'(?:^|[/._-])(?:ads?|adserver|preroll|vast)(?:[/._-]|$)', re.IGNORECASE)
+
+# Ranking weights by how a candidate was discovered
+SOURCE_SCORES = {
+    "mime": 100,  # Response served with a manifest MIME type
+    "url": 90,  # Response URL looks like a manifest
+    "api": 70,  # Found inside a JSON/API response body
+    "document": 50,  # Found inside an HTML document or other text body
+}
+
+
+# Function to read a response's MIME type without parameters, falling back to the Content-Type header
+def response_mime_type(response):
+    mime_type = (response.get("mimeType") or "").split(";")[0].strip().lower()
+    if not mime_type:
+        headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+        mime_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return mime_type
+
+
+# Function to classify a Network.responseReceived event.
+# Returns "manifest" when the response itself is a manifest, "body" when its
+# body may embed manifest URLs, or None when it can be skipped entirely.
+def classify_response(params):
+    response = params.get("response", {})
+    url = response.get("url", "")
+    if not url.startswith("http"):
+        return None
+
+    mime_type = response_mime_type(response)
+    if mime_type in MANIFEST_MIME_TYPES or MANIFEST_URL_PATTERN.match(url):
+        return "manifest"
+    if TRACKER_URL_PATTERN.search(url):
+        return None
+    if params.get("type") in SKIPPED_RESOURCE_TYPES or SKIPPED_URL_PATTERN.search(url):
+        return None
+    if mime_type in BODY_MIME_TYPES or mime_type.endswith("+json"):
+        return "body"
+    return None
+
+
+# Function to score a manifest candidate for ranking
+def score_candidate(url, source):
+    score = SOURCE_SCORES.get(source, 0)
+    path = url.split("?")[0].lower()
+    if "master" in path or "index" in path or "playlist" in path:
+        score += 10
+    if path.endswith(".m3u8"):
+        score += 5
+    if AD_URL_PATTERN.search(path):
+        score -= 60
+    return score
+
+
+class ManifestScanner:
+    # Incrementally consumes performance-log entries and collects manifest URLs.
+    #
+    # Responses are classified from their URL, MIME type and headers first, so
+    # Network.getResponseBody is only called for likely candidates (JSON/API
+    # and document bodies). Bodies are only available once Chrome has finished
+    # loading them, so a body is fetched when Network.loadingFinished arrives;
+    # flush() fetches whatever is still pending.
+    #
+    # With a block_policy the scanner also accounts for the page's traffic:
+    # bytes actually loaded and, per policy category, requests Chrome blocked.
+    def __init__(self, driver, block_policy=None):
+        self.driver = driver
+        self.block_policy = block_policy
+        self.candidates = {}
+        self.body_fetches = 0
+        self.body_fetch_seconds = 0.0
+        self.bytes_loaded = 0
+        self.blocked = {}
+        self._pending = {}
+        self._requests = {}
+        self._order = 0
+
+    def _add(self, url, source):
+        score = score_candidate(url, source)
+        current = self.candidates.get(url)
+        if current is None:
+            self._order += 1
+            self.candidates[url] = (score, self._order)
+        elif score > current[0]:
+            self.candidates[url] = (score, current[1])
+
+    def _fetch_body(self, request_id, source):
+        self.body_fetches += 1
+        started = time.monotonic()
+        try:
+            request = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception:
+            return
+        finally:
+            self.body_fetch_seconds += time.monotonic() - started
+        body = request.get("body", "")
+        if ".m3u8" in body or ".mpd" in body:
+            for url in set(MANIFEST_BODY_PATTERN.findall(body)):
+                self._add(url, source)
+
+    # Candidate manifest URLs, best first
+    @property
+    def video_urls(self):
+        ranked = sorted(self.candidates.items(), key=lambda item: (-item[1][0], item[1][1]))
+        return [url for url, _ in ranked]
+
+    # Estimated bytes the block policy kept off the wire
+    @property
+    def bytes_saved(self):
+        return self.block_policy.estimate_saved(self.blocked) if self.block_policy else 0
+
+    def _is_relevant(self, message):
+        if "Network.responseReceived" in message or "Network.loadingFinished" in message:
+            return True
+        return self.block_policy is not None and (
+            "Network.requestWillBeSent" in message or "Network.loadingFailed" in message)
+
+    # Process a batch of log entries; returns the number of new manifest URLs
+    def feed(self, logs):
+        before = len(self.candidates)
+        for log in logs:
+            message = log["message"]
+            # Cheap substring test before paying for json.loads on every entry
+            if not self._is_relevant(message):
+                continue
+            try:
+                message = json.loads(message)["message"]
+                method = message["method"]
+                params = message["params"]
+            except Exception:
+                continue
+
+            if method == "Network.responseReceived":
+                kind = classify_response(params)
+                if kind == "manifest":
+                    mime_type = response_mime_type(params["response"])
+                    self._add(params["response"]["url"], "mime" if mime_type in MANIFEST_MIME_TYPES else "url")
+                elif kind == "body":
+                    source = "document" if params.get("type") == "Document" else "api"
+                    if source == "api" and not API_URL_PATTERN.search(params["response"]["url"]):
+                        source = "document"
+                    self._pending[params["requestId"]] = source
+            elif method == "Network.loadingFinished":
+                self.bytes_loaded += int(params.get("encodedDataLength") or 0)
+                self._requests.pop(params.get("requestId"), None)
+                if params.get("requestId") in self._pending:
+                    self._fetch_body(params["requestId"], self._pending.pop(params["requestId"]))
+            elif method == "Network.requestWillBeSent":
+                self._requests[params.get("requestId")] = params.get("request", {}).get("url", "")
+            elif method == "Network.loadingFailed" and params.get("blockedReason"):
+                url = self._requests.pop(params.get("requestId"), "")
+                category = self.block_policy.categorize(url) or "custom"
+                self.blocked[category] = self.blocked.get(category, 0) + 1
+        return len(self.candidates) - before
+
+    # Fetch bodies of candidate responses that never reported loadingFinished
+    def flush(self):
+        for request_id, source in list(self._pending.items()):
+            self._fetch_body(request_id, source)
+        self._pending.clear()
+        return self.video_urls
+
+
+# Function to pull manifest URLs out of a batch of performance-log entries
+def scan_log_entries(driver, logs):
+    scanner = ManifestScanner(driver)
+    scanner.feed(logs)
+    return scanner.flush()
+
+
+# Function to poll the performance log until the first manifest appears.
+# Returns the URLs found (possibly empty) once a manifest is seen and the
+# jitter floor has passed, the timeout is reached, or should_stop() is true.
+# trace, if given, receives "log_scan" and "cdp_body_fetch" stage timings, plus
+# the page's loaded bytes and blocked requests when block_policy is given.
+def wait_for_manifests(driver, timeout=DETECTION_TIMEOUT, min_wait=0.0, poll_interval=POLL_INTERVAL,
+                       should_stop=None, trace=None, block_policy=None, grace=ALTERNATE_GRACE):
+    started = time.monotonic()
+    scanner = ManifestScanner(driver, block_policy)
+    polls = 0
+    first_hit = None
+
+    try:
+        while True:
+            scanner.feed(driver.get_log("performance"))
+            polls += 1
+
+            elapsed = time.monotonic() - started
+            if scanner.video_urls and first_hit is None:
+                first_hit = elapsed
+            if first_hit is not None and elapsed >= max(min_wait, first_hit + grace):
+                return scanner.video_urls
+            if elapsed >= timeout:
+                return scanner.flush()
+            if should_stop is not None and should_stop():
+                return scanner.video_urls
+
+            time.sleep(poll_interval)
+    finally:
+        if trace is not None:
+            outcome = "ok" if scanner.candidates else "empty"
+            fields = {}
+            if block_policy is not None:
+                fields = {"bytes": scanner.bytes_loaded, "blocked_requests": sum(scanner.blocked.values()),
+                          "blocked": dict(scanner.blocked), "bytes_saved": scanner.bytes_saved}
+            trace.record("log_scan", time.monotonic() - started, outcome, polls=polls,
+                         candidates=len(scanner.candidates), **fields)
+            trace.record("cdp_body_fetch", scanner.body_fetch_seconds, body_fetches=scanner.body_fetches)
+
+
+# Function to navigate to a page and detect its manifests using the configured mode.
+# block_policy, if given, is installed before navigating so images, fonts,
+# media segments and trackers are never fetched.
+def detect_manifests(driver, url, mode=DETECTION_MODE, timeout=DETECTION_TIMEOUT,
+                     humanlike=HUMANLIKE, should_stop=None, trace=None, block_policy=None):
+    if block_policy is not None:
+        block_policy.apply(driver)
+
+    with trace.stage("navigation") if trace is not None else nullcontext():
+        driver.get(url)
+
+    if mode == "fixed":
+        # Legacy behaviour: fixed random waits, then a single log read
+        time.sleep(random.uniform(3, 7))
+        if should_stop is not None and should_stop():
+            return []
+        driver.execute_script(f"window.scrollTo(0, {random.randint(100, 300)});")
+        time.sleep(random.uniform(1, 2))
+        return scan_log_entries(driver, driver.get_log("performance"))
+
+    min_wait = 0.0
+    if humanlike:
+        min_wait = random.uniform(*HUMANLIKE_FLOOR)
+        driver.execute_script(f"window.scrollTo(0, {random.randint(100, 300)});")
+
+    return wait_for_manifests(driver, timeout=timeout, min_wait=min_wait, should_stop=should_stop, trace=trace,
+                              block_policy=block_policy)
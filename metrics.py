@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from resolution_cache import CACHE_DIR
+from events import METRICS_EVENT_RATE, get_event_bus
+
+
+# Metrics settings, overridable through the environment
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Port of the Prometheus text endpoint; 0 picks a free port, "off" disables it
+METRICS_PORT = os.getenv("METRICS_PORT", "9108")
+# One JSON line per finished job; empty disables the log
+JOB_LOG_FILE = os.getenv("JOB_LOG_FILE", os.path.join(CACHE_DIR, "jobs.jsonl"))
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = tuple(2 ** power * 131072 for power in range(12))  # 128 KiB/s .. 256 MiB/s
+
+
+# Function to format a label set in the Prometheus text format
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    # Monotonic counter with optional labels
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge:
+    # Value that can go up and down, with optional labels
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    # Cumulative-bucket histogram with optional labels
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    labels = format_labels(self.labels + ("le",), key + (f"{bound:g}",))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "mxscraper_stage_duration_seconds", "Time spent in each pipeline stage", labels=("stage", "outcome")
+)
+STAGE_BYTES = Counter("mxscraper_stage_bytes_total", "Bytes transferred per pipeline stage", labels=("stage",))
+DOWNLOAD_THROUGHPUT = Histogram(
+    "mxscraper_download_throughput_bytes_per_second", "Download throughput per job",
+    labels=("engine",), buckets=THROUGHPUT_BUCKETS
+)
+CDP_BODY_FETCHES = Counter("mxscraper_cdp_body_fetches_total", "Network.getResponseBody calls")
+JOB_DURATION = Histogram(
+    "mxscraper_job_duration_seconds", "End-to-end job time", labels=("outcome", "extraction_path", "engine")
+)
+JOBS = Counter("mxscraper_jobs_total", "Finished jobs", labels=("outcome", "extraction_path", "engine"))
+BLOCKED_REQUESTS = Counter(
+    "mxscraper_blocked_requests_total", "Requests blocked during extraction page loads", labels=("category",)
+)
+BLOCKED_BYTES_SAVED = Counter(
+    "mxscraper_blocked_bytes_saved_total", "Estimated bytes not downloaded because of resource blocking"
+)
+SOURCE_FAILOVERS = Counter(
+    "mxscraper_source_failovers_total", "Downloads that moved to another manifest or mirror", labels=("kind",)
+)
+JOBS_IN_STAGE = Gauge("mxscraper_jobs_in_stage", "Running jobs per pipeline stage", labels=("stage",))
+PIPELINE_STAGES = ("extract", "download", "postprocess")
+
+REGISTRY = [STAGE_DURATION, STAGE_BYTES, DOWNLOAD_THROUGHPUT, CDP_BODY_FETCHES, JOB_DURATION, JOBS,
+            BLOCKED_REQUESTS, BLOCKED_BYTES_SAVED, SOURCE_FAILOVERS, JOBS_IN_STAGE]
+
+_log_lock = threading.Lock()
+
+
+# Function to render every registered metric in the Prometheus text exposition format
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class JobTrace:
+    # Per-job timing record. Stages are recorded as they finish, feed the
+    # process-wide histograms, and are written out as one JSON line when the
+    # job finishes.
+    def __init__(self, url, engine=None):
+        self.url = url
+        self.engine = engine
+        self.stages = []
+        self.fields = {}
+        self._started_wall = time.time()
+        self._started = time.monotonic()
+
+    # Record a finished stage; extra fields (bytes, counts, ...) go into the job log
+    def record(self, stage, seconds, outcome="ok", **fields):
+        entry = {"stage": stage, "seconds": round(seconds, 4), "outcome": outcome}
+        entry.update(fields)
+        self.stages.append(entry)
+        STAGE_DURATION.observe(seconds, stage=stage, outcome=outcome)
+        if fields.get("bytes"):
+            STAGE_BYTES.inc(fields["bytes"], stage=stage)
+        if fields.get("body_fetches"):
+            CDP_BODY_FETCHES.inc(fields["body_fetches"])
+        for category, count in (fields.get("blocked") or {}).items():
+            BLOCKED_REQUESTS.inc(count, category=category)
+        if fields.get("bytes_saved"):
+            BLOCKED_BYTES_SAVED.inc(fields["bytes_saved"])
+
+    # Time a block as a stage; the yielded dict collects extra fields
+    @contextmanager
+    def stage(self, stage):
+        fields = {}
+        started = time.monotonic()
+        outcome = "ok"
+        try:
+            yield fields
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.record(stage, time.monotonic() - started, fields.pop("outcome", outcome), **fields)
+
+    def summary(self, outcome):
+        return {
+            "url": self.url,
+            "engine": self.engine,
+            "outcome": outcome,
+            "started_at": self._started_wall,
+            "duration_s": round(time.monotonic() - self._started, 4),
+            "stages": self.stages,
+            **self.fields,
+        }
+
+    # Close the trace: update job-level metrics and append the JSON log line
+    def finish(self, outcome, **fields):
+        self.fields.update(fields)
+        downloads = [entry for entry in self.stages if entry["stage"] == "download"]
+        download_seconds = sum(entry["seconds"] for entry in downloads)
+        if downloads and "throughput_bps" not in self.fields:
+            self.fields["bytes"] = sum(entry.get("bytes", 0) for entry in downloads)
+            self.fields["throughput_bps"] = round(self.fields["bytes"] / download_seconds, 1) if download_seconds else 0.0
+        summary = self.summary(outcome)
+        labels = {"outcome": outcome, "extraction_path": self.fields.get("extraction_path") or "none",
+                  "engine": self.engine or "none"}
+        JOBS.inc(**labels)
+        JOB_DURATION.observe(summary["duration_s"], **labels)
+        throughput = self.fields.get("throughput_bps")
+        if outcome == "completed" and throughput:
+            DOWNLOAD_THROUGHPUT.observe(throughput, engine=self.engine or "none")
+        write_job_log(summary)
+        return summary
+
+
+# Function to append one job summary to the JSON job log
+def write_job_log(summary, path=JOB_LOG_FILE):
+    if not path:
+        return
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(summary) + "\n")
+    except OSError:
+        pass
+
+
+class JobStageTracker:
+    # Progress event subscriber that keeps JOBS_IN_STAGE current
+    def __init__(self, gauge=JOBS_IN_STAGE):
+        self.gauge = gauge
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event.final:
+                self._stages.pop(event.job_id, None)
+            elif event.stage is not None:
+                self._stages[event.job_id] = event.stage
+            counts = {stage: 0 for stage in PIPELINE_STAGES}
+            for stage in self._stages.values():
+                counts[stage] = counts.get(stage, 0) + 1
+        for stage, count in counts.items():
+            self.gauge.set(count, stage=stage)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    # Serves /metrics for a Prometheus scraper from a background thread
+    def __init__(self, host=METRICS_HOST, port=0):
+        self._httpd = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mx-metrics", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Process-wide metrics endpoint, started on first use; None when disabled or the port is taken
+def get_metrics_server(port=METRICS_PORT):
+    global _server
+    with _server_lock:
+        if _server is None and str(port).lower() not in ("", "off", "none"):
+            try:
+                _server = MetricsServer(port=int(port))
+            except OSError:
+                return None
+            get_event_bus().subscribe(JobStageTracker(), max_rate=METRICS_EVENT_RATE)
+        return _server
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+
+from manifest import ALTERNATE_GRACE, DETECTION_TIMEOUT, POLL_INTERVAL, ManifestScanner
+
+
+# Multi-tab extraction settings, overridable through the environment
+# Pages resolved at once inside one browser
+TABS_PER_BROWSER = int(os.getenv("TABS_PER_BROWSER", "4"))
+
+
+# Function to read which target (tab) chromedriver attributed a performance-log entry to
+def entry_target(entry):
+    try:
+        return json.loads(entry["message"]).get("webview")
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Tab:
+    # One page being resolved in its own browser tab
+    def __init__(self, url, handle, scanner):
+        self.url = url
+        self.handle = handle
+        self.scanner = scanner
+        self.started = time.monotonic()
+        self.first_hit = None
+
+
+class MultiTabExtractor:
+    # Resolves many pages concurrently inside one browser.
+    #
+    # Each page gets its own tab, opened with Target.createTarget and loaded
+    # with a non-blocking Page.navigate, so up to `tabs` pages load at once.
+    # The performance log is shared by all tabs; chromedriver tags every
+    # entry with the target it came from, which routes it to that page's
+    # ManifestScanner. A tab is closed grace seconds after its page yields a
+    # manifest, so alternates are collected as well, or when it times out,
+    # and the next URL takes its place.
+    def __init__(self, driver, tabs=TABS_PER_BROWSER, timeout=DETECTION_TIMEOUT, poll_interval=POLL_INTERVAL,
+                 block_policy=None, user_agent=None, grace=ALTERNATE_GRACE):
+        self.driver = driver
+        self.tabs = max(1, tabs)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.grace = grace
+        self.block_policy = block_policy
+        self.user_agent = user_agent
+
+    # Open a blank tab, configure it, then start loading the page without waiting for it
+    def _open(self, url):
+        handle = self.driver.execute_cdp_cmd("Target.createTarget", {"url": "about:blank"})["targetId"]
+        self.driver.switch_to.window(handle)
+        if self.user_agent:
+            self.driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": self.user_agent})
+        if self.block_policy is not None:
+            self.block_policy.apply(self.driver)
+        self.driver.execute_cdp_cmd("Page.navigate", {"url": url})
+        return Tab(url, handle, ManifestScanner(self.driver, self.block_policy))
+
+    def _close(self, tab):
+        try:
+            self.driver.switch_to.window(tab.handle)
+            self.driver.close()
+        except Exception:
+            pass
+
+    # Resolve every URL; returns {url: manifest URLs, best first}. on_result(url, video_urls)
+    # is called as each page finishes; should_stop() abandons the pages still loading.
+    def extract(self, urls, should_stop=None, on_result=None):
+        pending = list(dict.fromkeys(urls))
+        active = {}
+        results = {}
+        base_handle = self.driver.current_window_handle
+        # Events from an earlier page in this browser must not be attributed to the new tabs
+        self.driver.get_log("performance")
+
+        try:
+            while pending or active:
+                while pending and len(active) < self.tabs:
+                    tab = self._open(pending.pop(0))
+                    active[tab.handle] = tab
+
+                batches = {}
+                for entry in self.driver.get_log("performance"):
+                    batches.setdefault(entry_target(entry), []).append(entry)
+
+                for handle, tab in list(active.items()):
+                    entries = batches.get(handle)
+                    if entries:
+                        # Response bodies are fetched through the tab's own CDP session
+                        self.driver.switch_to.window(handle)
+                        tab.scanner.feed(entries)
+                    now = time.monotonic()
+                    if tab.scanner.video_urls and tab.first_hit is None:
+                        tab.first_hit = now
+                    if tab.first_hit is not None and (now - tab.first_hit >= self.grace
+                                                      or now - tab.started >= self.timeout):
+                        video_urls = tab.scanner.video_urls
+                    elif now - tab.started >= self.timeout:
+                        self.driver.switch_to.window(handle)
+                        video_urls = tab.scanner.flush()
+                    else:
+                        continue
+                    results[tab.url] = video_urls
+                    self._close(tab)
+                    del active[handle]
+                    if on_result is not None:
+                        on_result(tab.url, video_urls)
+
+                if should_stop is not None and should_stop():
+                    break
+                if active:
+                    time.sleep(self.poll_interval)
+        finally:
+            for tab in active.values():
+                self._close(tab)
+            self.driver.switch_to.window(base_handle)
+        return results
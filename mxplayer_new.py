@@ -1,36 +1,41 @@
 import os
 import re
-import json
-import time
-import random
-import subprocess
+import uuid
 import streamlit as st
-import tempfile
-import platform
-import threading
-from pathlib import Path
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
-
-# Load environment variables
+
+# Load environment variables before the pipeline modules read their settings
 load_dotenv()
 
-# Initialize session state for download control
-if 'download_process' not in st.session_state:
-    st.session_state.download_process = None
-if 'download_status' not in st.session_state:
-    st.session_state.download_status = "idle"  # idle, downloading, paused, cancelled, completed, error
-if 'download_progress' not in st.session_state:
-    st.session_state.download_progress = 0.0
-if 'download_output_file' not in st.session_state:
-    st.session_state.download_output_file = None
+from hls import VARIANT_POLICIES, VariantPolicy
+from pipeline import DEFAULT_DOWNLOAD_ENGINE, DEFAULT_VARIANT_POLICY, HLS_CONCURRENCY
+from jobs import ACTIVE_STATUSES, AdmissionError, get_job_manager
+from file_server import get_file_server
+from toolchain import warm_toolchain
+from metrics import get_metrics_server
+
+# Resolve ffmpeg/Chrome/ChromeDriver in the background instead of on the first job
+warm_toolchain()
+# Expose /metrics for Prometheus; started once per process
+get_metrics_server()
+
+# Initialize session state for download options
 if 'error_message' not in st.session_state:
     st.session_state.error_message = None
+if 'download_engine' not in st.session_state:
+    st.session_state.download_engine = DEFAULT_DOWNLOAD_ENGINE
+if 'hls_concurrency' not in st.session_state:
+    st.session_state.hls_concurrency = HLS_CONCURRENCY
+if 'rate_limit_mbs' not in st.session_state:
+    st.session_state.rate_limit_mbs = 0.0
+if 'bandwidth_weight' not in st.session_state:
+    st.session_state.bandwidth_weight = 1.0
+if 'variant_policy' not in st.session_state:
+    st.session_state.variant_policy = DEFAULT_VARIANT_POLICY
+if 'target_height' not in st.session_state:
+    st.session_state.target_height = 720
+if 'max_bandwidth_kbps' not in st.session_state:
+    st.session_state.max_bandwidth_kbps = 2500
 
 # Page configuration
 st.set_page_config(page_title="MX Player Video Downloader", page_icon="🎥")
@@ -183,7 +188,7 @@ with st.expander("How to use"):
     ### Instructions
     1. Enter a valid MX Player video URL (e.g., https://www.mxplayer.in/...)
     2. Click the "Download" button
-    3. Wait for the video to be processed
+    3. Wait for the video to be processed (you can queue several and reload the page safely)
     4. Download the video to your device
 
     ### Requirements
@@ -195,595 +200,219 @@ with st.expander("How to use"):
 # Input for MX Player URL
 mx_url = st.text_input("Enter MX Player video URL:", placeholder="https://www.mxplayer.in/...")
 
-
-# Function to find FFmpeg path
-def find_ffmpeg_path():
-    # First check environment variable
-    ffmpeg_env = os.getenv("FFMPEG_PATH")
-    if ffmpeg_env and os.path.exists(ffmpeg_env):
-        return ffmpeg_env
-
-    try:
-        # Try to find ffmpeg in PATH
-        if platform.system() == "Windows":
-            result = subprocess.run(["where", "ffmpeg"], capture_output=True, text=True, check=True)
-            return result.stdout.strip().split("\n")[0]
-        else:  # Linux/Mac
-            result = subprocess.run(["which", "ffmpeg"], capture_output=True, text=True, check=True)
-            return result.stdout.strip()
-    except subprocess.CalledProcessError:
-        # Check common installation paths
-        common_paths = []
-        if platform.system() == "Windows":
-            common_paths = [
-                "ffmpeg.exe",
-                str(Path(__file__).parent / "ffmpeg.exe")
-            ]
-        else:  # Linux/Mac
-            common_paths = [
-                "/usr/bin/ffmpeg",
-                "/usr/local/bin/ffmpeg",
-                "/opt/homebrew/bin/ffmpeg",
-                "/app/bin/ffmpeg"  # Common path in containerized environments like Render
-            ]
-
-        for path in common_paths:
-            if os.path.exists(path):
-                return path
-
-        return None
+# Function to apply a changed speed limit to this browser's downloads that are already queued or running
+def apply_rate_limit():
+    get_job_manager().set_rate_limit(st.query_params["client"], st.session_state.rate_limit_mbs * 1048576 or None)
+
+
+# Per-job download options
+with st.expander("Advanced options"):
+    st.selectbox(
+        "Download engine:",
+        ["native", "ytdlp"],
+        format_func=lambda engine: {"native": "Native HLS/DASH (parallel segments)", "ytdlp": "yt-dlp"}[engine],
+        key="download_engine",
+        help="The native engine fetches HLS and DASH segments in parallel and falls back to yt-dlp on failure"
+    )
+    st.slider("Parallel segment downloads:", 1, 32, key="hls_concurrency")
+    st.selectbox(
+        "Quality:",
+        list(VARIANT_POLICIES),
+        format_func=lambda policy: VARIANT_POLICIES[policy],
+        key="variant_policy",
+        help="Which rendition to download when the stream offers several"
+    )
+    if st.session_state.variant_policy == "target":
+        st.selectbox("Target resolution:", [1080, 720, 480, 360, 240],
+                     format_func=lambda height: f"{height}p", key="target_height")
+    elif st.session_state.variant_policy == "bandwidth":
+        st.number_input("Maximum bitrate (kbps):", min_value=100, step=100, key="max_bandwidth_kbps")
+    st.number_input("Maximum download speed (MB/s):", min_value=0.0, step=0.5, key="rate_limit_mbs",
+                    on_change=apply_rate_limit,
+                    help="0 means no limit beyond the server-wide bandwidth share. "
+                         "Changes also apply to downloads already in progress")
+    st.select_slider("Download priority:", [0.5, 1.0, 2.0], key="bandwidth_weight",
+                     format_func=lambda weight: {0.5: "Low", 1.0: "Normal", 2.0: "High"}[weight],
+                     help="Share of the server-wide bandwidth limit this download gets next to other running downloads")
+
+
+# Function to build the rendition selection policy from the user's options
+def get_variant_policy():
+    return VariantPolicy(
+        st.session_state.get("variant_policy", DEFAULT_VARIANT_POLICY),
+        target_height=st.session_state.get("target_height"),
+        max_bandwidth=st.session_state.get("max_bandwidth_kbps", 0) * 1000
+    )
+
+
+# Progress text with styling based on status content
+def render_status(status):
+    if "Paused" in status:
+        st.markdown(f"<span class='status-paused'>{status}</span>", unsafe_allow_html=True)
+    elif "Error" in status or "failed" in status:
+        st.markdown(f"<span class='status-error'>{status}</span>", unsafe_allow_html=True)
+    elif "Download" in status or "Downloading" in status:
+        st.markdown(f"<span class='status-downloading'>{status}</span>", unsafe_allow_html=True)
+    else:
+        st.text(status)
 
 
-# Function to get Chrome and ChromeDriver paths for Render deployment
-def get_chrome_paths():
-    # Check environment variables first
-    chrome_path = os.getenv("CHROME_PATH")
-    chromedriver_path = os.getenv("CHROMEDRIVER_PATH")
+# Status indicator label and CSS class for each job status
+JOB_INDICATORS = {
+    "queued": ("⏳ Queued", "status-paused"),
+    "running": ("🟢 Active", "status-downloading"),
+    "paused": ("🟠 Paused", "status-paused"),
+    "done": ("✅ Completed", "status-downloading"),
+    "failed": ("🔴 Error", "status-error"),
+    "cancelled": ("⚪ Cancelled", "status-paused"),
+}
 
-    # If not set, use default paths based on environment
-    if not chrome_path:
-        if platform.system() == "Windows":
-            # Default Windows paths
-            chrome_path = None  # Let webdriver-manager handle it
-        else:
-            # Check Render paths from build.sh
-            render_chrome = "./chrome-linux/chrome"
-            if os.path.exists(render_chrome):
-                chrome_path = render_chrome
-
-    if not chromedriver_path:
-        if platform.system() == "Windows":
-            # Default Windows paths
-            chromedriver_path = None  # Let webdriver-manager handle it
-        else:
-            # Check Render paths from build.sh
-            render_driver = "./chromedriver/chromedriver"
-            if os.path.exists(render_driver):
-                chromedriver_path = render_driver
 
-    return chrome_path, chromedriver_path
+def render_job_header(job):
+    label, status_class = JOB_INDICATORS[job["status"]]
+    st.markdown(
+        f"<span class='{status_class}'><strong>{label}</strong></span> &nbsp; <code>{job['url']}</code>",
+        unsafe_allow_html=True)
 
 
-# Cache for Chrome driver to avoid repeated initialization
-chrome_driver_cache = None
+# Progress and pause/resume/cancel controls for a queued or running job
+def render_active_job(job):
+    render_job_header(job)
+    st.progress(job["progress"])
+    render_status(job["message"])
 
+    control_cols = st.columns(3)
+    with control_cols[0]:
+        if st.button("⏸️ Pause", key=f"pause_{job['id']}", disabled=job["status"] != "running",
+                     help="Pause the current download"):
+            job_manager.pause(client_id, job["id"])
+            st.rerun(scope="fragment")
+    with control_cols[1]:
+        if st.button("▶️ Resume", key=f"resume_{job['id']}", disabled=job["status"] != "paused",
+                     help="Resume the paused download"):
+            job_manager.resume(client_id, job["id"])
+            st.rerun(scope="fragment")
+    with control_cols[2]:
+        if st.button("❌ Cancel", key=f"cancel_{job['id']}", help="Cancel the current download"):
+            job_manager.cancel(client_id, job["id"])
+            st.rerun(scope="fragment")
 
-# Function to get Chrome driver with caching
-def get_chrome_driver(options):
-    global chrome_driver_cache
 
-    # Return cached driver if available and not closed
-    if chrome_driver_cache:
-        try:
-            # Check if driver is still active
-            chrome_driver_cache.current_url
-            return chrome_driver_cache
-        except:
-            # Driver is closed or crashed, reset cache and create a new one
-            chrome_driver_cache = None
+# Result, retry and removal controls for a finished job
+def render_finished_job(job):
+    render_job_header(job)
 
-    # Attempt to get Chrome and ChromeDriver paths
-    try:
-        chrome_path, chromedriver_path = get_chrome_paths()
+    if job["status"] == "done" and job["output_file"] and os.path.exists(job["output_file"]):
+        filename = f"mxplayer_video_{int(job['finished_at'])}.mp4"
+        file_server = get_file_server()
+        base_url = file_server.base_url_for(st.context.headers.get("Host")) if file_server else None
 
-        # If a valid chromedriver path is available, use it
-        if chromedriver_path:
-            service = Service(chromedriver_path)
-            driver = webdriver.Chrome(service=service, options=options)
-        else:
-            # If chromedriver_path is not provided, use webdriver-manager
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-
-        # Cache the driver for reuse
-        chrome_driver_cache = driver
-        return driver
-
-    except WebDriverException as e:
-        raise Exception(f"Failed to start ChromeDriver: {str(e)}")
-    except Exception as e:
-        raise Exception(f"An unexpected error occurred while starting ChromeDriver: {str(e)}")
-
-
-# Function to get a random user agent
-def get_random_user_agent():
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
-    ]
-    return random.choice(user_agents)
-
-
-# Function to extract and download video
-def process_video(url, progress_callback):
-    # Update session state
-    st.session_state.download_status = "downloading"
-    st.session_state.download_progress = 0.0
-    st.session_state.download_output_file = None
-
-    # Store the thread reference for cancellation
-    download_thread = threading.current_thread()
-    st.session_state.download_thread = download_thread
+        # Display video info
+        file_size_mb = os.path.getsize(job["output_file"]) / (1024 * 1024)
+        st.info(f"File Size: {file_size_mb:.1f} MB")
+        if job["extraction_path"]:
+            st.caption(f"Video information resolved via: {job['extraction_path']}")
 
-    try:
-        # Setup Chrome options with anti-bot measures
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-extensions")
-
-        # Anti-bot detection measures
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option("useAutomationExtension", False)
-
-        # Use random user agent
-        user_agent = get_random_user_agent()
-        chrome_options.add_argument(f"user-agent={user_agent}")
-
-        # Add window size randomization for more human-like behavior
-        window_width = random.randint(1024, 1920)
-        window_height = random.randint(768, 1080)
-        chrome_options.add_argument(f"--window-size={window_width},{window_height}")
-
-        # Setup performance logging
-        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
-
-        # Create temp directory for download
-        temp_dir = tempfile.mkdtemp()
-        output_file = os.path.join(temp_dir, f"mxplayer_video_{int(time.time())}.mp4")
-        st.session_state.download_output_file = output_file
-
-        # Find FFmpeg path
-        ffmpeg_path = find_ffmpeg_path()
-        if not ffmpeg_path:
-            st.session_state.download_status = "idle"
-            return None, "FFmpeg not found. Please install FFmpeg and try again."
-
-        # Update progress
-        progress_callback(0.1, "Starting Chrome...")
-
-        # Check if download was cancelled
-        if st.session_state.download_status == "cancelled":
-            return None, "Download cancelled by user."
-
-        # Get Chrome and ChromeDriver paths
-        chrome_path, chromedriver_path = get_chrome_paths()
-
-        # Initialize Chrome driver using the cached driver function
-        try:
-            driver = get_chrome_driver(chrome_options)
-        except Exception as e:
-            st.session_state.download_status = "idle"
-            return None, f"Failed to start Chrome: {str(e)}"
-
-        try:
-            # Navigate to MX Player URL with human-like behavior
-            progress_callback(0.2, "Navigating to MX Player...")
-            driver.get(url)
-
-            # Random wait time to simulate human behavior
-            wait_time = random.uniform(3, 7)
-            time.sleep(wait_time)
-
-            # Check if download was cancelled
-            if st.session_state.download_status == "cancelled":
-                return None, "Download cancelled by user."
-
-            # Scroll down a bit to simulate human behavior
-            driver.execute_script(f"window.scrollTo(0, {random.randint(100, 300)});")
-            time.sleep(random.uniform(1, 2))
-
-            # Extract video URLs from performance logs
-            progress_callback(0.3, "Extracting video information...")
-            logs = driver.get_log("performance")
-            video_urls = []
-
-            for log in logs:
-                # Check if download was cancelled
-                if st.session_state.download_status == "cancelled":
-                    return None, "Download cancelled by user."
-
-                try:
-                    message = json.loads(log["message"])
-                    if "Network.responseReceived" in message["message"]["method"]:
-                        request_id = message["message"]["params"]["requestId"]
-                        request = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
-                        body = request.get("body", "")
-                        if ".m3u8" in body or ".mpd" in body:
-                            video_urls.extend(re.findall(r'https://[^\s\'"]+\.m3u8', body))
-                            video_urls.extend(re.findall(r'https://[^\s\'"]+\.mpd', body))
-                except Exception:
-                    continue
-
-            if not video_urls:
-                st.session_state.download_status = "idle"
-                return None, "No video URLs found. Please check the URL and try again."
-
-            # Download video using yt-dlp
-            progress_callback(0.4, "Preparing to download...")
-
-            # Check if download was cancelled
-            if st.session_state.download_status == "cancelled":
-                return None, "Download cancelled by user."
-
-            # Check if yt-dlp is installed
-            try:
-                subprocess.run(["yt-dlp", "--version"], check=True, capture_output=True)
-            except FileNotFoundError:
-                progress_callback(0.45, "Installing yt-dlp...")
-                subprocess.run(["pip", "install", "-U", "yt-dlp"], check=True)
-
-            # Start download
-            progress_callback(0.5, "Downloading video...")
-
-            # Command to download video
-            cmd = [
-                "yt-dlp",
-                "--ffmpeg-location", ffmpeg_path,
-                "--no-warnings",
-                "--no-part",
-                "--force-generic-extractor",
-                "--no-check-certificate",
-                "-o", output_file,
-                video_urls[0]  # Use the first URL found
-            ]
-
-            # Execute download process
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-
-            # Store process for pause/cancel functionality
-            st.session_state.download_process = process
-
-            # Monitor download progress
-            for line in iter(process.stdout.readline, ''):
-                # Check if download was cancelled
-                if st.session_state.download_status == "cancelled":
-                    if process.poll() is None:  # If process is still running
-                        process.terminate()
-                        process.wait()
-                    return None, "Download cancelled by user."
-
-                # Check if download was paused
-                if st.session_state.download_status == "paused":
-                    # Log the pause with appropriate styling
-                    progress_callback(st.session_state.download_progress,
-                                      f"Paused at: {st.session_state.download_progress * 100:.1f}%")
-
-                    # Wait while paused
-                    while st.session_state.download_status == "paused":
-                        time.sleep(0.1)  # Shorter sleep time for more responsive resume
-
-                        # If cancelled while paused
-                        if st.session_state.download_status == "cancelled":
-                            if process.poll() is None:  # If process is still running
-                                process.terminate()
-                                process.wait()
-                            return None, "Download cancelled by user."
-
-                    # If we got here, we've resumed
-                    if st.session_state.download_status == "downloading":
-                        # Update progress with resume message and appropriate styling
-                        progress_callback(st.session_state.download_progress,
-                                          f"Resuming download from: {st.session_state.download_progress * 100:.1f}%")
-                        # Short delay to ensure UI updates before continuing
-                        time.sleep(0.2)
-
-                if '[download]' in line:
-                    match = re.search(r'(\d+\.\d+)%', line)
-                    if match:
-                        percent = float(match.group(1))
-                        # Map download percentage to overall progress (50% to 90%)
-                        normalized_progress = 0.5 + (percent / 100) * 0.4
-                        st.session_state.download_progress = normalized_progress
-                        progress_callback(normalized_progress, f"Downloading: {percent:.1f}%")
-
-            # Wait for process to complete
-            process.wait()
-
-            # Reset process reference
-            st.session_state.download_process = None
-
-            # Check if download was cancelled
-            if st.session_state.download_status == "cancelled":
-                return None, "Download cancelled by user."
-
-            # Check if download was successful
-            if process.returncode != 0:
-                st.session_state.download_status = "idle"
-                return None, "Download failed. Please try again."
-
-            # Check if file exists and has content
-            if not os.path.exists(output_file) or os.path.getsize(output_file) < 10000:  # Less than 10KB
-                st.session_state.download_status = "idle"
-                return None, "Downloaded file is invalid or too small."
-
-            # Complete
-            st.session_state.download_status = "completed"
-            progress_callback(1.0, "Download complete!")
-            return output_file, None
-
-        finally:
-            # Clean up
-            driver.quit()
-
-    except Exception as e:
-        st.session_state.download_status = "idle"
-        return None, f"Error: {str(e)}"
-
-
-# Function to cancel download
-def cancel_download():
-    if st.session_state.download_status in ["downloading", "paused"]:
-        st.session_state.download_status = "cancelled"
-        if st.session_state.download_process and st.session_state.download_process.poll() is None:
-            st.session_state.download_process.terminate()
-            st.session_state.download_process = None
-        st.session_state.download_progress = 0.0
-        st.rerun()
-
-
-# Function to reset download state (for error recovery)
-def reset_download():
-    st.session_state.download_status = "idle"
-    st.session_state.download_progress = 0.0
-    st.session_state.download_process = None
-    if 'download_output_file' in st.session_state:
-        st.session_state.download_output_file = None
-    if 'progress_bar' in st.session_state:
-        del st.session_state.progress_bar
-    if 'status_text' in st.session_state:
-        del st.session_state.status_text
-    st.rerun()
-
-
-# Function to pause download
-def pause_download():
-    if st.session_state.download_status == "downloading":
-        st.session_state.download_status = "paused"
-        # Ensure the UI updates immediately with styled text
-        if 'status_text' in st.session_state:
-            st.session_state.status_text.markdown(
-                f"<span class='status-paused'>Paused at: {st.session_state.download_progress * 100:.1f}%</span>",
-                unsafe_allow_html=True)
-        st.rerun()
-
-
-# Function to resume download
-def resume_download():
-    if st.session_state.download_status == "paused":
-        st.session_state.download_status = "downloading"
-        # Ensure the UI updates immediately with styled text
-        if 'status_text' in st.session_state:
-            st.session_state.status_text.markdown(
-                f"<span class='status-downloading'>Resuming download from: {st.session_state.download_progress * 100:.1f}%</span>",
-                unsafe_allow_html=True)
-        st.rerun()
-
-
-# Progress callback function
-def update_progress(progress, status):
-    if 'progress_bar' in st.session_state and 'status_text' in st.session_state:
-        st.session_state.progress_bar.progress(progress)
-
-        # Apply appropriate styling based on status content
-        if "Paused" in status:
-            st.session_state.status_text.markdown(f"<span class='status-paused'>{status}</span>",
-                                                  unsafe_allow_html=True)
-        elif "Error" in status or "failed" in status:
-            st.session_state.status_text.markdown(f"<span class='status-error'>{status}</span>", unsafe_allow_html=True)
-        elif "Download" in status or "Downloading" in status:
-            st.session_state.status_text.markdown(f"<span class='status-downloading'>{status}</span>",
-                                                  unsafe_allow_html=True)
-        else:
-            st.session_state.status_text.text(status)
+        if base_url:
+            # Serve the file from disk; the page only holds its URL, never the video bytes
+            token = file_server.register(job["output_file"], filename=filename, key=job["id"])
 
+            # Download button
+            st.markdown("<div class='download-btn'>", unsafe_allow_html=True)
+            st.link_button("⬇️ Download Video", file_server.url_for(token, download=True, base_url=base_url))
+            st.markdown("</div>", unsafe_allow_html=True)
 
-# Main download section
-download_col1, download_col2 = st.columns([3, 1])
-
-with download_col1:
-    # Main download button - disabled during download, pause, or error states
-    download_disabled = st.session_state.download_status in ["downloading", "paused", "error"]
-    if st.button("Download Video", key="download_btn", disabled=download_disabled):
-        if not mx_url or not re.match(r"https://www\.mxplayer\.in/.*", mx_url):
-            st.error("Please enter a valid MX Player URL")
-            st.session_state.error_message = "Please enter a valid MX Player URL"
+            # Video preview, streamed with Range requests so seeking works without fetching the whole file
+            st.video(file_server.url_for(token, base_url=base_url))
         else:
-            # Start a new download
-            st.session_state.download_status = "downloading"
-            st.session_state.error_message = None
-            st.rerun()
-
-with download_col2:
-    # Control buttons layout with better spacing
-    st.markdown("<div style='padding: 10px 0;'></div>", unsafe_allow_html=True)
-
-    # Create a container for the buttons
-    control_container = st.container()
-
-    # Use columns for button layout
-    control_cols = control_container.columns(3)
-
-    # Pause button with enhanced styling
-    with control_cols[0]:
-        pause_disabled = st.session_state.download_status != "downloading"
-        if st.button("⏸️ Pause",
-                     key="pause_btn",
-                     disabled=pause_disabled,
-                     help="Pause the current download"):
-            pause_download()
-
-    # Resume button with enhanced styling
-    with control_cols[1]:
-        resume_disabled = st.session_state.download_status != "paused"
-        if st.button("▶️ Resume",
-                     key="resume_btn",
-                     disabled=resume_disabled,
-                     help="Resume the paused download"):
-            resume_download()
-
-    # Cancel button with enhanced styling
-    with control_cols[2]:
-        cancel_disabled = st.session_state.download_status not in ["downloading", "paused"]
-        if st.button("❌ Cancel",
-                     key="cancel_btn",
-                     disabled=cancel_disabled,
-                     help="Cancel the current download"):
-            cancel_download()
-
-# Display download status
-if st.session_state.download_status in ["downloading", "paused", "error"]:
-    # Add a status indicator
-    status_indicator = ""
-    if st.session_state.download_status == "downloading":
-        status_indicator = "🟢 Active"
-        status_class = "status-downloading"
-    elif st.session_state.download_status == "paused":
-        status_indicator = "🟠 Paused"
-        status_class = "status-paused"
-    elif st.session_state.download_status == "error":
-        status_indicator = "🔴 Error"
-        status_class = "status-error"
-
-    # Display status indicator
-    st.markdown(
-        f"<div style='text-align: center; margin-bottom: 10px;'><span class='{status_class}'><strong>{status_indicator}</strong></span></div>",
-        unsafe_allow_html=True)
+            # Handing the file to Streamlit would load all of it into memory on every rerun
+            st.warning("This server has no download address configured. Set FILE_SERVER_PUBLIC_URL "
+                       "to a URL that reaches the file server to download and preview videos here.")
+            st.caption(f"Saved on the server as: {job['output_file']}")
+    elif job["status"] == "done":
+        st.error("Downloaded file not found. Please try again.")
+    elif job["status"] == "failed":
+        st.markdown(f"<span class='status-error'>{job['error']}</span>", unsafe_allow_html=True)
+    else:
+        render_status(job["message"])
 
-    # Display error message if in error state
-    if st.session_state.download_status == "error" and st.session_state.error_message:
-        st.markdown(
-            f"<div style='text-align: center; margin-bottom: 15px;'><span class='status-error'>{st.session_state.error_message}</span></div>",
-            unsafe_allow_html=True)
-
-        # Add a retry button in the center
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            if st.button("🔄 Retry Download", key="retry_main"):
-                reset_download()
-
-    # Only show progress for downloading and paused states
-    if st.session_state.download_status in ["downloading", "paused"]:
-        # Setup progress tracking if not already set
-        if 'progress_bar' not in st.session_state:
-            st.session_state.progress_bar = st.progress(st.session_state.download_progress)
-        if 'status_text' not in st.session_state:
-            st.session_state.status_text = st.empty()
-
-        # Update progress display
-        st.session_state.progress_bar.progress(st.session_state.download_progress)
-
-        # Show status message with styled text
-        if st.session_state.download_status == "downloading":
-            st.session_state.status_text.markdown(
-                f"<span class='status-downloading'>Downloading: {st.session_state.download_progress * 100:.1f}%</span>",
-                unsafe_allow_html=True)
-        elif st.session_state.download_status == "paused":
-            st.session_state.status_text.markdown(
-                f"<span class='status-paused'>Paused at: {st.session_state.download_progress * 100:.1f}%</span>",
-                unsafe_allow_html=True)
-
-    # Process video if status is downloading and no process is running
-    if st.session_state.download_status == "downloading" and not st.session_state.download_process:
-        # Process video in a separate thread
-        with st.spinner("Processing video..."):
-            try:
-                output_file, error = process_video(mx_url, update_progress)
-
-                # Handle result
-                if error:
-                    st.error(error)
-                    st.session_state.download_status = "idle"
-                    st.rerun()
-                elif output_file and os.path.exists(output_file):
-                    st.session_state.download_output_file = output_file
-                    st.session_state.download_status = "completed"
-                    st.rerun()
-            except Exception as e:
-                error_msg = f"An error occurred: {str(e)}"
-                st.session_state.error_message = error_msg
-                st.session_state.download_status = "error"
-                st.session_state.download_process = None
-                st.error(error_msg)
+    action_cols = st.columns([1, 1, 2])
+    with action_cols[0]:
+        if job["status"] != "done" and st.button("🔄 Retry Download", key=f"retry_{job['id']}"):
+            if submit_job(job["url"]):
+                job_manager.remove(client_id, job["id"])
                 st.rerun()
+            st.error(st.session_state.error_message)
+    with action_cols[1]:
+        if st.button("🗑️ Remove", key=f"remove_{job['id']}", help="Remove this job from the list"):
+            job_manager.remove(client_id, job["id"])
+            st.rerun()
 
-# Display completed download
-if st.session_state.download_status == "completed" and st.session_state.download_output_file:
-    output_file = st.session_state.download_output_file
-
-    if os.path.exists(output_file):
-        st.success("Video downloaded successfully!")
 
-        # Read video file
-        with open(output_file, "rb") as file:
-            video_bytes = file.read()
+# Function to queue a download with the options currently selected on the page.
+# Returns the job id, or None when the server turned the job away.
+def submit_job(url):
+    try:
+        job_id = job_manager.submit(
+            client_id, url,
+            engine=st.session_state.download_engine,
+            variant_policy=get_variant_policy(),
+            hls_concurrency=st.session_state.hls_concurrency,
+            rate_limit=st.session_state.rate_limit_mbs * 1048576 or None,
+            bandwidth_weight=st.session_state.bandwidth_weight
+        )
+    except AdmissionError as e:
+        st.session_state.error_message = str(e)
+        return None
+    st.session_state.error_message = None
+    return job_id
 
-            # Get file size
-            file_size_mb = len(video_bytes) / (1024 * 1024)
 
-            # Display video info
-            st.markdown(f"<h2 class='sub-header'>Your Video is Ready!</h2>", unsafe_allow_html=True)
-            st.info(f"File Size: {file_size_mb:.1f} MB")
+job_manager = get_job_manager()
 
-            # Download button
-            st.markdown("<div class='download-btn'>", unsafe_allow_html=True)
-            st.download_button(
-                label="⬇️ Download Video",
-                data=video_bytes,
-                file_name=f"mxplayer_video_{int(time.time())}.mp4",
-                mime="video/mp4"
-            )
-            st.markdown("</div>", unsafe_allow_html=True)
+# Identify this browser across reloads through the URL so its jobs can be found again
+if "client" not in st.query_params:
+    st.query_params["client"] = uuid.uuid4().hex
+client_id = st.query_params["client"]
 
-            # Video preview
-            st.video(video_bytes)
-
-            # Clean up
-            try:
-                os.remove(output_file)
-                st.session_state.download_output_file = None
-                st.session_state.download_status = "idle"
-                st.session_state.download_progress = 0.0
-            except:
-                pass
+# Main download section
+if st.button("Download Video", key="download_btn"):
+    if not mx_url or not re.match(r"https://www\.mxplayer\.in/.*", mx_url):
+        st.error("Please enter a valid MX Player URL")
+        st.session_state.error_message = "Please enter a valid MX Player URL"
     else:
-        st.error("Downloaded file not found. Please try again.")
-        st.session_state.download_status = "idle"
-        st.session_state.download_output_file = None
+        # Queue a new download; it runs in the background job engine
+        if submit_job(mx_url) is None:
+            st.error(st.session_state.error_message)
+
+jobs = job_manager.snapshot(client_id)
+active_ids = [job["id"] for job in jobs if job["status"] in ACTIVE_STATUSES]
+
+
+# Active jobs are polled once a second without rerunning the whole page
+@st.fragment(run_every=1.0 if active_ids else None)
+def render_active_jobs():
+    current = [job for job in job_manager.snapshot(client_id) if job["status"] in ACTIVE_STATUSES]
+    # A job finished since the last full run: rerun the page to show its result
+    if [job["id"] for job in current] != active_ids:
+        st.rerun(scope="app")
+    for job in current:
+        with st.container(border=True):
+            render_active_job(job)
+
+
+if active_ids:
+    st.markdown("<h2 class='sub-header'>Downloads in Progress</h2>", unsafe_allow_html=True)
+    render_active_jobs()
+
+# Display finished downloads
+finished = [job for job in jobs if job["status"] not in ACTIVE_STATUSES]
+if finished:
+    if any(job["status"] == "done" for job in finished):
+        st.markdown("<h2 class='sub-header'>Your Video is Ready!</h2>", unsafe_allow_html=True)
+    for job in reversed(finished):
+        with st.container(border=True):
+            render_finished_job(job)
 
 # Close the card container
 st.markdown("</div>", unsafe_allow_html=True)
@@ -0,0 +1,267 @@
+import os
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+from fast_path import VIDEO_ID_PATTERN
+from resolution_cache import CACHE_DIR, normalize_url
+
+
+# Output store settings, overridable through the environment
+OUTPUT_STORE_DIR = os.getenv("OUTPUT_STORE_DIR", os.path.join(CACHE_DIR, "outputs"))
+OUTPUT_STORE_MAX_BYTES = int(float(os.getenv("OUTPUT_STORE_MAX_GB", "20")) * 1024 ** 3)
+# Scratch directories untouched for this long are treated as abandoned
+SCRATCH_MAX_AGE = float(os.getenv("SCRATCH_MAX_AGE", str(24 * 3600)))
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "600"))
+# References and scratch leases of a process that stopped renewing them lapse after this long
+REFERENCE_TTL = float(os.getenv("OUTPUT_REFERENCE_TTL", str(3 * JANITOR_INTERVAL)))
+
+
+# Function to derive the content identity of a download: the episode id (or
+# the normalized page URL when there is none) plus what the variant policy selects
+def content_key(url, variant_policy):
+    match = VIDEO_ID_PATTERN.search(urlsplit(url).path)
+    identity = match.group(1).lower() if match else normalize_url(url)
+    return hashlib.sha1(f"{identity}|{variant_policy.identity()}".encode()).hexdigest()
+
+
+# Function to find when anything inside a directory was last written
+def last_modified(path):
+    newest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                continue
+    return newest
+
+
+# Function to delete abandoned scratch directories; in_use holds paths of running jobs
+def clean_scratch(scratch_dir, max_age=SCRATCH_MAX_AGE, in_use=()):
+    if not os.path.isdir(scratch_dir):
+        return 0
+    cutoff = time.time() - max_age
+    busy = {os.path.abspath(os.path.dirname(path)) for path in in_use}
+    removed = 0
+    for entry in os.scandir(scratch_dir):
+        path = os.path.abspath(entry.path)
+        if not entry.is_dir() or path in busy:
+            continue
+        try:
+            if last_modified(path) < cutoff:
+                shutil.rmtree(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class OutputStore:
+    # Shared on-disk store of finished downloads, keyed by content_key().
+    #
+    # Files live at <root>/<key[:2]>/<key>.mp4 with an SQLite index of their
+    # size and last use. Past max_bytes the least recently used files are
+    # evicted, except files with a live reference (acquire()/release()), which
+    # are being shown to a user.
+    #
+    # References and scratch leases (work directories of running jobs) are
+    # kept in the index, so the front end and every worker sharing the store
+    # see each other's. Each process renews its own with renew() from the
+    # janitor; those of a process that died lapse after REFERENCE_TTL.
+    def __init__(self, root=OUTPUT_STORE_DIR, max_bytes=OUTPUT_STORE_MAX_BYTES, ttl=REFERENCE_TTL):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=30,
+                                     check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outputs ("
+                " key TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS refs ("
+                " key TEXT NOT NULL,"
+                " holder TEXT NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " expires REAL NOT NULL,"
+                " PRIMARY KEY (key, holder))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scratch ("
+                " path TEXT PRIMARY KEY,"
+                " holder TEXT NOT NULL,"
+                " expires REAL NOT NULL)"
+            )
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.mp4")
+
+    def contains(self, path):
+        return os.path.abspath(path).startswith(self.root + os.sep)
+
+    @staticmethod
+    def key_for(path):
+        return os.path.basename(path)[:-len(".mp4")]
+
+    # Return the stored file for a key, or None on a miss
+    def get(self, key):
+        path = self.path_for(key)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT size FROM outputs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(path) or os.path.getsize(path) != row[0]:
+                self._conn.execute("DELETE FROM outputs WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE outputs SET last_used = ? WHERE key = ?", (time.time(), key))
+        return path
+
+    # Move a finished download into the store and return its new path
+    def put(self, key, source):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.move(source, tmp_path)
+        os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs (key, size, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, os.path.getsize(path), now, now)
+            )
+        # The caller has not had a chance to acquire the new file yet
+        self.evict(keep=key)
+        return path
+
+    # Hold a stored file while it is being served so eviction, in any process, skips it
+    def acquire(self, path):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO refs (key, holder, count, expires) VALUES (?, ?, 1, ?)"
+                " ON CONFLICT (key, holder) DO UPDATE SET count = count + 1, expires = excluded.expires",
+                (self.key_for(path), self.holder, time.time() + self.ttl)
+            )
+
+    def release(self, path):
+        key = self.key_for(path)
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE refs SET count = count - 1 WHERE key = ? AND holder = ?", (key, self.holder))
+            self._conn.execute("DELETE FROM refs WHERE key = ? AND holder = ? AND count <= 0", (key, self.holder))
+
+    # Mark a running job's work file so scratch cleanup in any process leaves its directory alone
+    def lease_scratch(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO scratch (path, holder, expires) VALUES (?, ?, ?)",
+                               (os.path.abspath(path), self.holder, time.time() + self.ttl))
+
+    def release_scratch(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM scratch WHERE path = ? AND holder = ?",
+                               (os.path.abspath(path), self.holder))
+
+    # Work files of running jobs in every process sharing the store
+    def leased_scratch(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM scratch WHERE expires > ?", (time.time(),)).fetchall()
+        return {path for path, in rows}
+
+    # Extend this process's references and leases, and drop those whose holder stopped renewing them
+    def renew(self):
+        now = time.time()
+        with self._lock, self._conn:
+            for table in ("refs", "scratch"):
+                self._conn.execute(f"UPDATE {table} SET expires = ? WHERE holder = ?", (now + self.ttl, self.holder))
+                self._conn.execute(f"DELETE FROM {table} WHERE expires <= ?", (now,))
+
+    # Delete least recently used files until the store fits its byte budget
+    def evict(self, keep=None):
+        removed = []
+        with self._lock, self._conn:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM outputs").fetchone()[0]
+            if total <= self.max_bytes:
+                return removed
+            candidates = self._conn.execute(
+                "SELECT key, size FROM outputs WHERE key NOT IN (SELECT key FROM refs WHERE expires > ?)"
+                " ORDER BY last_used", (time.time(),)
+            ).fetchall()
+            for key, size in candidates:
+                if total <= self.max_bytes:
+                    break
+                path = self.path_for(key)
+                if key == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                self._conn.execute("DELETE FROM outputs WHERE key = ?", (key,))
+                total -= size
+                removed.append(key)
+        return removed
+
+    # Reconcile the index with the disk: drop rows whose file is gone and
+    # files (or interrupted moves) that never made it into the index
+    def sweep(self):
+        with self._lock, self._conn:
+            keys = {key for key, in self._conn.execute("SELECT key FROM outputs")}
+            for key in list(keys):
+                if not os.path.exists(self.path_for(key)):
+                    self._conn.execute("DELETE FROM outputs WHERE key = ?", (key,))
+                    keys.discard(key)
+        cutoff = time.time() - 3600
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            for item in os.scandir(entry.path):
+                name = item.name
+                stored = name.endswith(".mp4") and name[:-4] in keys
+                try:
+                    if not stored and item.stat().st_mtime < cutoff:
+                        os.remove(item.path)
+                except OSError:
+                    continue
+        self.evict()
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outputs").fetchone()
+            referenced = self._conn.execute(
+                "SELECT COUNT(DISTINCT key) FROM refs WHERE expires > ?", (time.time(),)
+            ).fetchone()[0]
+            return {"files": count, "bytes": total, "max_bytes": self.max_bytes, "referenced": referenced}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Function to run a cleanup callback every interval seconds on a daemon thread
+def start_janitor(callback, interval=JANITOR_INTERVAL):
+    def loop():
+        while True:
+            try:
+                callback()
+            except Exception:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="mx-janitor", daemon=True)
+    thread.start()
+    return thread
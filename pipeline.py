@@ -0,0 +1,740 @@
+import os
+import time
+import random
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from driver_pool import ChromeDriverPool
+from manifest import detect_manifests
+from blocking import DEFAULT_BLOCK_POLICY
+from multitab import TABS_PER_BROWSER, MultiTabExtractor
+from resolution_cache import CACHE_DIR, ResolutionCache
+from output_store import SCRATCH_MAX_AGE, OutputStore, clean_scratch, content_key, start_janitor
+from fast_path import FAST_PATH_ENABLED, extract_video_urls_fast, record_extraction_path
+from metrics import SOURCE_FAILOVERS, JobTrace
+from scheduler import get_browser_slots, get_download_slots
+from bandwidth import format_rate, get_bandwidth_manager
+from events import ProgressEvent, get_event_bus, publisher
+from toolchain import get_toolchain
+from postprocess import finalize_output
+from hls import DEFAULT_CONCURRENCY as HLS_CONCURRENCY, DownloadCancelled, VariantPolicy, download_hls
+from dash import download_dash
+
+
+# Download engine used unless the caller picks another one: "native" (parallel HLS/DASH) or "ytdlp"
+DEFAULT_DOWNLOAD_ENGINE = os.getenv("DOWNLOAD_ENGINE", "native")
+# Rendition picked from master playlists unless the caller picks another policy
+DEFAULT_VARIANT_POLICY = os.getenv("VARIANT_POLICY", "best")
+# Work directory for in-progress and finished downloads
+DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", os.path.join(CACHE_DIR, "downloads"))
+# Discovered manifests tried in turn before a download is given up
+MAX_MANIFEST_ATTEMPTS = int(os.getenv("MAX_MANIFEST_ATTEMPTS", "3"))
+
+LEASE_LOST_MESSAGE = "Stopped: the job was handed to another worker."
+
+# Process-wide singletons; this module stays imported across Streamlit reruns
+_driver_pool = None
+_resolution_cache = None
+_output_store = None
+_active_outputs = set()
+_singleton_lock = threading.Lock()
+
+
+class JobState:
+    # Mutable state of one job, shared between the pipeline and whoever drives it.
+    # Attribute names match the Streamlit session state so either can be passed to process_video.
+    def __init__(self):
+        self.download_status = "idle"  # idle, downloading, paused, cancelled, completed, error
+        self.download_progress = 0.0
+        # Latest transfer stats from the download engine: bytes, speed, ETA, fragments
+        self.transfer = {}
+        self.download_output_file = None
+        self.extraction_path = None
+        # Slot the job is queued for, with its position and ETA, while it waits
+        self.queue = None
+        # Per-stage timing summary of the last run, see metrics.JobTrace
+        self.metrics = None
+        # Pipeline stage published with progress events: extract, download, postprocess
+        self.stage = None
+        # Bandwidth handle of the running download, so its speed cap can be changed while it runs
+        self.shaper = None
+        # Optional callable set by a queue worker; False once its lease on the job may have lapsed
+        self.fence = None
+
+
+# Function to build the Chrome options shared by every pooled browser
+def get_chrome_options():
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-extensions")
+    # Return from driver.get() at DOMContentLoaded; manifest detection polls the network log
+    chrome_options.page_load_strategy = "eager"
+
+    # Anti-bot detection measures
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option("useAutomationExtension", False)
+
+    # Setup performance logging
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return chrome_options
+
+
+# Session errors ChromeDriver raises when it does not support the installed Chrome
+CHROME_VERSION_MISMATCH = re.compile(r"only supports Chrome version|Current browser version is", re.IGNORECASE)
+
+
+# Function to start a new Chrome driver
+def get_chrome_driver(options):
+    # Selenium is only imported once a job actually needs a browser
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import WebDriverException
+
+    # Use the ChromeDriver resolved at startup, or fetch it with webdriver-manager if the probe found none
+    try:
+        try:
+            chromedriver_path = get_toolchain().ensure_chromedriver()
+            return webdriver.Chrome(service=Service(chromedriver_path), options=options)
+        except WebDriverException as e:
+            if not CHROME_VERSION_MISMATCH.search(str(e)):
+                raise
+            # Chrome was updated under the cached ChromeDriver; re-probe and fetch a matching one
+            chromedriver_path = get_toolchain(refresh=True).ensure_chromedriver()
+            return webdriver.Chrome(service=Service(chromedriver_path), options=options)
+
+    except WebDriverException as e:
+        raise Exception(f"Failed to start ChromeDriver: {str(e)}")
+    except Exception as e:
+        raise Exception(f"An unexpected error occurred while starting ChromeDriver: {str(e)}")
+
+
+# Warm pool of Chrome drivers shared by every job in this process
+def get_driver_pool(size=None):
+    global _driver_pool
+    with _singleton_lock:
+        if _driver_pool is None:
+            factory = lambda: get_chrome_driver(get_chrome_options())
+            _driver_pool = ChromeDriverPool(factory, size=size) if size else ChromeDriverPool(factory)
+        return _driver_pool
+
+
+# Manifest resolution cache shared by every job in this process
+def get_resolution_cache():
+    global _resolution_cache
+    with _singleton_lock:
+        if _resolution_cache is None:
+            _resolution_cache = ResolutionCache()
+        return _resolution_cache
+
+
+# Shared store of finished downloads; the first call also starts the janitor that
+# trims the store and removes abandoned work directories
+def get_output_store():
+    global _output_store
+    with _singleton_lock:
+        if _output_store is None:
+            _output_store = OutputStore()
+            start_janitor(run_janitor)
+        return _output_store
+
+
+def run_janitor():
+    store = get_output_store()
+    store.renew()
+    # Work directories of jobs running in any process sharing the store are left alone
+    clean_scratch(DOWNLOAD_DIR, SCRATCH_MAX_AGE, store.leased_scratch())
+    store.sweep()
+
+
+# Function to get a random user agent
+def get_random_user_agent():
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
+    ]
+    return random.choice(user_agents)
+
+
+# Function to resolve the stream manifests of a page with a pooled Chrome driver
+def extract_video_urls(url, progress_callback, state, trace=None):
+    # Randomize the browser fingerprint per job; the pooled browsers share launch options
+    user_agent = get_random_user_agent()
+    window_width = random.randint(1024, 1920)
+    window_height = random.randint(768, 1080)
+
+    # Update progress
+    progress_callback(0.1, "Acquiring Chrome...")
+
+    # Check out a warm Chrome driver from the pool
+    pool = get_driver_pool()
+    started = time.monotonic()
+    try:
+        driver = pool.acquire()
+    except Exception as e:
+        if trace is not None:
+            trace.record("driver_acquire", time.monotonic() - started, "error")
+        return None, f"Failed to start Chrome: {str(e)}"
+    if trace is not None:
+        trace.record("driver_acquire", time.monotonic() - started)
+
+    try:
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+        driver.set_window_size(window_width, window_height)
+
+        # Navigate to MX Player URL and wait for the stream manifest to show up
+        progress_callback(0.2, "Navigating to MX Player...")
+        video_urls = detect_manifests(
+            driver, url,
+            should_stop=lambda: state.download_status == "cancelled",
+            trace=trace,
+            block_policy=DEFAULT_BLOCK_POLICY
+        )
+        progress_callback(0.3, "Extracting video information...")
+        return video_urls, None
+
+    except Exception:
+        pool.release(driver, discard=True)
+        driver = None
+        raise
+
+    finally:
+        # Hand the browser back to the pool instead of quitting it
+        if driver is not None:
+            pool.release(driver)
+
+
+# Function to resolve many pages up front, several tabs per pooled browser, for batch work.
+# Manifests go into the resolution cache, so the jobs that follow skip Chrome;
+# returns {url: manifest URLs} for the pages that were not cached already.
+def prefetch_resolutions(urls, tabs=TABS_PER_BROWSER, browsers=None, on_result=None):
+    resolution_cache = get_resolution_cache()
+    pending = [url for url in dict.fromkeys(urls) if not resolution_cache.get(url)]
+    if not pending:
+        return {}
+    pool = get_driver_pool()
+    browsers = max(1, min(browsers or pool.size, -(-len(pending) // max(1, tabs))))
+
+    def resolve(chunk):
+        driver = pool.acquire()
+        try:
+            extractor = MultiTabExtractor(driver, tabs, block_policy=DEFAULT_BLOCK_POLICY,
+                                          user_agent=get_random_user_agent())
+            results = extractor.extract(chunk, on_result=on_result)
+        except Exception:
+            pool.release(driver, discard=True)
+            raise
+        pool.release(driver)
+        for url, video_urls in results.items():
+            if video_urls:
+                resolution_cache.put(url, video_urls)
+        return results
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=browsers, thread_name_prefix="mx-prefetch") as executor:
+        for chunk_results in executor.map(resolve, [pending[index::browsers] for index in range(browsers)]):
+            results.update(chunk_results)
+    return results
+
+
+# Function to wait for a scheduler slot, reporting the job's queue position and ETA meanwhile.
+# Returns the slot start time, or None if the job was cancelled while queued.
+def wait_for_slot(slots, owner, state, progress_callback, progress, trace):
+    def on_wait(position, eta):
+        state.queue = {"slot": slots.name, "position": position, "eta": eta}
+        estimate = f", about {eta:.0f}s" if eta is not None else ""
+        progress_callback(progress, f"Waiting for a {slots.name} slot (position {position}{estimate})...")
+
+    with trace.stage(f"{slots.name}_queue") as stage:
+        started = slots.acquire(owner, should_stop=lambda: state.download_status == "cancelled", on_wait=on_wait)
+        if started is None:
+            stage["outcome"] = "cancelled"
+    state.queue = None
+    return started
+
+
+# Function to pick a stable output path for a job so partial downloads survive
+# restarts and a resubmitted job continues from its checkpoint. Falls back to a
+# fresh temp directory while another job in this process is using the path.
+def claim_output_file(url, variant_policy):
+    key = content_key(url, variant_policy)[:16]
+    output_file = os.path.join(DOWNLOAD_DIR, key, "mxplayer_video.mp4")
+    with _singleton_lock:
+        if output_file in _active_outputs:
+            # Scratch directories live under DOWNLOAD_DIR so the janitor can clean them up
+            os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+            scratch_dir = tempfile.mkdtemp(dir=DOWNLOAD_DIR, prefix="job-")
+            output_file = os.path.join(scratch_dir, f"mxplayer_video_{int(time.time())}.mp4")
+        _active_outputs.add(output_file)
+    get_output_store().lease_scratch(output_file)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    return output_file
+
+
+# Function to tell whether a job may still write its files. Once a worker's fence fails
+# another worker may own the job's work path, so the job is stopped before it writes again.
+def holds_lease(state):
+    fence = getattr(state, "fence", None)
+    if fence is None or fence():
+        return True
+    state.download_status = "cancelled"
+    return False
+
+
+def release_output_file(output_file):
+    with _singleton_lock:
+        _active_outputs.discard(output_file)
+    get_output_store().release_scratch(output_file)
+
+
+# Function to add the job's bandwidth limit and measured rate to a progress message and its transfer stats
+def apply_shaper_stats(shaper, transfer, status):
+    if shaper is None or not shaper.rate:
+        return status
+    transfer["rate_limit"] = shaper.rate
+    transfer["actual_rate"] = shaper.actual_rate
+    return f"{status}, limited to {format_rate(shaper.rate)}"
+
+
+# Function to turn a yt-dlp progress hook event into the job's transfer stats
+def transfer_from_hook(event):
+    total = event.get("total_bytes") or event.get("total_bytes_estimate")
+    fragment_index, fragment_count = event.get("fragment_index"), event.get("fragment_count")
+    # Fragment counts are exact for HLS/DASH, byte totals there are only estimates
+    if event.get("total_bytes"):
+        fraction = event.get("downloaded_bytes", 0) / event["total_bytes"]
+    elif fragment_count:
+        fraction = (fragment_index or 0) / fragment_count
+    elif total:
+        fraction = event.get("downloaded_bytes", 0) / total
+    else:
+        fraction = 0.0
+    return {
+        "downloaded_bytes": event.get("downloaded_bytes", 0),
+        "total_bytes": total,
+        "speed": event.get("speed"),
+        "eta": event.get("eta"),
+        "fragment_index": fragment_index,
+        "fragment_count": fragment_count,
+        "fraction": min(max(fraction, 0.0), 1.0),
+    }
+
+
+# Function to download a manifest with yt-dlp's Python API, in-process.
+# Progress arrives as structured hook events; pausing blocks the hook, which
+# stalls the download thread, and cancelling raises out of it.
+# trace, if given, receives manifest_selection/download/post_processing timings.
+# shaper, if given, paces the download thread from the hook as bytes arrive.
+# resume=False discards partial files, which may come from a different manifest.
+# Returns None on success or an error message.
+def download_with_ytdlp(video_url, output_file, ffmpeg_path, progress_callback, variant_policy, state, trace=None,
+                        shaper=None, resume=True):
+    # yt-dlp takes a noticeable time to import, so only load it when this engine runs
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import DownloadCancelled as YtDlpDownloadCancelled, DownloadError as YtDlpDownloadError
+
+    progress_callback(0.5, "Downloading video...")
+
+    # Stage boundaries taken from hook events: the first event ends manifest selection,
+    # the last "finished" event ends the transfer and the rest is post-processing
+    marks = {"started": time.monotonic(), "first_event": None, "finished": None}
+    file_bytes = {}
+
+    def on_progress(event):
+        now = time.monotonic()
+        if marks["first_event"] is None:
+            marks["first_event"] = now
+        if event.get("downloaded_bytes") is not None:
+            filename = event.get("filename")
+            previous = file_bytes.get(filename)
+            file_bytes[filename] = event["downloaded_bytes"]
+            # Charge what arrived since the last event; the first event of a file
+            # can include bytes kept from an earlier, resumed run
+            if shaper is not None and previous is not None and event["downloaded_bytes"] > previous:
+                shaper.throttle(event["downloaded_bytes"] - previous)
+        if event.get("status") == "finished":
+            marks["finished"] = now
+
+        if state.download_status == "paused":
+            progress_callback(state.download_progress, f"Paused at: {state.download_progress * 100:.1f}%")
+            while state.download_status == "paused":
+                time.sleep(0.1)
+            if state.download_status == "downloading":
+                progress_callback(state.download_progress,
+                                  f"Resuming download from: {state.download_progress * 100:.1f}%")
+
+        if not holds_lease(state) or state.download_status == "cancelled":
+            raise YtDlpDownloadCancelled("Download cancelled by user.")
+
+        if event.get("status") != "downloading":
+            return
+        transfer = transfer_from_hook(event)
+        state.transfer = transfer
+        # Map download percentage to overall progress (50% to 90%)
+        normalized_progress = 0.5 + transfer["fraction"] * 0.4
+        state.download_progress = normalized_progress
+        status = f"Downloading: {transfer['fraction'] * 100:.1f}%"
+        if transfer["speed"]:
+            status += f" ({format_rate(transfer['speed'])})"
+        status = apply_shaper_stats(shaper, transfer, status)
+        progress_callback(normalized_progress, status)
+
+    options = {
+        "ffmpeg_location": ffmpeg_path,
+        "format": variant_policy.ytdlp_format(),
+        "outtmpl": {"default": output_file},
+        # Keep .part files and fragment state so an interrupted download continues where it stopped
+        "continuedl": resume,
+        "allowed_extractors": ["generic"],
+        "nocheckcertificate": True,
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        # No "ratelimit": yt-dlp would keep enforcing the cap it started with, so every
+        # limit, including changes while the job runs, is applied by the hook above
+        "progress_hooks": [on_progress],
+    }
+
+    retcode = 1
+    try:
+        with YoutubeDL(options) as ydl:
+            retcode = ydl.download([video_url])
+    except YtDlpDownloadCancelled:
+        pass
+    except YtDlpDownloadError:
+        retcode = 1
+    finally:
+        if trace is not None:
+            outcome = "cancelled" if state.download_status == "cancelled" else "ok" if retcode == 0 else "error"
+            record_ytdlp_stages(trace, marks, sum(file_bytes.values()), outcome)
+
+    # Check if download was cancelled
+    if state.download_status == "cancelled":
+        return "Download cancelled by user."
+
+    # Check if download was successful
+    if retcode != 0:
+        return "Download failed. Please try again."
+    return None
+
+
+# Function to split a yt-dlp run into stages from the progress hook timestamps
+def record_ytdlp_stages(trace, marks, downloaded_bytes, outcome):
+    ended = time.monotonic()
+    first_event, finished = marks["first_event"], marks["finished"]
+    if first_event is None:
+        # Failed or cancelled before any transfer started
+        trace.record("manifest_selection", ended - marks["started"], outcome)
+        return
+    trace.record("manifest_selection", first_event - marks["started"])
+    if finished is None or outcome != "ok":
+        trace.record("download", ended - first_event, outcome, bytes=downloaded_bytes)
+        return
+    trace.record("download", finished - first_event, bytes=downloaded_bytes)
+    trace.record("post_processing", ended - finished)
+
+
+# Function to pick the native downloader for a manifest URL, or None when only yt-dlp can handle it
+def get_native_downloader(video_url):
+    path = video_url.split("?", 1)[0]
+    if path.endswith(".m3u8"):
+        return download_hls
+    if path.endswith(".mpd"):
+        return download_dash
+    return None
+
+
+# Function to download an HLS or DASH manifest with the native parallel segment downloaders.
+# HLS downloads fall over to mirrors (other HLS manifests of the page) segment by
+# segment and report per-mirror stats to on_mirrors. Returns None on success or an error message.
+def download_with_native(video_url, output_file, ffmpeg_path, progress_callback, variant_policy, state,
+                         concurrency=HLS_CONCURRENCY, trace=None, shaper=None, mirrors=(), on_mirrors=None):
+    # Map segment progress onto the overall 50% to 90% download range
+    def on_progress(fraction, status):
+        normalized_progress = 0.5 + fraction * 0.4
+        state.download_progress = normalized_progress
+        transfer = {"fraction": fraction}
+        status = apply_shaper_stats(shaper, transfer, status)
+        state.transfer = transfer
+        progress_callback(normalized_progress, status)
+
+    download = get_native_downloader(video_url)
+    sources = {}
+    if download is download_hls:
+        sources = {"mirrors": [mirror for mirror in mirrors if get_native_downloader(mirror) is download_hls],
+                   "on_mirrors": on_mirrors}
+    try:
+        download(
+            video_url, output_file,
+            concurrency=concurrency,
+            progress_callback=on_progress,
+            should_stop=lambda: state.download_status == "cancelled",
+            is_paused=lambda: state.download_status == "paused",
+            fence=lambda: holds_lease(state),
+            ffmpeg_path=ffmpeg_path,
+            variant_policy=variant_policy,
+            trace=trace,
+            throttle=shaper.throttle if shaper is not None else None,
+            **sources
+        )
+    except DownloadCancelled:
+        return "Download cancelled by user."
+    return None
+
+
+# Function to download one manifest with the selected engine, keeping yt-dlp as the
+# fallback when the native engine cannot handle it. alternates are the page's other
+# manifests, used as native HLS mirrors. Returns None on success or an error message.
+def download_manifest(video_url, alternates, output_file, ffmpeg_path, progress_callback, variant_policy, state,
+                      engine, concurrency, trace, shaper, on_mirrors, resume=True):
+    if engine == "native" and get_native_downloader(video_url) is not None:
+        try:
+            return download_with_native(video_url, output_file, ffmpeg_path, progress_callback, variant_policy,
+                                        state, concurrency=concurrency, trace=trace, shaper=shaper,
+                                        mirrors=alternates, on_mirrors=on_mirrors)
+        except Exception as e:
+            # Keep yt-dlp as the fallback when the native engine cannot handle a stream
+            progress_callback(0.5, f"Native download failed ({str(e)}), falling back to yt-dlp...")
+    trace.engine = "ytdlp"
+    return download_with_ytdlp(video_url, output_file, ffmpeg_path, progress_callback, variant_policy, state,
+                               trace=trace, shaper=shaper, resume=resume)
+
+
+# Function to order a page's manifests for its next download: those that delivered
+# segments by measured throughput (or the one that finished the download when no
+# segment stats exist), then untried ones, then the ones that only failed
+def rank_manifests(video_urls, succeeded, mirrors):
+    def score(item):
+        position, video_url = item
+        mirror = mirrors.get(video_url)
+        if mirror is not None and mirror.segments_fetched:
+            return 0, -mirror.throughput, position
+        if video_url == succeeded:
+            return 0, 0.0, position
+        if mirror is None or not mirror.failures:
+            return 1, 0.0, position
+        return 2, 0.0, position
+
+    return [video_url for _, video_url in sorted(enumerate(video_urls), key=score)]
+
+
+# Function to extract and download video.
+# state receives status, progress and the output path as the job runs; the
+# Streamlit page passes st.session_state, other callers a JobState. owner
+# identifies the session for fair sharing of browser and download slots.
+# rate_limit caps this job's download in bytes/s; bandwidth_weight sets its
+# share of the global bandwidth limit relative to other running jobs.
+# With a job_id, progress is also published as events on the event bus and
+# progress_callback may be None.
+def process_video(url, progress_callback, state=None, engine=DEFAULT_DOWNLOAD_ENGINE, variant_policy=None,
+                  hls_concurrency=HLS_CONCURRENCY, output_file=None, owner="default", rate_limit=None,
+                  bandwidth_weight=1.0, job_id=None):
+    if state is None:
+        state = JobState()
+    if job_id is not None:
+        progress_callback = publisher(get_event_bus(), job_id, state, progress_callback)
+    if variant_policy is None:
+        variant_policy = VariantPolicy(DEFAULT_VARIANT_POLICY)
+
+    claimed_output = None
+    trace = JobTrace(url, engine)
+    state.metrics = None
+    state.extraction_path = None
+    state.queue = None
+    state.stage = "extract"
+
+    # Update job state
+    state.download_status = "downloading"
+    state.download_progress = 0.0
+    state.download_output_file = None
+
+    try:
+        # Jobs without a caller-chosen output path share finished files through the output store
+        store_key = None
+        if output_file is None:
+            store_key = content_key(url, variant_policy)
+            with trace.stage("output_store") as stage:
+                stored_file = get_output_store().get(store_key)
+                stage["outcome"] = "hit" if stored_file else "miss"
+            if stored_file:
+                record_extraction_path("output_store")
+                state.extraction_path = "output_store"
+                state.download_output_file = stored_file
+                state.download_progress = 1.0
+                state.download_status = "completed"
+                progress_callback(1.0, "Download complete!")
+                return stored_file, None
+
+        # Use a stable per-URL work path unless the caller chose the output path
+        if output_file is None:
+            output_file = claimed_output = claim_output_file(url, variant_policy)
+        state.download_output_file = output_file
+
+        # FFmpeg path resolved at startup
+        ffmpeg_path = get_toolchain().ffmpeg
+        if not ffmpeg_path:
+            state.download_status = "idle"
+            return None, "FFmpeg not found. Please install FFmpeg and try again."
+
+        # Check if download was cancelled
+        if state.download_status == "cancelled":
+            return None, "Download cancelled by user."
+
+        # Reuse a recent resolution of this page and skip Chrome entirely if it is still valid
+        resolution_cache = get_resolution_cache()
+        with trace.stage("cache_lookup") as stage:
+            video_urls = resolution_cache.get(url)
+            stage["outcome"] = "hit" if video_urls else "miss"
+        if video_urls:
+            extraction_path = "cache"
+            progress_callback(0.3, "Using cached video information...")
+        else:
+            # Try the browserless fast path first and only fall back to Chrome when it finds nothing
+            video_urls = []
+            if FAST_PATH_ENABLED:
+                progress_callback(0.1, "Fetching video information...")
+                with trace.stage("fast_path") as stage:
+                    video_urls = extract_video_urls_fast(url)
+                    stage["outcome"] = "hit" if video_urls else "miss"
+
+            if video_urls:
+                extraction_path = "fast"
+                progress_callback(0.3, "Extracted video information without a browser...")
+            else:
+                extraction_path = "browser"
+                # Browser extractions are rationed across all sessions
+                slot_started = wait_for_slot(get_browser_slots(), owner, state, progress_callback, 0.1, trace)
+                if slot_started is None:
+                    return None, "Download cancelled by user."
+                try:
+                    video_urls, error = extract_video_urls(url, progress_callback, state, trace=trace)
+                finally:
+                    get_browser_slots().release(slot_started)
+                if error:
+                    state.download_status = "idle"
+                    return None, error
+
+            # Check if download was cancelled
+            if state.download_status == "cancelled":
+                return None, "Download cancelled by user."
+
+            if not video_urls:
+                state.download_status = "idle"
+                return None, "No video URLs found. Please check the URL and try again."
+
+            resolution_cache.put(url, video_urls)
+
+        # Track which path resolved the job so the fast-path hit rate can be monitored
+        record_extraction_path(extraction_path)
+        state.extraction_path = extraction_path
+
+        # Download video with the selected engine
+        state.stage = "download"
+        progress_callback(0.4, "Preparing to download...")
+
+        # Check if download was cancelled
+        if state.download_status == "cancelled":
+            return None, "Download cancelled by user."
+
+        # Downloads are rationed across all sessions as well
+        slot_started = wait_for_slot(get_download_slots(), owner, state, progress_callback, 0.4, trace)
+        if slot_started is None:
+            return None, "Download cancelled by user."
+
+        # Per-mirror stats from native HLS downloads, by manifest URL
+        mirror_stats = {}
+
+        def on_mirrors(mirrors):
+            if any(mirror.segments_fetched for mirror in mirrors[1:]):
+                SOURCE_FAILOVERS.inc(kind="mirror")
+            for mirror in mirrors:
+                mirror_stats[mirror.url] = mirror
+            trace.fields["mirrors"] = [mirror.summary() for mirror in mirror_stats.values()]
+
+        # Start with the best ranked manifest and fall over to the others if it fails
+        candidates = video_urls[:MAX_MANIFEST_ATTEMPTS]
+        shaper = get_bandwidth_manager().register(bandwidth_weight, rate_limit,
+                                                  should_stop=lambda: state.download_status == "cancelled")
+        state.shaper = shaper
+        try:
+            for position, video_url in enumerate(candidates):
+                if position:
+                    SOURCE_FAILOVERS.inc(kind="manifest")
+                    progress_callback(max(state.download_progress, 0.5),
+                                      f"Video source failed, trying another ({position + 1} of {len(candidates)})...")
+                alternates = [other for other in video_urls if other != video_url]
+                error = download_manifest(video_url, alternates, output_file, ffmpeg_path, progress_callback,
+                                          variant_policy, state, engine, hls_concurrency, trace, shaper, on_mirrors,
+                                          resume=position == 0)
+                if not error or error == "Download cancelled by user.":
+                    break
+        finally:
+            state.shaper = None
+            shaper.close()
+            get_download_slots().release(slot_started)
+
+        if error == "Download cancelled by user.":
+            return None, error
+
+        # Check if download was successful
+        if error:
+            # The manifest may have gone stale; force a fresh extraction next time
+            resolution_cache.invalidate(url)
+            state.download_status = "idle"
+            return None, error
+
+        # Remember which source served best so the next download of this page starts there
+        ranked = rank_manifests(video_urls, video_url, mirror_stats)
+        if ranked != video_urls:
+            resolution_cache.put(url, ranked)
+
+        if not holds_lease(state):
+            return None, LEASE_LOST_MESSAGE
+
+        # Move the moov atom up front so playback starts at once, then check the file with ffprobe
+        state.stage = "postprocess"
+        progress_callback(0.9, "Preparing video for playback...")
+        error = finalize_output(output_file, ffmpeg_path, get_toolchain().ffprobe, trace=trace)
+        if error:
+            state.download_status = "idle"
+            return None, error
+
+        # Publish the file to the output store and drop the now empty work directory
+        if not holds_lease(state):
+            return None, LEASE_LOST_MESSAGE
+        if store_key is not None:
+            output_file = get_output_store().put(store_key, output_file)
+            state.download_output_file = output_file
+            shutil.rmtree(os.path.dirname(claimed_output), ignore_errors=True)
+
+        # Complete
+        state.download_status = "completed"
+        progress_callback(1.0, "Download complete!")
+        return output_file, None
+
+    except Exception as e:
+        state.download_status = "idle"
+        return None, f"Error: {str(e)}"
+
+    finally:
+        if claimed_output is not None:
+            release_output_file(claimed_output)
+        # Per-stage timings feed the metrics endpoint and the JSON job log
+        outcome = {"completed": "completed", "cancelled": "cancelled"}.get(state.download_status, "failed")
+        state.metrics = trace.finish(outcome, extraction_path=state.extraction_path)
+        state.stage = None
+        if job_id is not None:
+            get_event_bus().publish(ProgressEvent(job_id, outcome, state.download_progress, outcome, state.transfer,
+                                                  final=True))
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import struct
+import subprocess
+
+
+# Post-processing settings, overridable through the environment
+# Outputs shorter than this many seconds are rejected as broken
+MIN_OUTPUT_DURATION = float(os.getenv("MIN_OUTPUT_DURATION", "1"))
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "60"))
+# Size check used when ffprobe is not installed
+MIN_OUTPUT_BYTES = 10000
+# How many top-level MP4 boxes to walk before giving up on finding moov
+MAX_BOXES = 64
+
+
+class PostProcessError(Exception):
+    pass
+
+
+# Function to list the top-level MP4 box types of a file in order; empty for non-MP4 files
+def read_top_level_boxes(path):
+    boxes = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as handle:
+        offset = 0
+        while offset + 8 <= size and len(boxes) < MAX_BOXES:
+            handle.seek(offset)
+            header = handle.read(16)
+            box_size, box_type = struct.unpack(">I4s", header[:8])
+            if box_size == 1 and len(header) == 16:
+                box_size = struct.unpack(">Q", header[8:16])[0]
+            elif box_size == 0:
+                box_size = size - offset
+            if box_size < 8 or not box_type.isalnum():
+                break
+            boxes.append(box_type.decode("ascii"))
+            offset += box_size
+    return boxes
+
+
+# Function to tell whether a file must be remuxed before it can play while still downloading:
+# anything that is not an MP4 (MPEG-TS from HLS) or an MP4 whose moov comes after the media data
+def needs_faststart(path):
+    boxes = read_top_level_boxes(path)
+    if not boxes or boxes[0] != "ftyp" or "moov" not in boxes:
+        return True
+    return "mdat" in boxes and boxes.index("moov") > boxes.index("mdat")
+
+
+# Function to rewrite a file as MP4 with the moov atom up front, copying the streams without re-encoding
+def faststart_remux(ffmpeg_path, path):
+    tmp_path = path + ".faststart.mp4"
+    command = [ffmpeg_path, "-y", "-loglevel", "error", "-i", path,
+               "-map", "0:v?", "-map", "0:a?", "-c", "copy"]
+    # ADTS AAC from transport streams needs its headers rewritten for MP4
+    if read_top_level_boxes(path)[:1] != ["ftyp"]:
+        command += ["-bsf:a", "aac_adtstoasc"]
+    command += ["-movflags", "+faststart", "-f", "mp4", tmp_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise PostProcessError(f"ffmpeg remux failed: {result.stderr.strip()[-500:]}")
+    os.replace(tmp_path, path)
+
+
+# Function to read the container and stream information of a media file with ffprobe
+def probe_media(ffprobe_path, path):
+    try:
+        result = subprocess.run(
+            [ffprobe_path, "-v", "error", "-show_entries",
+             "format=format_name,duration:stream=codec_type,codec_name", "-of", "json", path],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise PostProcessError(f"ffprobe failed: {e}")
+    if result.returncode != 0:
+        raise PostProcessError(f"ffprobe failed: {result.stderr.strip()[-500:]}")
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        raise PostProcessError("ffprobe returned unreadable output")
+
+
+# Function to check that a probed file holds a playable video; returns its duration in seconds
+def validate_probe(info):
+    streams = info.get("streams", [])
+    if not any(stream.get("codec_type") == "video" for stream in streams):
+        raise PostProcessError("no video stream")
+    try:
+        duration = float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        raise PostProcessError("unknown duration")
+    if duration < MIN_OUTPUT_DURATION:
+        raise PostProcessError(f"only {duration:.1f}s long")
+    return duration
+
+
+# Function to make a finished download play back immediately and check that it is a real video.
+# trace, if given, receives faststart and probe timings. Returns None on success or an error message.
+def finalize_output(path, ffmpeg_path, ffprobe_path=None, trace=None):
+    def record(stage, started, outcome="ok", **fields):
+        if trace is not None:
+            trace.record(stage, time.monotonic() - started, outcome, **fields)
+
+    if not os.path.exists(path):
+        return "Downloaded file is missing."
+
+    started = time.monotonic()
+    if needs_faststart(path):
+        try:
+            faststart_remux(ffmpeg_path, path)
+        except PostProcessError as e:
+            record("faststart", started, "error")
+            return f"Could not prepare the video for playback: {e}"
+        record("faststart", started)
+    else:
+        record("faststart", started, "skipped")
+
+    started = time.monotonic()
+    if not ffprobe_path:
+        # Without ffprobe only the old size check is possible
+        record("probe", started, "skipped")
+        if os.path.getsize(path) < MIN_OUTPUT_BYTES:
+            return "Downloaded file is invalid or too small."
+        return None
+    try:
+        duration = validate_probe(probe_media(ffprobe_path, path))
+    except PostProcessError as e:
+        record("probe", started, "error")
+        return f"Downloaded file is invalid ({e})."
+    record("probe", started, duration=round(duration, 3))
+    return None
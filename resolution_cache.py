@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import base64
+import calendar
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qs
+
+import requests
+
+
+# Cache settings, overridable through the environment
+CACHE_DIR = os.getenv("MXSCRAPER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mxscraper"))
+DEFAULT_DB_PATH = os.getenv("RESOLUTION_CACHE_PATH", os.path.join(CACHE_DIR, "resolutions.sqlite3"))
+DEFAULT_TTL = float(os.getenv("RESOLUTION_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESOLUTION_CACHE_MAX_ENTRIES", "500"))
+PROBE_TIMEOUT = float(os.getenv("RESOLUTION_CACHE_PROBE_TIMEOUT", "3"))
+# Signed URLs are treated as expired this many seconds before their real expiry
+EXPIRY_MARGIN = 60
+
+# Query parameters carrying an absolute expiry timestamp on common CDNs
+EXPIRY_PARAMS = ("expires", "expiry", "exp", "e", "x-expires", "validto")
+# Akamai-style tokens embed "exp=<ts>" inside a single parameter
+TOKEN_EXPIRY_PATTERN = re.compile(r'(?:^|[~&])exp=(\d{9,})')
+
+
+# Function to normalize an MX Player page URL into a cache key
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    path = re.sub(r'/+$', '', parts.path) or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, "", ""))
+
+
+# Function to find the expiry timestamp embedded in a signed manifest URL, if any
+def signed_url_expiry(url):
+    query = parse_qs(urlsplit(url).query)
+    lowered = {key.lower(): values for key, values in query.items()}
+    candidates = []
+
+    for name in EXPIRY_PARAMS:
+        for value in lowered.get(name, []):
+            if value.isdigit() and len(value) >= 9:
+                candidates.append(int(value))
+
+    # AWS SigV4: X-Amz-Date (YYYYMMDDTHHMMSSZ) + X-Amz-Expires (seconds)
+    if "x-amz-date" in lowered and "x-amz-expires" in lowered:
+        try:
+            signed_at = calendar.timegm(time.strptime(lowered["x-amz-date"][0], "%Y%m%dT%H%M%SZ"))
+            candidates.append(int(signed_at + int(lowered["x-amz-expires"][0])))
+        except (ValueError, OverflowError):
+            pass
+
+    # Akamai hdnts/hdnea tokens
+    for values in lowered.values():
+        for value in values:
+            match = TOKEN_EXPIRY_PATTERN.search(value)
+            if match:
+                candidates.append(int(match.group(1)))
+
+    # CloudFront custom policy: base64 JSON with DateLessThan
+    for value in lowered.get("policy", []):
+        try:
+            padded = value.replace("-", "+").replace("_", "=").replace("~", "/")
+            policy = json.loads(base64.b64decode(padded + "=" * (-len(padded) % 4)))
+            for statement in policy.get("Statement", []):
+                epoch = statement.get("Condition", {}).get("DateLessThan", {}).get("AWS:EpochTime")
+                if epoch:
+                    candidates.append(int(epoch))
+        except Exception:
+            pass
+
+    return min(candidates) if candidates else None
+
+
+# Function to check that a cached manifest is still being served
+def probe_manifest(url, timeout=PROBE_TIMEOUT):
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+        if response.status_code in (405, 501):
+            # Some CDNs reject HEAD; fall back to a tiny ranged GET
+            response = requests.get(url, timeout=timeout, headers={"Range": "bytes=0-0"}, stream=True)
+            response.close()
+        return response.status_code < 400
+    except requests.RequestException:
+        return False
+
+
+class ResolutionCache:
+    # Persistent map from a normalized MX Player page URL to its manifest URLs.
+    #
+    # Entries expire at the earliest signed-URL expiry of their manifests (or
+    # after the default TTL), the least recently used entries are evicted past
+    # max_entries, and get() probes the top manifest before returning a hit.
+    def __init__(self, path=DEFAULT_DB_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 probe=probe_manifest):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.probe = probe
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS resolutions ("
+                " page_url TEXT PRIMARY KEY,"
+                " manifest_urls TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+
+    # Function to compute when a set of manifest URLs stops being reusable
+    def _expiry_for(self, video_urls, now):
+        expires_at = now + self.ttl
+        for url in video_urls:
+            signed_expiry = signed_url_expiry(url)
+            if signed_expiry is not None:
+                expires_at = min(expires_at, signed_expiry - EXPIRY_MARGIN)
+        return expires_at
+
+    # Return the cached manifest URLs for a page, or None on a miss
+    def get(self, page_url):
+        key = normalize_url(page_url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT manifest_urls, expires_at FROM resolutions WHERE page_url = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        video_urls, expires_at = json.loads(row[0]), row[1]
+        if expires_at <= now or not video_urls or (self.probe and not self.probe(video_urls[0])):
+            self.invalidate(page_url)
+            return None
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE resolutions SET last_used = ? WHERE page_url = ?", (now, key))
+        return video_urls
+
+    # Store the manifest URLs resolved for a page and evict the oldest entries
+    def put(self, page_url, video_urls):
+        if not video_urls:
+            return
+        now = time.time()
+        expires_at = self._expiry_for(video_urls, now)
+        if expires_at <= now:
+            return
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolutions (page_url, manifest_urls, expires_at, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                (normalize_url(page_url), json.dumps(list(video_urls)), expires_at, now)
+            )
+            self._conn.execute("DELETE FROM resolutions WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM resolutions WHERE page_url NOT IN"
+                " (SELECT page_url FROM resolutions ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def invalidate(self, page_url):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM resolutions WHERE page_url = ?", (normalize_url(page_url),))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
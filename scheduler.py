@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from collections import deque
+
+from driver_pool import DEFAULT_POOL_SIZE
+
+
+# Scheduler settings, overridable through the environment
+# Concurrent browser extractions; defaults to the Chrome pool size so jobs queue here, not in the pool
+BROWSER_SLOTS = int(os.getenv("BROWSER_SLOTS", str(DEFAULT_POOL_SIZE)))
+# Concurrent downloads (native HLS or yt-dlp)
+DOWNLOAD_SLOTS = int(os.getenv("DOWNLOAD_SLOTS", "3"))
+# How often a waiting job re-checks for cancellation and refreshes its queue position
+WAIT_POLL_INTERVAL = 0.5
+
+
+class FairSlots:
+    # Counting semaphore that hands free slots to waiting owners round-robin.
+    #
+    # Each owner (a browser session) has its own FIFO of waiting tickets and
+    # owners take turns, so one session queueing ten jobs cannot starve
+    # another session's single job. Hold times are tracked to estimate how
+    # long a waiting ticket still has to wait; clock can be replaced in tests.
+    def __init__(self, name, limit, clock=time.monotonic):
+        self.name = name
+        self.limit = max(1, limit)
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._turns = deque()
+        self._in_use = 0
+        self._avg_hold = None
+
+    # Waiting tickets in the order they will be served: one per owner per round
+    def _fair_order(self):
+        order = []
+        queues = [self._queues[owner] for owner in self._turns]
+        for round_index in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[round_index] for queue in queues if round_index < len(queue))
+        return order
+
+    def _remove(self, owner, ticket):
+        queue = self._queues[owner]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[owner]
+            self._turns.remove(owner)
+
+    # Estimated seconds until the ticket at a 1-based position gets a slot
+    def _eta(self, position):
+        if self._avg_hold is None:
+            return None
+        rounds = (position - 1) // self.limit + (1 if self._in_use >= self.limit else 0)
+        return rounds * self._avg_hold
+
+    # Wait for a slot. on_wait(position, eta) is called while queued; returns
+    # the slot start time, or None if should_stop() became true while waiting.
+    def acquire(self, owner, should_stop=None, on_wait=None):
+        ticket = object()
+        with self._cond:
+            if owner not in self._queues:
+                self._queues[owner] = deque()
+                self._turns.append(owner)
+            self._queues[owner].append(ticket)
+
+            while True:
+                if self._in_use < self.limit and self._queues[self._turns[0]][0] is ticket:
+                    self._remove(owner, ticket)
+                    # Served owners go to the back of the rotation
+                    if owner in self._queues:
+                        self._turns.remove(owner)
+                        self._turns.append(owner)
+                    self._in_use += 1
+                    self._cond.notify_all()
+                    return self.clock()
+                if should_stop is not None and should_stop():
+                    self._remove(owner, ticket)
+                    self._cond.notify_all()
+                    return None
+                if on_wait is not None:
+                    position = self._fair_order().index(ticket) + 1
+                    on_wait(position, self._eta(position))
+                self._cond.wait(WAIT_POLL_INTERVAL)
+
+    def release(self, started=None):
+        with self._cond:
+            self._in_use -= 1
+            if started is not None:
+                held = self.clock() - started
+                self._avg_hold = held if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"name": self.name, "limit": self.limit, "in_use": self._in_use,
+                    "waiting": sum(len(queue) for queue in self._queues.values()),
+                    "avg_hold_s": self._avg_hold}
+
+
+_browser_slots = None
+_download_slots = None
+_slots_lock = threading.Lock()
+
+
+# Process-wide browser extraction slots shared by every job; limit only applies to the first call
+def get_browser_slots(limit=None):
+    global _browser_slots
+    with _slots_lock:
+        if _browser_slots is None:
+            _browser_slots = FairSlots("browser", limit or BROWSER_SLOTS)
+        return _browser_slots
+
+
+# Process-wide download slots shared by every job
+def get_download_slots():
+    global _download_slots
+    with _slots_lock:
+        if _download_slots is None:
+            _download_slots = FairSlots("download", DOWNLOAD_SLOTS)
+        return _download_slots
@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class FakeClock:
+    # Simulated monotonic clock: sleep() advances it instead of waiting, and
+    # on_sleep, if set, runs after each sleep with the new time
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.on_sleep = None
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep(self.now)
+
+
+class Origin:
+    # In-memory web server for download tests: routes maps a path to its body,
+    # paths in failing answer 503, and every request path is logged
+    def __init__(self):
+        self.routes = {}
+        self.failing = set()
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+        self.server.origin = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    # Serve the fixture files under directory at prefix, e.g. fixtures/hls at /hls
+    def add_fixtures(self, directory, prefix):
+        root = os.path.join(FIXTURES, directory)
+        for folder, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(folder, name)
+                with open(path, "rb") as handle:
+                    self.routes[prefix + "/" + os.path.relpath(path, root).replace(os.sep, "/")] = handle.read()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        origin = self.server.origin
+        path = self.path.split("?", 1)[0]
+        origin.requests.append(path)
+        body = origin.routes.get(path)
+        if path in origin.failing or body is None:
+            self.send_error(503 if path in origin.failing else 404)
+            return
+        status = 200
+        byte_range = self.headers.get("Range")
+        if byte_range:
+            start, end = byte_range.split("=", 1)[1].split("-")
+            body = body[int(start):int(end) + 1]
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def origin_server():
+    origin = Origin()
+    yield origin
+    origin.close()
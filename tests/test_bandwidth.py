@@ -0,0 +1,44 @@
+import pytest
+
+from bandwidth import MAX_SLEEP, BandwidthManager, TokenBucket
+
+MB = 1024 * 1024
+
+
+def test_token_bucket_holds_its_rate(clock):
+    bucket = TokenBucket(2 * MB, clock=clock, sleep=clock.sleep)
+    for _ in range(20):
+        bucket.consume(MB // 2)
+    # The first second's worth comes from the initial burst; the other 8 MB take 4 s
+    assert clock.now == pytest.approx(4.0, abs=1e-6)
+    assert max(clock.sleeps) <= MAX_SLEEP
+
+
+def test_global_limit_is_split_by_weight(clock):
+    manager = BandwidthManager(global_rate=3 * MB, job_rate=0, clock=clock, sleep=clock.sleep)
+    light, heavy = manager.register(weight=1), manager.register(weight=2)
+    assert (light.rate, heavy.rate) == (1 * MB, 2 * MB)
+
+    # The per-job limit and a job's own limit cap its share
+    manager.set_limits(job_rate=1.5 * MB)
+    assert (light.rate, heavy.rate) == (1 * MB, 1.5 * MB)
+    light.set_rate_limit(0.5 * MB)
+    assert light.rate == 0.5 * MB
+
+    # A finished job's share goes to the others
+    light.close()
+    manager.set_limits(job_rate=0)
+    assert heavy.rate == 3 * MB
+
+
+def test_rate_limit_change_reaches_a_blocked_download(clock):
+    manager = BandwidthManager(global_rate=0, job_rate=0, clock=clock, sleep=clock.sleep)
+    shaper = manager.register(rate_limit=1 * MB)
+    shaper.throttle(1 * MB)
+    assert clock.now == pytest.approx(1.0, abs=1e-6)
+
+    # Raised while the next read is paying off its debt: 0.25 s at 1 MB/s, the remaining 3.75 MB at 4 MB/s
+    clock.on_sleep = lambda now: shaper.set_rate_limit(4 * MB)
+    shaper.throttle(4 * MB)
+    assert clock.now == pytest.approx(1.0 + 0.25 + 3.75 / 4, abs=1e-6)
+    assert shaper.actual_rate == pytest.approx(5 * MB / clock.now)
@@ -0,0 +1,26 @@
+import os
+
+from blocking import CATEGORY_PATTERNS, DEFAULT_BLOCK_POLICY, BlockPolicy, is_protected, pattern_to_regex
+from conftest import FIXTURES
+
+
+# Function to read the MX request URLs extraction depends on
+def mx_requests():
+    with open(os.path.join(FIXTURES, "blocking", "mx_requests.txt"), encoding="utf-8") as handle:
+        return [line.strip() for line in handle if line.strip() and not line.startswith("#")]
+
+
+def test_default_patterns_never_block_mx_requests():
+    for policy in (DEFAULT_BLOCK_POLICY, BlockPolicy()):
+        blocked = [(pattern, url) for pattern in policy.patterns for url in mx_requests()
+                   if pattern_to_regex(pattern).match(url)]
+        assert blocked == []
+    assert all(is_protected(url) for url in mx_requests())
+
+
+def test_patterns_that_would_block_streams_are_dropped():
+    policy = BlockPolicy(["images"], extra_patterns=["*.ts", "*llvod.mxplay.com*", "*/key", "*api.mxplayer.in*",
+                                                     "*.m3u8?*", "*ads.example.net*"])
+    assert policy.patterns == CATEGORY_PATTERNS["images"] + ["*ads.example.net*"]
+    assert policy.categorize("https://llvod.mxplay.com/video/ab/cd/hls/thumbnail.png") == "images"
+    assert policy.categorize("https://ads.example.net/video/ab/cd/hls/0.ts") is None
@@ -0,0 +1,13 @@
+from cli import dedupe_urls, output_names
+
+
+def test_repeated_urls_are_scheduled_once():
+    urls = ["https://www.mxplayer.in/movie/watch-a-online-1", "https://www.mxplayer.in/movie/watch-b-online-2",
+            "https://www.mxplayer.in/movie/watch-a-online-1/"]
+    assert dedupe_urls(urls) == (urls[:2], 1)
+
+
+def test_colliding_slugs_get_unique_names():
+    urls = ["https://www.mxplayer.in/show/a/episode-1", "https://www.mxplayer.in/show/b/episode-1",
+            "https://www.mxplayer.in/show/b/episode-2"]
+    assert output_names(urls) == ["episode-1-1.mp4", "episode-1-2.mp4", "episode-2.mp4"]
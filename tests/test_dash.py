@@ -0,0 +1,44 @@
+import os
+
+from conftest import FIXTURES
+from dash import parse_mpd, representation_segments
+
+
+def load_mpd(name, url="https://cdn.example.net/vod/title/manifest.mpd"):
+    with open(os.path.join(FIXTURES, "dash", name), encoding="utf-8") as handle:
+        return {item["id"]: item for item in parse_mpd(handle.read(), url)}
+
+
+def segment_urls(representation):
+    init_segment, segments = representation_segments(*representation["element"])
+    return init_segment.uri, [segment.uri for segment in segments]
+
+
+def test_number_template_with_nested_base_urls():
+    representations = load_mpd("number.mpd")
+    assert {name: item["type"] for name, item in representations.items()} == \
+        {"720p": "video", "1080p": "video", "aac": "audio"}
+
+    init, urls = segment_urls(representations["720p"])
+    assert init == "https://cdn.example.net/vod/title/video/720p/init.mp4"
+    # 9.5 s of 4 s segments, zero-padded numbers from startNumber
+    assert urls == [f"https://cdn.example.net/vod/title/video/720p/0000{number}.m4s" for number in (1, 2, 3)]
+
+    # An absolute-path BaseURL on the representation replaces the inherited path
+    init, urls = segment_urls(representations["1080p"])
+    assert init == "https://cdn.example.net/hd/1080p/init.mp4"
+    assert urls[0] == "https://cdn.example.net/hd/1080p/00001.m4s"
+
+    init, urls = segment_urls(representations["aac"])
+    assert init == "https://cdn.example.net/vod/title/audio/init-128000.mp4"
+    assert urls == [f"https://cdn.example.net/vod/title/audio/{number}.m4s" for number in (1, 2, 3)]
+
+
+def test_time_template_with_open_ended_repeats():
+    representation = load_mpd("timeline.mpd")["v"]
+    init_segment, segments = representation_segments(*representation["element"])
+    assert init_segment.uri == "https://cdn.example.net/vod/title/v/init.mp4"
+    # r="-1" repeats up to the next entry's t, and the last one up to the end of the period
+    assert [int(segment.uri.rsplit("/", 1)[1][:-len(".m4s")]) for segment in segments] == \
+        [0, 180000, 360000, 630000, 900000, 1080000, 1260000, 1440000, 1620000]
+    assert sum(segment.duration for segment in segments) == 20.0
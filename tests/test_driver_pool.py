@@ -0,0 +1,59 @@
+import pytest
+
+from driver_pool import ChromeDriverPool
+
+
+class FakeDriver:
+    # Records CDP commands; tabs maps window handles to the page each one shows
+    def __init__(self, tabs, failing_origins=()):
+        self.tabs = dict(tabs)
+        self.failing_origins = set(failing_origins)
+        self.commands = []
+        self.current = next(iter(self.tabs))
+        self.switch_to = self
+
+    @property
+    def window_handles(self):
+        return list(self.tabs)
+
+    @property
+    def current_url(self):
+        return self.tabs[self.current]
+
+    def window(self, handle):
+        self.current = handle
+
+    def close(self):
+        del self.tabs[self.current]
+
+    def get(self, url):
+        self.tabs[self.current] = url
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Storage.clearDataForOrigin" and params["origin"] in self.failing_origins:
+            raise Exception("No origin")
+        self.commands.append((command, params.get("origin")))
+        return {}
+
+    def execute_script(self, script):
+        return 1
+
+    def get_log(self, kind):
+        return []
+
+
+def test_reset_clears_storage_per_origin(monkeypatch):
+    monkeypatch.setattr("driver_pool.CLEAR_STORAGE_ORIGINS", "https://www.mxplayer.in")
+    driver = FakeDriver({"main": "https://www.mxplayer.in/show/a", "tab": "https://ads.example.net/frame?x=1",
+                         "blank": "about:blank"}, failing_origins={"https://ads.example.net"})
+    pool = ChromeDriverPool(lambda: driver, size=1, prewarm=False)
+    with pytest.warns(RuntimeWarning, match="ads.example.net"):
+        pool.release(pool.acquire())
+
+    assert driver.tabs == {"main": "about:blank"}
+    assert driver.commands == [("Network.clearBrowserCookies", None),
+                               ("Storage.clearDataForOrigin", "https://www.mxplayer.in")]
+    # The failed clear is reported and the driver stays in the pool
+    assert pool.stats()["idle"] == 1
+    pool.close()
+
@@ -0,0 +1,41 @@
+import threading
+import time
+
+from events import EventBus, ProgressEvent
+
+
+def event(message, final=False):
+    return ProgressEvent("job", "download", 0.5, message, final=final)
+
+
+def test_final_event_drops_the_pending_one():
+    bus, received = EventBus(), []
+    bus.subscribe(lambda event: received.append(event.message), max_rate=10)
+    for message in ("first", "coalesced"):
+        bus.publish(event(message))
+    bus.publish(event("done", final=True))
+    time.sleep(0.3)
+    assert received == ["first", "done"]
+
+
+def test_final_event_waits_for_a_delivery_in_flight():
+    bus, received = EventBus(), []
+    delivering, gate = threading.Event(), threading.Event()
+
+    def callback(event):
+        if event.message == "coalesced":
+            delivering.set()
+            gate.wait(2)
+        received.append(event.message)
+
+    bus.subscribe(callback, max_rate=10)
+    bus.publish(event("first"))
+    bus.publish(event("coalesced"))
+    # The flusher is now handing the coalesced event to a slow subscriber
+    assert delivering.wait(2)
+    final = threading.Thread(target=bus.publish, args=(event("done", final=True),))
+    final.start()
+    time.sleep(0.1)
+    gate.set()
+    final.join(2)
+    assert received == ["first", "coalesced", "done"]
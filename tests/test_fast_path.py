@@ -0,0 +1,64 @@
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fast_path
+from fast_path import extract_video_urls_fast
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    # Serves saved files by name, the page without embedded data for any /show/ page
+    # and the saved API payload for any /v1/ request
+    def do_GET(self):
+        if self.path.startswith("/show/"):
+            self.path = "/episode_no_data.html"
+        elif self.path.startswith("/v1/"):
+            self.path = "/detail_api.json"
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(FixtureHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_manifests_from_next_data(origin, monkeypatch):
+    monkeypatch.setattr(fast_path, "API_URL_TEMPLATE", "")
+    urls = extract_video_urls_fast(f"{origin}/episode_next_data.html")
+    assert sorted(urls) == [
+        "https://cdn.example.com/video/ab/cd/manifest.mpd",
+        "https://llvod.mxplay.com/video/ab/cd/index.m3u8",
+        "https://llvod.mxplay.com/video/ab/cd/master.m3u8",
+    ]
+    # HLS master playlists rank first
+    assert urls[0] == "https://llvod.mxplay.com/video/ab/cd/master.m3u8"
+
+
+def test_api_fallback_when_page_has_no_data(origin, monkeypatch):
+    monkeypatch.setattr(fast_path, "API_URL_TEMPLATE", origin + "/v1/web/detail/video?type={type}&id={id}")
+    page = f"{origin}/show/watch-example/episode-2-online-fedcba9876543210fedcba9876543210"
+    assert extract_video_urls_fast(page) == ["https://llvod.mxplay.com/video/ef/01/master.m3u8?token=abc"]
+
+
+def test_api_url_derived_from_page_url():
+    url = fast_path.get_api_url("https://www.mxplayer.in/movie/watch-example-fedcba9876543210fedcba9876543210")
+    assert url.endswith("type=movie&id=fedcba9876543210fedcba9876543210")
+
+
+def test_no_manifests(origin, monkeypatch):
+    monkeypatch.setattr(fast_path, "API_URL_TEMPLATE", "")
+    assert extract_video_urls_fast(f"{origin}/missing.html") == []
+    assert extract_video_urls_fast(f"{origin}/episode_no_data.html") == []
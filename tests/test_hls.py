@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+import hls
+from conftest import FIXTURES
+from hls import DownloadCancelled, HLSDownloader, HLSError, parse_master_playlist, parse_media_playlist
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, "hls", name), encoding="utf-8") as handle:
+        return handle.read()
+
+
+# Serve a rendition's segments under prefix; every host serves the same bytes for a rendition
+def add_segments(origin, prefix, count=4):
+    rendition = prefix.rsplit("/", 1)[1]
+    for index in range(count):
+        origin.routes[f"{prefix}/seg{index}.ts"] = f"{rendition}:{index};".encode() * 100
+
+
+@pytest.fixture
+def renditions(origin_server, monkeypatch):
+    monkeypatch.setattr(hls, "SEGMENT_RETRIES", 0)
+    origin_server.add_fixtures("hls", "/hls")
+    origin_server.add_fixtures("hls", "/mirror/hls")
+    for prefix in ("/hls/1080p", "/hls/720p", "/mirror/hls/1080p"):
+        add_segments(origin_server, prefix)
+    return origin_server
+
+
+def test_master_playlist_lists_variants_with_absolute_urls():
+    variants = parse_master_playlist(read_fixture("master.m3u8"), "https://cdn.example.net/v/hls/master.m3u8")
+    assert [(variant["url"], variant["bandwidth"], variant["height"]) for variant in variants] == [
+        ("https://cdn.example.net/v/hls/720p/index.m3u8", 1400000, 720),
+        ("https://cdn.example.net/v/hls/1080p/index.m3u8", 4500000, 1080),
+    ]
+
+
+def test_media_playlist_keys_and_byte_ranges():
+    init_segment, segments = parse_media_playlist(read_fixture("encrypted.m3u8"),
+                                                  "https://cdn.example.net/v/hls/index.m3u8")
+    assert (init_segment.uri, init_segment.byterange) == ("https://cdn.example.net/v/hls/init.mp4", (0, 719))
+    assert [segment.duration for segment in segments] == [4.0, 4.0, 3.5, 2.0]
+    # A byte range without an offset continues where the previous one ended
+    assert [segment.byterange for segment in segments] == [(720, 1719), (1720, 3219), (3220, 4019), None]
+    assert [segment.key for segment in segments] == ["https://cdn.example.net/v/keys/k1.key"] * 2 + \
+        ["https://keys.example.net/k2.key", None]
+    # An explicit IV applies to every segment under its key; otherwise the media sequence number is the IV
+    assert segments[0].iv == segments[1].iv == bytes(range(16))
+    assert segments[2].iv == (7 + 2).to_bytes(16, "big")
+    assert (segments[3].uri, segments[3].iv) == ("https://cdn.example.net/v/hls/tail.mp4?token=abc", None)
+
+
+def test_media_playlist_rejects_unsupported_encryption():
+    with pytest.raises(HLSError):
+        parse_media_playlist("#EXTM3U\n#EXT-X-KEY:METHOD=SAMPLE-AES,URI=\"k\"\n#EXTINF:4,\n0.ts\n", "https://a/")
+
+
+def test_mirror_with_another_rendition_is_rejected(renditions, tmp_path):
+    # The 720p playlist is cut on the same boundaries as the 1080p one the master selects
+    renditions.failing.add("/hls/1080p/seg1.ts")
+    downloader = HLSDownloader(f"{renditions.url}/hls/master.m3u8", str(tmp_path / "out.ts"),
+                               concurrency=1, mirrors=[f"{renditions.url}/hls/720p/index.m3u8"])
+    with pytest.raises(HLSError):
+        downloader.download()
+    assert downloader.mirrors[1].usable is False
+    assert not any(path.startswith("/hls/720p/seg") for path in renditions.requests)
+
+
+def test_mirror_with_same_rendition_takes_over(renditions, tmp_path):
+    renditions.failing.add("/hls/1080p/seg1.ts")
+    output = tmp_path / "out.ts"
+    downloader = HLSDownloader(f"{renditions.url}/hls/master.m3u8", str(output),
+                               concurrency=1, mirrors=[f"{renditions.url}/mirror/hls/master.m3u8"])
+    downloader.download()
+    assert output.read_bytes() == b"".join(renditions.routes[f"/hls/1080p/seg{index}.ts"] for index in range(4))
+    assert downloader.mirrors[1].segments_fetched == 3
+
+
+def test_fenced_download_stops_writing(renditions, tmp_path):
+    output = tmp_path / "out.ts"
+    checkpoint = tmp_path / "out.ts.checkpoint.json"
+    snapshot = {}
+
+    # The lease is lost once the first segment is on disk
+    def fence():
+        if output.exists() and output.stat().st_size:
+            snapshot.setdefault("files", (output.read_bytes(), checkpoint.read_bytes()))
+            return False
+        return True
+
+    downloader = HLSDownloader(f"{renditions.url}/hls/1080p/index.m3u8", str(output), concurrency=1, fence=fence)
+    with pytest.raises(DownloadCancelled):
+        downloader.download()
+    assert (output.read_bytes(), checkpoint.read_bytes()) == snapshot["files"]
+
+
+def test_interrupted_download_resumes_from_checkpoint(renditions, tmp_path):
+    output = tmp_path / "out.ts"
+    playlist = f"{renditions.url}/hls/1080p/index.m3u8"
+    segments = [renditions.routes[f"/hls/1080p/seg{index}.ts"] for index in range(4)]
+
+    # Stop once two segments are on disk
+    stop = lambda: output.exists() and output.stat().st_size >= len(segments[0]) + len(segments[1])
+    with pytest.raises(DownloadCancelled):
+        HLSDownloader(playlist, str(output), concurrency=1, should_stop=stop).download()
+    assert (tmp_path / "out.ts.checkpoint.json").exists()
+
+    del renditions.requests[:]
+    HLSDownloader(playlist, str(output), concurrency=1).download()
+    assert output.read_bytes() == b"".join(segments)
+    assert renditions.requests == ["/hls/1080p/index.m3u8", "/hls/1080p/seg2.ts", "/hls/1080p/seg3.ts"]
+    assert not (tmp_path / "out.ts.checkpoint.json").exists()
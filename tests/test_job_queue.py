@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue, LeaseLost
+from worker import RunningJob, Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.2)
+    yield queue
+    queue.close()
+
+
+# Let a claimed job's lease run out and have it claimed again, as after a stalled worker
+def reclaim(queue, worker):
+    time.sleep(0.3)
+    return queue.claim(worker)
+
+
+def test_stale_attempt_is_fenced_off(queue):
+    queue.enqueue("owner", "https://www.mxplayer.in/show/a", {})
+    stale = queue.claim("worker-1")
+    # The same worker process may pick its own expired job up again in another slot
+    current = reclaim(queue, "worker-1")
+    assert current["attempt"] == stale["attempt"] + 1
+
+    assert not queue.holds(stale["id"], "worker-1", stale["attempt"])
+    assert queue.holds(current["id"], "worker-1", current["attempt"])
+    with pytest.raises(LeaseLost):
+        queue.heartbeat(stale["id"], "worker-1", stale["attempt"], "running", 0.5, "", {})
+    assert not queue.finish(stale["id"], "worker-1", stale["attempt"], "done", "Download complete!")
+    assert queue.finish(current["id"], "worker-1", current["attempt"], "done", "Download complete!")
+
+
+def test_worker_fence_stops_writes_after_takeover(queue):
+    queue.enqueue("owner", "https://www.mxplayer.in/show/a", {})
+    worker = Worker(queue, 1, "worker-1")
+    running = RunningJob(queue.claim("worker-1"))
+    worker._extend_deadline(running, time.monotonic())
+    assert worker._fence(running)
+
+    # Past the local deadline the fence fails without asking the queue
+    time.sleep(0.3)
+    assert not worker._fence(running)
+
+    # Within it, the queue check catches a takeover the heartbeat has not noticed yet
+    queue.claim("worker-2")
+    running.lease_deadline, running.fence_checked = time.monotonic() + 60, 0.0
+    assert not worker._fence(running)
+    assert running.lease_lost
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import jobs
+from job_queue import JobQueue
+from jobs import QueuedJobManager
+from output_store import OutputStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = OutputStore(str(tmp_path / "store"), max_bytes=0)
+    monkeypatch.setattr(jobs, "get_output_store", lambda: store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = QueuedJobManager(JobQueue(str(tmp_path / "queue.sqlite3")))
+    yield manager
+    manager.shutdown()
+
+
+# Run a queued job to completion as a worker would
+def finish_job(queue, output_file):
+    job = queue.claim("worker-1")
+    queue.finish(job["id"], "worker-1", job["attempt"], "done", "Download complete!", output_file=output_file)
+    return job["id"]
+
+
+def test_jobs_sharing_a_stored_file_hold_a_reference_each(store, manager, tmp_path):
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video")
+    stored = store.put("ab" * 20, str(source))
+
+    manager.queue.enqueue("owner", "https://www.mxplayer.in/show/a", {})
+    first = finish_job(manager.queue, stored)
+    manager.queue.enqueue("owner", "https://www.mxplayer.in/show/a", {})
+    finish_job(manager.queue, stored)
+    manager.snapshot("owner")
+
+    manager.remove("owner", first)
+    store.evict()
+    assert os.path.exists(stored)
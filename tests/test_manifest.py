@@ -0,0 +1,27 @@
+import json
+
+from manifest import wait_for_manifests
+
+
+class ScriptedLog:
+    # Driver whose performance log yields one scripted batch of responses per poll
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def get_log(self, kind):
+        urls = self.batches.pop(0) if self.batches else []
+        return [{"message": json.dumps({"message": {"method": "Network.responseReceived", "params": {
+            "requestId": url, "type": "XHR",
+            "response": {"url": url, "mimeType": "application/vnd.apple.mpegurl"}}}})} for url in urls]
+
+
+def test_event_mode_collects_alternates_after_the_first_manifest():
+    primary = "https://llvod.mxplay.com/video/ab/cd/hls/master.m3u8"
+    alternate = "https://backup.mxplay.com/video/ab/cd/hls/master.m3u8"
+    driver = ScriptedLog([[], [primary], [], [alternate]])
+    urls = wait_for_manifests(driver, timeout=5, poll_interval=0.01, grace=0.5)
+    assert urls == [primary, alternate]
+
+    # Without a grace window the first manifest ends the wait
+    driver = ScriptedLog([[primary], [alternate]])
+    assert wait_for_manifests(driver, timeout=5, poll_interval=0.01, grace=0) == [primary]
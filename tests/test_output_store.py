@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from hls import VariantPolicy
+from output_store import OutputStore, clean_scratch, content_key
+
+
+@pytest.fixture
+def stores(tmp_path):
+    # A front end and a worker process sharing one store directory
+    front_end = OutputStore(str(tmp_path / "store"), max_bytes=0)
+    worker = OutputStore(str(tmp_path / "store"), max_bytes=0)
+    yield front_end, worker
+    front_end.close()
+    worker.close()
+
+
+def put_file(store, tmp_path, key):
+    source = tmp_path / f"{key}.source"
+    source.write_bytes(b"video")
+    return store.put(key, str(source))
+
+
+def test_eviction_skips_files_referenced_by_another_process(stores, tmp_path):
+    front_end, worker = stores
+    served = put_file(worker, tmp_path, "aa" * 20)
+    front_end.acquire(served)
+
+    # The worker's next put evicts everything over budget except the referenced file
+    put_file(worker, tmp_path, "bb" * 20)
+    assert os.path.exists(served)
+
+    front_end.release(served)
+    worker.evict()
+    assert not os.path.exists(served)
+
+
+def test_lapsed_references_do_not_block_eviction(tmp_path):
+    crashed = OutputStore(str(tmp_path / "store"), max_bytes=0, ttl=-1)
+    stored = put_file(crashed, tmp_path, "cc" * 20)
+    crashed.acquire(stored)
+    crashed.evict()
+    assert not os.path.exists(stored)
+    crashed.close()
+
+
+def test_scratch_cleanup_spares_other_processes_work(stores, tmp_path):
+    front_end, worker = stores
+    scratch = tmp_path / "downloads"
+    running, abandoned = scratch / "running", scratch / "abandoned"
+    running.mkdir(parents=True)
+    abandoned.mkdir()
+    worker.lease_scratch(str(running / "mxplayer_video.mp4"))
+
+    assert clean_scratch(str(scratch), max_age=-1, in_use=front_end.leased_scratch()) == 1
+    assert running.exists() and not abandoned.exists()
+
+
+def test_content_key_ignores_fields_the_policy_mode_does_not_use():
+    url = "https://www.mxplayer.in/show/watch-example/episode-1-online-0123456789abcdef0123456789abcdef"
+    best = content_key(url, VariantPolicy("best"))
+    assert content_key(url, VariantPolicy("best", target_height=480, max_bandwidth=2500000)) == best
+    assert content_key(url, VariantPolicy("best", target_height=1080)) == best
+    assert content_key(url, VariantPolicy("target")) == best
+    assert content_key(url, VariantPolicy("target", target_height=720)) != best
+    assert content_key(url, VariantPolicy("target", target_height=720, max_bandwidth=1)) == \
+        content_key(url, VariantPolicy("target", target_height=720))
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import FairSlots
+
+
+# Queue a ticket for owner on a thread, wait until it is queued, and record when it is served
+def queue_ticket(slots, owner, served):
+    waiting = slots.stats()["waiting"]
+
+    def run():
+        slots.acquire(owner)
+        served.append(owner)
+        slots.release()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while slots.stats()["waiting"] == waiting and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return thread
+
+
+def test_owners_take_turns(clock):
+    slots = FairSlots("test", 1, clock=clock)
+    started = slots.acquire("holder")
+    served = []
+    # One session queues three jobs before another queues one
+    threads = [queue_ticket(slots, owner, served) for owner in ("a", "a", "a", "b")]
+    assert slots.stats()["waiting"] == 4
+
+    clock.now += 10.0
+    slots.release(started)
+    for thread in threads:
+        thread.join(5)
+    assert served == ["a", "b", "a", "a"]
+    # Ticket hold times come from the injected clock
+    assert slots.stats()["avg_hold_s"] == pytest.approx(10.0)
+
+
+def test_wait_estimate_uses_hold_times(clock):
+    slots = FairSlots("test", 2, clock=clock)
+    for _ in range(2):
+        started = slots.acquire("a")
+        clock.now += 4.0
+        slots.release(started)
+    assert slots._avg_hold == pytest.approx(4.0)
+    held = [slots.acquire("a"), slots.acquire("b")]
+    # Both slots busy: the first waiter needs one round, the third needs two
+    assert (slots._eta(1), slots._eta(3)) == (pytest.approx(4.0), pytest.approx(8.0))
+    for started in held:
+        slots.release(started)
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+import toolchain
+from toolchain import Toolchain
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    # A probe that blocks until released, counting how often it runs; nothing touches the real cache
+    release, calls = threading.Event(), []
+
+    def resolve(install_driver=True):
+        calls.append(install_driver)
+        release.wait(5)
+        return Toolchain({"chromedriver": {"path": "/opt/chromedriver"}})
+
+    monkeypatch.setattr(toolchain, "_toolchain", None)
+    monkeypatch.setattr(toolchain, "_warm_thread", None)
+    monkeypatch.setattr(Toolchain, "resolve", staticmethod(resolve))
+    monkeypatch.setattr(Toolchain, "load", classmethod(lambda cls: None))
+    monkeypatch.setattr(Toolchain, "save", lambda self: None)
+    yield release, calls
+    release.set()
+
+
+def test_warm_up_does_not_block_reruns_while_probing(probe):
+    release, calls = probe
+    thread = toolchain.warm_toolchain()
+    # A rerun during the probe returns at once with the same thread
+    assert toolchain.warm_toolchain() is thread
+    assert toolchain._toolchain_lock.acquire(timeout=1)
+    toolchain._toolchain_lock.release()
+
+    release.set()
+    thread.join(5)
+    assert toolchain.get_toolchain().chromedriver == "/opt/chromedriver"
+    assert calls == [False]
+
+
+def test_find_chrome_path_falls_back_to_path_lookup(monkeypatch):
+    monkeypatch.setattr(toolchain, "get_chrome_paths", lambda: (None, None))
+    monkeypatch.setattr(toolchain.shutil, "which", lambda name: "/usr/bin/chromium" if name == "chromium" else None)
+    assert toolchain.find_chrome_path() == "/usr/bin/chromium"
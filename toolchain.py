@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import shutil
+import platform
+import threading
+import subprocess
+from pathlib import Path
+from importlib import metadata
+
+from resolution_cache import CACHE_DIR
+
+
+# Toolchain cache settings, overridable through the environment
+TOOLCHAIN_CACHE_FILE = os.getenv("TOOLCHAIN_CACHE_FILE", os.path.join(CACHE_DIR, "toolchain.json"))
+# Bump when the cached layout changes so old files are re-probed
+TOOLCHAIN_CACHE_VERSION = 3
+# Environment variables that change what gets resolved; a change invalidates the cache
+TOOLCHAIN_ENV = ("FFMPEG_PATH", "FFPROBE_PATH", "CHROME_PATH", "CHROMEDRIVER_PATH", "PATH")
+TOOLS = ("ffmpeg", "ffprobe", "chrome", "chromedriver")
+# Browser executables Selenium finds on PATH when CHROME_PATH is not set
+CHROME_NAMES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+# Seconds after a failed ChromeDriver download before driver starts try it again
+CHROMEDRIVER_INSTALL_RETRY = float(os.getenv("CHROMEDRIVER_INSTALL_RETRY", "300"))
+
+_toolchain = None
+# Guards _toolchain and _warm_thread only; held briefly, never while probing
+_toolchain_lock = threading.Lock()
+# Serializes probes, so callers arriving during the startup warm-up wait for it instead of probing again
+_resolve_lock = threading.Lock()
+_install_lock = threading.Lock()
+_warm_thread = None
+
+
+# Function to find FFmpeg path
+def find_ffmpeg_path():
+    # First check environment variable
+    ffmpeg_env = os.getenv("FFMPEG_PATH")
+    if ffmpeg_env and os.path.exists(ffmpeg_env):
+        return ffmpeg_env
+
+    # Try to find ffmpeg in PATH
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+
+    # Check common installation paths
+    if platform.system() == "Windows":
+        common_paths = [
+            "ffmpeg.exe",
+            str(Path(__file__).parent / "ffmpeg.exe")
+        ]
+    else:  # Linux/Mac
+        common_paths = [
+            "/usr/bin/ffmpeg",
+            "/usr/local/bin/ffmpeg",
+            "/opt/homebrew/bin/ffmpeg",
+            "/app/bin/ffmpeg"  # Common path in containerized environments like Render
+        ]
+
+    for path in common_paths:
+        if os.path.exists(path):
+            return path
+
+    return None
+
+
+# Function to find ffprobe, which ships alongside ffmpeg
+def find_ffprobe_path(ffmpeg_path=None):
+    ffprobe_env = os.getenv("FFPROBE_PATH")
+    if ffprobe_env and os.path.exists(ffprobe_env):
+        return ffprobe_env
+
+    # Prefer the binary next to the ffmpeg in use so both come from the same build
+    if ffmpeg_path:
+        directory, name = os.path.split(ffmpeg_path)
+        sibling = os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+        if sibling != ffmpeg_path and os.path.exists(sibling):
+            return sibling
+
+    return shutil.which("ffprobe")
+
+
+# Function to get Chrome and ChromeDriver paths for Render deployment
+def get_chrome_paths():
+    # Check environment variables first
+    chrome_path = os.getenv("CHROME_PATH")
+    chromedriver_path = os.getenv("CHROMEDRIVER_PATH")
+
+    # If not set, use default paths based on environment
+    if not chrome_path:
+        if platform.system() == "Windows":
+            # Default Windows paths
+            chrome_path = None  # Let webdriver-manager handle it
+        else:
+            # Check Render paths from build.sh
+            render_chrome = "./chrome-linux/chrome"
+            if os.path.exists(render_chrome):
+                chrome_path = render_chrome
+
+    if not chromedriver_path:
+        if platform.system() == "Windows":
+            # Default Windows paths
+            chromedriver_path = None  # Let webdriver-manager handle it
+        else:
+            # Check Render paths from build.sh
+            render_driver = "./chromedriver/chromedriver"
+            if os.path.exists(render_driver):
+                chromedriver_path = render_driver
+
+    return chrome_path, chromedriver_path
+
+
+# Function to find the Chrome that Selenium will start, so its version can be cached
+# and a browser update invalidates the cached ChromeDriver
+def find_chrome_path():
+    chrome_path, _ = get_chrome_paths()
+    if chrome_path:
+        return chrome_path
+    for name in CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+# Function to download a matching ChromeDriver with webdriver-manager (network access)
+def install_chromedriver():
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+# Function to read the first line of a tool's --version/-version output
+def get_tool_version(path, flag="--version"):
+    try:
+        result = subprocess.run([path, flag], capture_output=True, text=True, timeout=15)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    lines = (result.stdout or result.stderr).strip().splitlines()
+    return lines[0] if lines else None
+
+
+# Function to fingerprint a binary cheaply so later starts can validate it with one stat()
+def stat_fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+# Function to read the installed yt-dlp version from package metadata; importing yt_dlp itself is slow
+def get_ytdlp_version():
+    try:
+        return metadata.version("yt-dlp")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+class Toolchain:
+    # Resolved paths and versions of the external tools the pipeline needs.
+    #
+    # Resolution (PATH lookups, version probes, a webdriver-manager download)
+    # runs once and is persisted to TOOLCHAIN_CACHE_FILE. Later starts only
+    # stat() the cached binaries; any mismatch, or a change to the relevant
+    # environment variables, re-runs the probe.
+    def __init__(self, tools=None, ytdlp_version=None):
+        self.tools = tools or {}
+        self.ytdlp_version = ytdlp_version
+
+    @property
+    def ffmpeg(self):
+        return self.tools.get("ffmpeg", {}).get("path")
+
+    @property
+    def ffprobe(self):
+        return self.tools.get("ffprobe", {}).get("path")
+
+    @property
+    def chrome(self):
+        return self.tools.get("chrome", {}).get("path")
+
+    @property
+    def chromedriver(self):
+        return self.tools.get("chromedriver", {}).get("path")
+
+    # ChromeDriver path, downloading it with webdriver-manager if the probe found none.
+    # A failed download is recorded in the cache, so driver starts within
+    # CHROMEDRIVER_INSTALL_RETRY seconds of it fail at once instead of downloading again.
+    def ensure_chromedriver(self):
+        with _install_lock:
+            if self.chromedriver:
+                return self.chromedriver
+            tool = self.tools.setdefault("chromedriver", {"path": None, "version": None, "fingerprint": None})
+            failed_at = tool.get("install_failed_at")
+            if failed_at and time.time() - failed_at < CHROMEDRIVER_INSTALL_RETRY:
+                raise RuntimeError(f"ChromeDriver download failed, retrying in "
+                                   f"{failed_at + CHROMEDRIVER_INSTALL_RETRY - time.time():.0f}s: "
+                                   f"{tool.get('install_error')}")
+            try:
+                path = install_chromedriver()
+            except Exception as e:
+                tool.update(install_failed_at=time.time(), install_error=str(e))
+                self.save()
+                raise
+            self.tools["chromedriver"] = {"path": path, "version": get_tool_version(path),
+                                          "fingerprint": stat_fingerprint(path)}
+            self.save()
+            return path
+
+    @staticmethod
+    def environment():
+        return {name: os.getenv(name) for name in TOOLCHAIN_ENV}
+
+    # Probe every tool from scratch
+    @classmethod
+    def resolve(cls, install_driver=True):
+        _, chromedriver_path = get_chrome_paths()
+        chrome_path = find_chrome_path()
+        install_error = None
+        if not chromedriver_path and install_driver:
+            try:
+                chromedriver_path = install_chromedriver()
+            except Exception as e:
+                chromedriver_path, install_error = None, str(e)
+        ffmpeg_path = find_ffmpeg_path()
+        ffprobe_path = find_ffprobe_path(ffmpeg_path)
+
+        tools = {}
+        for name, path, flag in (("ffmpeg", ffmpeg_path, "-version"),
+                                 ("ffprobe", ffprobe_path, "-version"),
+                                 ("chrome", chrome_path, "--version"),
+                                 ("chromedriver", chromedriver_path, "--version")):
+            tools[name] = {
+                "path": path,
+                "version": get_tool_version(path, flag) if path else None,
+                "fingerprint": stat_fingerprint(path),
+            }
+        if install_error is not None:
+            tools["chromedriver"].update(install_failed_at=time.time(), install_error=install_error)
+        return cls(tools, get_ytdlp_version())
+
+    # Load the cached toolchain, or None if it is missing, stale or no longer valid
+    @classmethod
+    def load(cls, path=TOOLCHAIN_CACHE_FILE):
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != TOOLCHAIN_CACHE_VERSION or data.get("env") != cls.environment():
+            return None
+        tools = data.get("tools", {})
+        for name in TOOLS:
+            tool = tools.get(name, {})
+            if tool.get("path") and stat_fingerprint(tool["path"]) != tool.get("fingerprint"):
+                return None
+        # A yt-dlp upgrade also re-probes, so the cached version stays accurate
+        if data.get("ytdlp_version") != get_ytdlp_version():
+            return None
+        return cls(tools, data.get("ytdlp_version"))
+
+    def save(self, path=TOOLCHAIN_CACHE_FILE):
+        data = {
+            "version": TOOLCHAIN_CACHE_VERSION,
+            "env": self.environment(),
+            "tools": self.tools,
+            "ytdlp_version": self.ytdlp_version,
+        }
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(data, handle, indent=2)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def summary(self):
+        summary = {name: self.tools.get(name, {}).get("version") or "not found" for name in TOOLS}
+        summary["yt-dlp"] = self.ytdlp_version or "not found"
+        return summary
+
+
+# Process-wide toolchain, resolved on first use from the on-disk cache or a fresh probe.
+# The probe only looks for local binaries; a missing ChromeDriver is downloaded by
+# ensure_chromedriver() when a browser is first needed, so jobs that only need
+# ffmpeg never wait for the network.
+def get_toolchain(refresh=False):
+    global _toolchain
+    with _toolchain_lock:
+        toolchain = _toolchain
+    if toolchain is not None and not refresh:
+        return toolchain
+    with _resolve_lock:
+        with _toolchain_lock:
+            # Resolved by another caller while this one waited
+            if _toolchain is not toolchain and _toolchain is not None:
+                return _toolchain
+        toolchain = None if refresh else Toolchain.load()
+        if toolchain is None:
+            toolchain = Toolchain.resolve(install_driver=False)
+            toolchain.save()
+        with _toolchain_lock:
+            _toolchain = toolchain
+        return toolchain
+
+
+# Function to probe the toolchain and fetch a missing ChromeDriver ahead of the first browser job
+def _warm():
+    toolchain = get_toolchain()
+    try:
+        toolchain.ensure_chromedriver()
+    except Exception:
+        # Recorded by ensure_chromedriver; the first browser job reports it
+        pass
+
+
+# Function to resolve the toolchain in the background at startup so the first job does not pay for it
+# Safe to call on every Streamlit rerun; only the first call starts a thread and none of them block
+def warm_toolchain():
+    global _warm_thread
+    with _toolchain_lock:
+        if _toolchain is None and _warm_thread is None:
+            _warm_thread = threading.Thread(target=_warm, name="mx-toolchain", daemon=True)
+            _warm_thread.start()
+        return _warm_thread
@@ -0,0 +1,242 @@
+import os
+import sys
+import signal
+import time
+import socket
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+# Load environment variables before the pipeline modules read their settings
+load_dotenv()
+
+from job_queue import HEARTBEAT_INTERVAL, QUEUE_DB, JobQueue, LeaseLost
+from pipeline import DEFAULT_DOWNLOAD_ENGINE, HLS_CONCURRENCY, JobState, get_driver_pool, process_video
+from toolchain import warm_toolchain
+from metrics import get_metrics_server
+
+# Seconds between claim attempts while the queue is empty or every slot is busy
+POLL_INTERVAL = 1.0
+# Most seconds between lease checks in the fence that guards a job's writes
+FENCE_INTERVAL = 1.0
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    with _print_lock:
+        print(message, file=sys.stderr, flush=True)
+
+
+class RunningJob:
+    # A claimed job and the state its heartbeats publish
+    def __init__(self, job):
+        self.job = job
+        self.state = JobState()
+        self.progress = 0.0
+        self.message = "Starting..."
+        self.user_cancelled = False
+        self.lease_lost = False
+        self.done = threading.Event()
+        self.thread = None
+        # Local time after which the lease may have passed to another worker, and the last queue check
+        self.lease_deadline = 0.0
+        self.fence_checked = 0.0
+
+
+class Worker:
+    # Pulls jobs from the shared JobQueue and runs up to `slots` of them at once.
+    #
+    # Each running job has a heartbeat thread that extends its lease, publishes
+    # progress and applies pause/resume/cancel requests from the front end. If
+    # the lease is lost (this worker stalled and another one took the job
+    # over) the local run is cancelled. On shutdown running jobs are
+    # cancelled and handed back to the queue; their checkpoints let the next
+    # worker continue where this one stopped.
+    def __init__(self, queue, slots, worker_id):
+        self.queue = queue
+        self.slots = max(1, slots)
+        self.worker_id = worker_id
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            for running in self._running.values():
+                running.state.download_status = "cancelled"
+
+    def run(self):
+        log(f"worker {self.worker_id}: {self.slots} slots, queue {self.queue.path}")
+        while not self._stopping.is_set():
+            with self._lock:
+                free = len(self._running) < self.slots
+            job = self.queue.claim(self.worker_id) if free else None
+            if job is None:
+                self._stopping.wait(POLL_INTERVAL)
+                continue
+            running = RunningJob(job)
+            self._extend_deadline(running, time.monotonic())
+            running.state.fence = lambda running=running: self._fence(running)
+            with self._lock:
+                self._running[job["id"]] = running
+            running.thread = threading.Thread(target=self._run_job, args=(running,), name=f"mx-job-{job['id']}")
+            running.thread.start()
+        with self._lock:
+            threads = [running.thread for running in self._running.values()]
+        for thread in threads:
+            thread.join()
+
+    # A lease renewed at `renewed` (local monotonic time) lasts lease_seconds on the queue's
+    # clock; stopping a quarter early leaves room for clock skew between hosts
+    def _extend_deadline(self, running, renewed):
+        running.lease_deadline = renewed + self.queue.lease_seconds * 0.75
+
+    # Function to tell whether a job may still write its work files. The pipeline calls it
+    # before writes; once it returns False another worker may own the job's stable work path.
+    def _fence(self, running):
+        now = time.monotonic()
+        if running.lease_lost or now > running.lease_deadline:
+            return False
+        if now - running.fence_checked >= FENCE_INTERVAL:
+            running.fence_checked = now
+            if not self.queue.holds(running.job["id"], self.worker_id, running.job["attempt"]):
+                running.lease_lost = True
+                running.state.download_status = "cancelled"
+                return False
+        return True
+
+    # Function to publish a job's progress and apply the front end's latest request
+    def _heartbeat(self, running):
+        state = running.state
+        status = "paused" if state.download_status == "paused" else "running"
+        renewed = time.monotonic()
+        control, options = self.queue.heartbeat(
+            running.job["id"], self.worker_id, running.job["attempt"], status, running.progress, running.message,
+            {"extraction_path": state.extraction_path, "transfer": dict(state.transfer), "queue": state.queue}
+        )
+        self._extend_deadline(running, renewed)
+        shaper = state.shaper
+        if shaper is not None and (options.get("rate_limit") or 0) != shaper.rate_limit:
+            shaper.set_rate_limit(options.get("rate_limit"))
+        if control == "cancel":
+            running.user_cancelled = True
+            state.download_status = "cancelled"
+        elif control == "pause" and state.download_status == "downloading":
+            state.download_status = "paused"
+            running.message = f"Paused at: {running.progress * 100:.1f}%"
+        elif control == "resume" and state.download_status == "paused":
+            state.download_status = "downloading"
+            running.message = f"Resuming download from: {running.progress * 100:.1f}%"
+
+    def _heartbeat_loop(self, running):
+        while not running.done.wait(HEARTBEAT_INTERVAL):
+            try:
+                self._heartbeat(running)
+            except LeaseLost:
+                log(f"[{running.job['id']}] lease lost, stopping")
+                running.lease_lost = True
+                running.state.download_status = "cancelled"
+                return
+            except Exception as e:
+                # A busy or briefly unreachable database; the lease covers several missed beats
+                log(f"[{running.job['id']}] heartbeat failed: {e}")
+
+    def _run_job(self, running):
+        job = running.job
+        options = job["options"]
+        log(f"[{job['id']}] attempt {job['attempt']}: {job['url']}")
+
+        def progress(value, message):
+            running.progress = value
+            running.message = message
+
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(running,), daemon=True)
+        heartbeat.start()
+        try:
+            output_file, error = process_video(
+                job["url"], progress,
+                state=running.state,
+                engine=options.get("engine", DEFAULT_DOWNLOAD_ENGINE),
+                variant_policy=options.get("variant_policy"),
+                hls_concurrency=options.get("hls_concurrency", HLS_CONCURRENCY),
+                output_file=options.get("output_file"),
+                owner=job["owner"],
+                rate_limit=options.get("rate_limit"),
+                bandwidth_weight=options.get("bandwidth_weight", 1.0),
+                job_id=job["id"]
+            )
+        except Exception as e:
+            output_file, error = None, f"An error occurred: {str(e)}"
+        finally:
+            running.done.set()
+            heartbeat.join()
+
+        try:
+            self._finish(running, output_file, error)
+        finally:
+            with self._lock:
+                del self._running[job["id"]]
+
+    def _finish(self, running, output_file, error):
+        job_id, attempt = running.job["id"], running.job["attempt"]
+        state = {"extraction_path": running.state.extraction_path, "transfer": dict(running.state.transfer),
+                 "queue": None, "metrics": running.state.metrics}
+        if running.lease_lost:
+            return
+        if running.state.download_status == "cancelled" and not running.user_cancelled:
+            # Stopped by this worker's shutdown: let another worker pick the job up
+            self.queue.release(job_id, self.worker_id, attempt)
+            log(f"[{job_id}] handed back to the queue")
+        elif running.state.download_status == "cancelled":
+            self.queue.finish(job_id, self.worker_id, attempt, "cancelled", "Download cancelled by user.",
+                              state=state)
+            log(f"[{job_id}] cancelled")
+        elif error:
+            self.queue.finish(job_id, self.worker_id, attempt, "failed", error, error=error, state=state)
+            log(f"[{job_id}] failed: {error}")
+        else:
+            self.queue.finish(job_id, self.worker_id, attempt, "done", "Download complete!",
+                              output_file=output_file, progress=1.0, state=state)
+            log(f"[{job_id}] done: {output_file}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run download jobs from the shared job queue.")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Jobs this worker runs at once")
+    parser.add_argument("--browsers", type=int, default=None,
+                        help="Size of the Chrome pool (defaults to the number of jobs)")
+    parser.add_argument("--queue", default=QUEUE_DB, help="Path of the shared queue database")
+    parser.add_argument("--id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Worker name recorded on the jobs it leases")
+    parser.add_argument("--metrics-port", default=None, help="Serve Prometheus metrics on this port")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    worker = Worker(JobQueue(args.queue), args.jobs, args.id)
+
+    def handle_signal(signum, frame):
+        log(f"worker {args.id}: shutting down, handing running jobs back")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    warm_toolchain()
+    if args.metrics_port is not None:
+        get_metrics_server(args.metrics_port)
+    pool = get_driver_pool(size=args.browsers or max(1, args.jobs))
+    try:
+        worker.run()
+    finally:
+        pool.close()
+        worker.queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())